@@ -0,0 +1,85 @@
+"""
+Shared boto3 clients
+
+Creating a boto3 client is expensive (loading service models, resolving credentials) and every client holds its
+own HTTP connection pool. Clients are therefore created once per (service, region, profile) and shared by the
+whole process. All clients of a profile share one boto3 session, and so one credential chain. API calls of shared
+clients are instrumented (see awsscripts.aws.instrumentation).
+
+boto3 clients are thread-safe, so a shared client can be used from many threads; sessions are not, so they are
+used only under a lock.
+"""
+
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import boto3
+from botocore.config import Config
+
+from awsscripts.aws.instrumentation import instrument_client
+
+_lock = threading.RLock()
+_sessions: Dict[Optional[str], boto3.session.Session] = {}
+_clients: Dict[Tuple[str, Optional[str], Optional[str], Optional[str]], Any] = {}
+_max_pool_connections = 10
+
+
+def configure(max_pool_connections: int) -> None:
+    """
+    Configures clients created from now on. Existing clients are dropped from the pool (but stay usable).
+    :param max_pool_connections: max. number of HTTP connections kept in the connection pool of a client
+    :return: nothing
+    """
+    global _max_pool_connections
+    with _lock:
+        _max_pool_connections = max_pool_connections
+        _clients.clear()
+
+
+def get_session(profile: Optional[str] = None) -> boto3.session.Session:
+    """
+    Gets shared boto3 session
+    :param profile: AWS profile name (default=None, i.e. the default credential chain)
+    :return: boto3 session
+    """
+    with _lock:
+        session = _sessions.get(profile)
+        if session is None:
+            session = boto3.session.Session(profile_name=profile)
+            _sessions[profile] = session
+        return session
+
+
+def get_client(service: str, region: Optional[str] = None, profile: Optional[str] = None,
+               endpoint_url: Optional[str] = None) -> Any:
+    """
+    Gets shared boto3 client
+    :param service: service name, e.g. 'emr'
+    :param region: region name (default=None, i.e. the region of the profile)
+    :param profile: AWS profile name (default=None, i.e. the default credential chain)
+    :param endpoint_url: endpoint of the service, e.g. of a local S3 stand-in (default=None, i.e. the AWS endpoint)
+    :return: boto3 client
+    """
+    key = (service, region, profile, endpoint_url)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = get_session(profile).client(
+                    service, region_name=region, endpoint_url=endpoint_url,
+                    config=Config(max_pool_connections=_max_pool_connections)
+                )
+                instrument_client(client)
+                _clients[key] = client
+    return client
+
+
+def clear() -> None:
+    """
+    Drops all shared clients and sessions
+    :return: nothing
+    """
+    with _lock:
+        _clients.clear()
+        _sessions.clear()
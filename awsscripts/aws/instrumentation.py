@@ -0,0 +1,279 @@
+"""
+Instrumentation
+
+Records timings of AWS API calls (hooked into botocore events of shared clients) and of other phases (e.g. sketch
+loading, MWAA CLI calls), and passes them as events to pluggable sinks:
+  - JsonLinesSink: appends events to a JSON lines file
+  - HistogramSink: aggregates durations in memory (e.g. for the "awss --timings" breakdown)
+  - StatsdSink: sends StatsD metrics over UDP
+
+Without sinks, recording is a no-op. Events are dictionaries:
+
+  {"type": "aws_call", "phase": "aws.emr.DescribeCluster", "seconds": 0.12, "http_status": 200, "retries": 0,
+   "throttled": 0, "request_bytes": 35, "response_bytes": 1843, "error": null}
+  {"type": "timing", "phase": "sketch.interpret", "name": "mysketch", "seconds": 0.001}
+"""
+
+import json
+import math
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+_sinks: List['Sink'] = []
+_lock = threading.Lock()
+
+
+class Sink:
+    """
+    Base class of event sinks. Sinks are called from many threads.
+    """
+
+    def record(self, event: Dict[str, Any]) -> None:
+        raise NotImplementedError()
+
+    def close(self) -> None:
+        pass
+
+
+class JsonLinesSink(Sink):
+
+    def __init__(self, path: Path) -> None:
+        self._file = path.open('a', buffering=1)
+        self._lock = threading.Lock()
+
+    def record(self, event: Dict[str, Any]) -> None:
+        line = json.dumps({'time': time.time(), **event}, default=str)
+        with self._lock:
+            self._file.write(line + '\n')
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class PhaseStats(NamedTuple):
+    phase: str
+    calls: int  # number of recorded events
+    seconds: float  # total
+    min: float
+    max: float
+    p50: float  # approximated by histogram bucket bounds
+    p95: float
+    retries: int
+    throttled: int
+
+
+class HistogramSink(Sink):
+    """
+    Aggregates event durations by phase into histograms with exponential buckets (powers of two milliseconds).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # phase -> [calls, total, min, max, retries, throttled, {bucket: count}]
+        self._phases: Dict[str, List[Any]] = {}
+
+    def record(self, event: Dict[str, Any]) -> None:
+        seconds = event['seconds']
+        bucket = max(0, math.ceil(math.log2(seconds * 1000))) if seconds > 0.001 else 0
+        with self._lock:
+            stats = self._phases.get(event['phase'])
+            if stats is None:
+                stats = [0, 0.0, seconds, seconds, 0, 0, {}]
+                self._phases[event['phase']] = stats
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = min(stats[2], seconds)
+            stats[3] = max(stats[3], seconds)
+            stats[4] += event.get('retries', 0)
+            stats[5] += event.get('throttled', 0)
+            stats[6][bucket] = stats[6].get(bucket, 0) + 1
+
+    def stats(self) -> List[PhaseStats]:
+        """
+        Gets statistics of all phases
+        :return: statistics, the phase with most total time first
+        """
+        with self._lock:
+            result = [PhaseStats(phase, calls, total, low, high, self._percentile(buckets, calls, 0.5, high),
+                                 self._percentile(buckets, calls, 0.95, high), retries, throttled)
+                      for phase, (calls, total, low, high, retries, throttled, buckets) in self._phases.items()]
+        return sorted(result, key=lambda s: -s.seconds)
+
+    @staticmethod
+    def _percentile(buckets: Dict[int, int], calls: int, q: float, high: float) -> float:
+        seen = 0
+        for bucket in sorted(buckets):
+            seen += buckets[bucket]
+            if seen >= q * calls:
+                return min(high, 2.0 ** bucket / 1000)
+        return high
+
+    def format(self) -> str:
+        """
+        Formats the statistics as a table
+        :return: the table
+        """
+        lines = [f'{"phase":<48} {"count":>6} {"total s":>9} {"mean ms":>9} {"p50 ms":>8} {"p95 ms":>8} '
+                 f'{"max ms":>8} {"retries":>7} {"throttled":>9}']
+        for s in self.stats():
+            lines.append(f'{s.phase:<48} {s.calls:>6} {s.seconds:>9.3f} {s.seconds / s.calls * 1000:>9.1f} '
+                         f'{s.p50 * 1000:>8.1f} {s.p95 * 1000:>8.1f} {s.max * 1000:>8.1f} {s.retries:>7} '
+                         f'{s.throttled:>9}')
+        return '\n'.join(lines)
+
+
+class StatsdSink(Sink):
+    """
+    Sends durations as StatsD timers ("<prefix>.<phase>:<ms>|ms"), and retries and throttling events as counters.
+    """
+
+    def __init__(self, host: str = 'localhost', port: int = 8125, prefix: str = 'awss') -> None:
+        self._address = (host, port)
+        self._prefix = prefix
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def record(self, event: Dict[str, Any]) -> None:
+        name = f'{self._prefix}.{event["phase"]}'
+        metrics = [f'{name}:{event["seconds"] * 1000:.3f}|ms']
+        if event.get('retries'):
+            metrics.append(f'{name}.retries:{event["retries"]}|c')
+        if event.get('throttled'):
+            metrics.append(f'{name}.throttled:{event["throttled"]}|c')
+        if event.get('error'):
+            metrics.append(f'{name}.errors:1|c')
+        try:
+            self._socket.sendto('\n'.join(metrics).encode('utf-8'), self._address)
+        except OSError:
+            pass  # metrics are best effort
+
+    def close(self) -> None:
+        self._socket.close()
+
+
+def sink_from_uri(uri: str) -> Sink:
+    """
+    Creates a sink from its URI: "jsonl:PATH", "statsd:HOST:PORT" or "histogram"
+    :param uri: sink URI
+    :return: the sink
+    """
+    kind, _, location = uri.partition(':')
+    if kind == 'jsonl' and location:
+        return JsonLinesSink(Path(location).expanduser())
+    if kind == 'statsd':
+        host, _, port = location.partition(':')
+        return StatsdSink(host or 'localhost', int(port or 8125))
+    if kind == 'histogram':
+        return HistogramSink()
+    raise ValueError(f'Unknown metrics sink "{uri}", expected jsonl:PATH, statsd:HOST:PORT or histogram')
+
+
+def add_sink(sink: Sink) -> None:
+    with _lock:
+        _sinks.append(sink)
+
+
+def remove_sink(sink: Sink) -> None:
+    with _lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+    sink.close()
+
+
+def enabled() -> bool:
+    return bool(_sinks)
+
+
+def record(event: Dict[str, Any]) -> None:
+    """
+    Passes an event to all sinks
+    :param event: the event; must contain "phase" and "seconds"
+    :return: nothing
+    """
+    for sink in list(_sinks):
+        sink.record(event)
+
+
+@contextmanager
+def timed(phase: str, name: Optional[str] = None) -> Iterator[None]:
+    """
+    Records duration of the context as a timing event
+    :param phase: phase, e.g. "sketch.read"
+    :param name: name of the timed thing, e.g. sketch name
+    :return: the context
+    """
+    if not _sinks:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record({'type': 'timing', 'phase': phase, 'name': name, 'seconds': time.perf_counter() - start})
+
+
+def instrument_client(client: Any) -> None:
+    """
+    Hooks recording of API calls into botocore events of a client
+    :param client: boto3 client
+    :return: nothing
+    """
+    events = client.meta.events
+    events.register_first('before-call', _before_call, unique_id='awss-instrumentation-before-call')
+    events.register('needs-retry', _needs_retry, unique_id='awss-instrumentation-needs-retry')
+    events.register('after-call', _after_call, unique_id='awss-instrumentation-after-call')
+    events.register('after-call-error', _after_call_error, unique_id='awss-instrumentation-after-call-error')
+
+
+def _before_call(model: Any, params: Dict[str, Any], context: Dict[str, Any], **kwargs: Any) -> None:
+    if _sinks:
+        body = params.get('body')
+        context['awss_phase'] = f'aws.{model.service_model.service_name}.{model.name}'
+        context['awss_started'] = time.perf_counter()
+        context['awss_request_bytes'] = len(body) if isinstance(body, (bytes, str)) else 0
+        context['awss_throttled'] = 0
+
+
+def _needs_retry(response: Optional[Tuple[Any, Dict[str, Any]]] = None, request_dict: Optional[Dict[str, Any]] = None,
+                 **kwargs: Any) -> None:
+    from awsscripts.aws.retry import THROTTLING_ERROR_CODES  # imported lazily, it loads botocore
+
+    if response is not None and request_dict is not None and 'awss_started' in request_dict.get('context', {}):
+        if response[1].get('Error', {}).get('Code') in THROTTLING_ERROR_CODES:
+            request_dict['context']['awss_throttled'] += 1
+
+
+def _after_call(http_response: Any, parsed: Dict[str, Any], context: Dict[str, Any], **kwargs: Any) -> None:
+    if 'awss_started' not in context:
+        return
+    error = parsed.get('Error', {}).get('Code')
+    record({
+        'type': 'aws_call',
+        'phase': context['awss_phase'],
+        'seconds': time.perf_counter() - context['awss_started'],
+        'http_status': http_response.status_code,
+        'retries': parsed.get('ResponseMetadata', {}).get('RetryAttempts', 0),
+        'throttled': context['awss_throttled'],  # counted by _needs_retry, which also sees the last response
+        'request_bytes': context['awss_request_bytes'],
+        'response_bytes': int(http_response.headers.get('content-length', 0) or 0),
+        'error': error
+    })
+
+
+def _after_call_error(exception: Exception, context: Dict[str, Any], **kwargs: Any) -> None:
+    if 'awss_started' not in context:
+        return
+    record({
+        'type': 'aws_call',
+        'phase': context['awss_phase'],
+        'seconds': time.perf_counter() - context['awss_started'],
+        'http_status': 0,
+        'retries': 0,
+        'throttled': context['awss_throttled'],
+        'request_bytes': context['awss_request_bytes'],
+        'response_bytes': 0,
+        'error': type(exception).__name__
+    })
@@ -0,0 +1,71 @@
+"""
+Retrying of throttled AWS API calls
+"""
+
+import random
+import time
+from typing import Callable, Optional, TypeVar
+
+from botocore.exceptions import ClientError
+
+from awsscripts.aws import instrumentation
+
+T = TypeVar('T')
+
+THROTTLING_ERROR_CODES = {
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'RequestThrottledException',
+    'TooManyRequestsException',
+    'RequestLimitExceeded',
+    'SlowDown',
+}
+
+
+def is_throttling_error(error: Exception) -> bool:
+    """
+    Determines if an exception is an AWS throttling error
+    :param error: the exception
+    :return: true if the exception is a throttling error; false otherwise
+    """
+    return isinstance(error, ClientError) and error.response.get('Error', {}).get('Code') in THROTTLING_ERROR_CODES
+
+
+def backoff_delay(attempt: int, base_delay: float = 0.5, max_delay: float = 30.0) -> float:
+    """
+    Computes a delay of exponential backoff with full jitter
+    :param attempt: number of the failed attempt (starting from 1)
+    :param base_delay: backoff delay (in seconds) after the first attempt, before jitter
+    :param max_delay: max. backoff delay (in seconds), before jitter
+    :return: the delay (in seconds)
+    """
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+
+def with_retries(call: Callable[[], T], max_attempts: int = 8, base_delay: float = 0.5, max_delay: float = 30.0,
+                 on_retry: Optional[Callable[[int, float, Exception], None]] = None) -> T:
+    """
+    Calls an AWS API, retrying throttling errors with exponential backoff and full jitter. Other errors,
+    and the throttling error of the last attempt, are raised.
+
+    :param call: the call
+    :param max_attempts: max. number of attempts
+    :param base_delay: backoff delay (in seconds) of the first retry, before jitter
+    :param max_delay: max. backoff delay (in seconds), before jitter
+    :param on_retry: called before sleeping, with attempt number, the delay and the error
+    :return: result of the call
+    """
+    attempt = 1
+    while True:
+        try:
+            return call()
+        except ClientError as e:
+            if attempt >= max_attempts or not is_throttling_error(e):
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            if on_retry:
+                on_retry(attempt, delay, e)
+            with instrumentation.timed('aws.backoff', e.operation_name):
+                time.sleep(delay)
+            attempt += 1
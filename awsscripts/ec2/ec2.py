@@ -1,4 +1,6 @@
-from typing import Dict
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterator, List, NamedTuple, Optional
 
 # https://docs.aws.amazon.com/emr/latest/ManagementGuide/emr-supported-instance-types.html
 
@@ -396,3 +398,93 @@ ec2_instances: Dict[str, Dict[str, float]] = {
     "z1d.12xlarge": {"cpu": 48, "memory": 384, "ghz": 4, "storage": 1800},
     "z1d.metal": {"cpu": 48, "memory": 384, "ghz": 4, "storage": 1800}
 }
+
+
+class InstanceType(NamedTuple):
+    name: str
+    cpu: int
+    memory: float
+    ghz: float
+    storage: float
+
+
+class InstanceCatalog:
+    """
+    Catalog of EC2 instance types, stored column-wise in compact arrays with a name-to-row index.
+
+    Range queries first narrow the rows by vCPU count using binary search over rows sorted by vCPU count, and
+    then filter the remaining rows in one pass per constrained column.
+    """
+
+    def __init__(self, instances: Dict[str, Dict[str, float]]) -> None:
+        self.names: List[str] = list(instances)
+        self.index: Dict[str, int] = {name: row for row, name in enumerate(self.names)}
+        self.cpu = array('l', (int(instances[name]['cpu']) for name in self.names))
+        self.memory = array('d', (instances[name]['memory'] for name in self.names))
+        self.ghz = array('d', (instances[name]['ghz'] for name in self.names))
+        self.storage = array('d', (instances[name]['storage'] for name in self.names))
+        self.memory_per_cpu = array('d', (m / c for m, c in zip(self.memory, self.cpu)))
+
+        self._cpu_order = array('l', sorted(range(len(self.names)), key=lambda row: self.cpu[row]))
+        self._cpu_sorted = array('l', (self.cpu[row] for row in self._cpu_order))
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.index
+
+    def __getitem__(self, name: str) -> InstanceType:
+        return self.row(self.index[name])
+
+    def __iter__(self) -> Iterator[InstanceType]:
+        return (self.row(row) for row in range(len(self.names)))
+
+    def row(self, row: int) -> InstanceType:
+        """
+        Gets instance type at given row
+        :param row: row number
+        :return: instance type
+        """
+        return InstanceType(self.names[row], self.cpu[row], self.memory[row], self.ghz[row], self.storage[row])
+
+    def select(self,
+               min_cpu: Optional[float] = None, max_cpu: Optional[float] = None,
+               min_memory: Optional[float] = None, max_memory: Optional[float] = None,
+               min_memory_per_cpu: Optional[float] = None, max_memory_per_cpu: Optional[float] = None,
+               min_ghz: Optional[float] = None, max_ghz: Optional[float] = None,
+               min_storage: Optional[float] = None, max_storage: Optional[float] = None,
+               local_storage: Optional[bool] = None) -> List[str]:
+        """
+        Selects instance types matching all given (inclusive) ranges. For example, all types with at least
+        16 vCPUs, 4-8 GB of memory per vCPU and local SSD storage:
+
+          catalog.select(min_cpu=16, min_memory_per_cpu=4, max_memory_per_cpu=8, local_storage=True)
+
+        :param local_storage: True to select only types with local (instance store) storage, False to select
+         only EBS-only types, None to ignore the storage kind
+        :return: names of matching instance types, ordered by vCPU count
+        """
+        low = bisect_left(self._cpu_sorted, min_cpu) if min_cpu is not None else 0
+        high = bisect_right(self._cpu_sorted, max_cpu) if max_cpu is not None else len(self._cpu_sorted)
+        rows: List[int] = self._cpu_order[low:high].tolist()
+
+        if local_storage is not None:
+            storage = self.storage
+            rows = [r for r in rows if (storage[r] > 0) == local_storage]
+        for column, minimum, maximum in ((self.memory, min_memory, max_memory),
+                                         (self.memory_per_cpu, min_memory_per_cpu, max_memory_per_cpu),
+                                         (self.ghz, min_ghz, max_ghz),
+                                         (self.storage, min_storage, max_storage)):
+            if minimum is not None and maximum is not None:
+                rows = [r for r in rows if minimum <= column[r] <= maximum]
+            elif minimum is not None:
+                rows = [r for r in rows if column[r] >= minimum]
+            elif maximum is not None:
+                rows = [r for r in rows if column[r] <= maximum]
+
+        names = self.names
+        return [names[r] for r in rows]
+
+
+instance_catalog = InstanceCatalog(ec2_instances)
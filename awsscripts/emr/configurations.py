@@ -1,7 +1,97 @@
-from typing import List, Dict, Any, Optional
+from functools import lru_cache, wraps
+from typing import List, Dict, Any, Optional, NamedTuple, Callable, Tuple
+import inspect
 import math
 
-from awsscripts.ec2.ec2 import ec2_instances
+from awsscripts.ec2.ec2 import instance_catalog
+
+SPARK_EXECUTOR_CORES = 5
+GBITS2GBYTES = 1.07374
+CONFIGURATIONS_CACHE_SIZE = 256  # max. cached results per generator
+
+
+class SparkNodeSizing(NamedTuple):
+    executors_per_node: float
+    memory_overhead: float  # memory overhead per executor (GB)
+    executor_memory: int  # memory per executor (GB)
+    driver_memory: int  # driver memory (GB)
+    default_parallelism: int
+
+
+def spark_node_sizing(cpu: int, memory: float) -> SparkNodeSizing:
+    """
+    Computes per-node part of Spark sizing, which does not depend on node count.
+    According to: https://github.com/vbmacher/knowledge-notes/blob/master/spark/spark-parameters/spark-parameters.md
+
+    :param cpu: vCPUs of a node (must be greater than 1)
+    :param memory: memory of a node (GB)
+    :return: Spark sizing of a node
+    """
+    executors_per_node = (cpu - 1) / SPARK_EXECUTOR_CORES
+    raw_memory_per_executor = memory / executors_per_node
+    memory_overhead = max(0.384, 0.07 * raw_memory_per_executor)
+    executor_memory = int((raw_memory_per_executor - memory_overhead) * GBITS2GBYTES)
+    driver_memory = int(math.floor(executor_memory * 0.6))
+    default_parallelism = int(math.ceil(executors_per_node * SPARK_EXECUTOR_CORES * 2))
+    return SparkNodeSizing(executors_per_node, memory_overhead, executor_memory, driver_memory, default_parallelism)
+
+
+def spark_executors_count(executors_per_node: float, node_count: int) -> int:
+    """
+    Computes number of Spark executors in a cluster.
+    :param executors_per_node: executors per node
+    :param node_count: node count (including master)
+    :return: number of executors
+    """
+    return max(1, int(executors_per_node * node_count - 1))  # 1 executor for ApplicationMaster in YARN
+
+
+class _FrozenDict(Tuple[Tuple[str, Any], ...]):
+    pass
+
+
+class _FrozenList(Tuple[Any, ...]):
+    pass
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, dict):
+        return _FrozenDict(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, list):
+        return _FrozenList(_freeze(v) for v in value)
+    return value
+
+
+def _thaw(value: Any) -> Any:
+    if isinstance(value, _FrozenDict):
+        return {k: _thaw(v) for k, v in value}
+    if isinstance(value, _FrozenList):
+        return [_thaw(v) for v in value]
+    return value
+
+
+def _memoized(generator: Callable[..., List[Dict[str, Any]]]) -> Callable[..., List[Dict[str, Any]]]:
+    """
+    Memoizes a configurations generator in a bounded LRU cache, keyed on its arguments (with defaults applied and
+    dict/list arguments frozen). Every call returns a fresh copy of the configurations, so callers can modify them
+    without corrupting the cache.
+    """
+    signature = inspect.signature(generator)
+
+    @lru_cache(maxsize=CONFIGURATIONS_CACHE_SIZE)
+    def cached(*frozen_args: Any) -> List[Dict[str, Any]]:
+        return generator(*(_thaw(arg) for arg in frozen_args))
+
+    @wraps(generator)
+    def wrapper(*args: Any, **kwargs: Any) -> List[Dict[str, Any]]:
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        configurations = cached(*(_freeze(arg) for arg in bound.arguments.values()))
+        return [{**c, 'Properties': dict(c['Properties'])} for c in configurations]
+
+    wrapper.cache_info = cached.cache_info  # type: ignore[attr-defined]
+    wrapper.cache_clear = cached.cache_clear  # type: ignore[attr-defined]
+    return wrapper
 
 
 class EmrConfigurations:
@@ -26,6 +116,24 @@ class EmrConfigurations:
         self.configurations += EmrConfigurations._generate_emrfs_site(fs_s3_max_connections)
 
     @staticmethod
+    def cache_info() -> Dict[str, Any]:
+        """
+        Gets statistics of the configurations cache.
+        :return: cache info (hits, misses, maxsize, currsize) of each generator
+        """
+        return {name: getattr(EmrConfigurations, name).cache_info() for name in EmrConfigurations._GENERATORS}
+
+    @staticmethod
+    def cache_clear() -> None:
+        """
+        Clears the configurations cache.
+        :return: nothing
+        """
+        for name in EmrConfigurations._GENERATORS:
+            getattr(EmrConfigurations, name).cache_clear()
+
+    @staticmethod
+    @_memoized
     def _generate_spark(instance_type: str, node_count: int) -> List[Dict[str, Any]]:
         """
         Generates Spark configurations for creating EMR cluster, based on EC2 instance type and node count.
@@ -36,19 +144,15 @@ class EmrConfigurations:
         :return: Configurations of Spark parameters (list)
         """
 
-        ec2 = ec2_instances[instance_type]
-        gbits2gbytes = 1.07374
+        ec2 = instance_catalog[instance_type]
+        node = spark_node_sizing(ec2.cpu, ec2.memory)
 
-        spark_cores = 5
-        spark_executors_per_node = (ec2["cpu"] - 1) / spark_cores
-        spark_executors = max(1,
-                              int(spark_executors_per_node * node_count - 1))  # 1 executor for ApplicationMaster in YARN
-        spark_raw_memory_per_executor = ec2["memory"] / spark_executors_per_node
-        spark_memory_overhead = max(0.384, 0.07 * spark_raw_memory_per_executor)
-        spark_memory_per_executor = int((spark_raw_memory_per_executor - spark_memory_overhead) * gbits2gbytes)
-        spark_driver_cores = ec2["cpu"]
-        spark_driver_memory = int(math.floor(spark_memory_per_executor * 0.6))
-        spark_default_parallelism = int(math.ceil(spark_executors_per_node * spark_cores * 2))
+        spark_cores = SPARK_EXECUTOR_CORES
+        spark_executors = spark_executors_count(node.executors_per_node, node_count)
+        spark_memory_per_executor = node.executor_memory
+        spark_driver_cores = ec2.cpu
+        spark_driver_memory = node.driver_memory
+        spark_default_parallelism = node.default_parallelism
 
         return [
             {
@@ -86,6 +190,7 @@ class EmrConfigurations:
         ]
 
     @staticmethod
+    @_memoized
     def _generate_yarn_site(remote_log_dir: Optional[str] = None,
                             capacity_scheduler: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         """
@@ -120,7 +225,7 @@ class EmrConfigurations:
             # For example, if one NodeManager has 32 GB, and the total cluster resource is 100 GB, the
             # total_preemption_per_round should set to 32/100 = 0.32. The default value is 0.1 (10%).
 
-            node_memory = ec2_instances[capacity_scheduler["instance_type"]]["memory"]
+            node_memory = instance_catalog[capacity_scheduler["instance_type"]].memory
             yarn_total_preemption_per_round = node_memory / (node_memory * capacity_scheduler["node_count"])
 
             result.update({
@@ -143,6 +248,7 @@ class EmrConfigurations:
         ]
 
     @staticmethod
+    @_memoized
     def _generate_hdfs_site(dfs_replication: int = 2) -> List[Dict[str, Any]]:
         """
         Generates configuration for 'hdfs-site'.
@@ -157,6 +263,7 @@ class EmrConfigurations:
         }]
 
     @staticmethod
+    @_memoized
     def _generate_livy(session_timeout: str = "12h") -> List[Dict[str, Any]]:
         """
         Generates Livy configuration.
@@ -171,6 +278,7 @@ class EmrConfigurations:
         }]
 
     @staticmethod
+    @_memoized
     def _generate_emrfs_site(fs_s3_max_connections: int = 100) -> List[Dict[str, Any]]:
         """
         Generates emrfs-site configuration.
@@ -187,3 +295,6 @@ class EmrConfigurations:
                 }
             }
         ]
+
+    _GENERATORS = ('_generate_spark', '_generate_yarn_site', '_generate_hdfs_site', '_generate_livy',
+                   '_generate_emrfs_site')
@@ -4,16 +4,39 @@ EMR - Elastic Map Reduce
 Helper class to manage EMR clusters using Boto3 Python library.
 """
 
-from typing import List, Dict, Any, Optional, Union
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any, Iterator, Optional, Tuple, Union
 
-import boto3
-from botocore.exceptions import ClientError
+from botocore.exceptions import BotoCoreError, ClientError
+
+from awsscripts.aws.clients import get_client
+from awsscripts.aws.instrumentation import timed
+from awsscripts.aws.retry import backoff_delay, with_retries
+from awsscripts.emr.steps import ACTIVE_STEP_STATES, MAX_ACTIVE_STEPS, StepsNotAddedError, StepTracker
+from awsscripts.emr.waiter import ClusterFailedError, ClusterWaitResult, get_waiter
+from awsscripts.sketches.files import file_lock
+from awsscripts.sketches.hashing import content_hash
+
+ACTIVE_CLUSTER_STATES = ['STARTING', 'BOOTSTRAPPING', 'RUNNING', 'WAITING']
+REUSE_PREFERENCE = ['WAITING', 'RUNNING', 'BOOTSTRAPPING', 'STARTING']  # states of reused clusters, preferred first
+FINGERPRINT_TAG = 'awss:fingerprint'
+MAX_CLUSTERS_PER_TERMINATE = 10  # max. number of clusters in one TerminateJobFlows request
 
 
 class EMR:
 
-    def __init__(self, verbose: Optional[bool]):
-        self.emr_client = boto3.client('emr')
+    def __init__(self, verbose: Optional[bool], region: Optional[str] = None, profile: Optional[str] = None,
+                 emr_client: Any = None):
+        """
+        :param verbose: print progress messages
+        :param region: AWS region (default=None, i.e. the region of the profile)
+        :param profile: AWS profile (default=None, i.e. the default credential chain)
+        :param emr_client: EMR client to use (default=None, i.e. the shared client for the region and profile)
+        """
+        self.emr_client = emr_client if emr_client else get_client('emr', region, profile)
         self.verbose = verbose
 
     def start_cluster(self,
@@ -31,12 +54,13 @@ class EMR:
                       ebs_master_volume_gb: Optional[int],
                       ebs_core_volume_gb: Optional[int],
                       steps: List[Dict[str, Any]],
-                      tags: List[str],
+                      tags: List[Dict[str, str]],
                       security_groups: Dict[str, Any],
                       subnets: Dict[str, Any],
                       configurations: List[Dict[str, Any]],
                       keyname: Optional[str],
-                      bootstrap_scripts: List[Dict[str, Any]]) -> str:
+                      bootstrap_scripts: List[Dict[str, Any]],
+                      reuse: bool = False) -> str:
 
         """
         Runs a job flow with the specified steps. A job flow creates a cluster of
@@ -106,7 +130,11 @@ class EMR:
                     'Args': []
                 }
         :param tags: Cluster tags
-        :return: The ID of the newly created cluster.
+        :param reuse: If True and an active cluster with the same fingerprint exists, it is returned instead of
+                      creating a new one (see cluster_fingerprint), and the steps are added to it. Concurrent
+                      starts of the same cluster from this machine are serialized, so they reuse one cluster.
+        :return: The ID of the newly created (or reused) cluster.
+        :raises StepsNotAddedError: If the steps could not be added to a reused cluster.
         """
 
         instances = {
@@ -143,34 +171,52 @@ class EMR:
                 master_group, core_group
             ]
 
+        request = {
+            'Name': name,
+            'LogUri': log_uri,
+            'ReleaseLabel': emr_label,
+            'Instances': instances,
+            'Steps': [{
+                'Name': step['Name'],
+                'ActionOnFailure': 'CONTINUE',
+                'HadoopJarStep': {
+                    'Jar': 'command-runner.jar',
+                    'Args': step['Args']
+                }
+            } for step in steps],
+            'BootstrapActions': [{
+                'Name': boot['name'],
+                'ScriptBootstrapAction': {
+                    'Path': boot['path'],
+                    'Args': boot['args']
+                }
+            } for boot in bootstrap_scripts],
+            'Applications': [{'Name': app} for app in applications],
+            'JobFlowRole': job_flow_role,
+            'ServiceRole': service_role,
+            'VisibleToAllUsers': True,
+            'Configurations': configurations,
+        }
+        fingerprint = EMR.cluster_fingerprint(request)
+        request['Tags'] = [*[tag for tag in tags if tag['Key'] != FINGERPRINT_TAG],
+                           {'Key': FINGERPRINT_TAG, 'Value': fingerprint}]
+        if not reuse:
+            return self._run_job_flow(request)
+
+        lock = Path.home() / '.aws-scripts' / 'clusters' / fingerprint
+        lock.parent.mkdir(parents=True, exist_ok=True)
+        with file_lock(lock):
+            cluster_id = self.find_cluster(fingerprint)
+            if not cluster_id:
+                return self._run_job_flow(request)
+        self._vprint(f"Reusing cluster {cluster_id}")
+        if steps:
+            self.add_steps(cluster_id, steps)
+        return cluster_id
+
+    def _run_job_flow(self, request: Dict[str, Any]) -> str:
         try:
-            response = self.emr_client.run_job_flow(
-                Name=name,
-                LogUri=log_uri,
-                ReleaseLabel=emr_label,
-                Instances=instances,
-                Steps=[{
-                    'Name': step['Name'],
-                    'ActionOnFailure': 'CONTINUE',
-                    'HadoopJarStep': {
-                        'Jar': 'command-runner.jar',
-                        'Args': step['Args']
-                    }
-                } for step in steps],
-                BootstrapActions=[{
-                    'Name': boot['name'],
-                    'ScriptBootstrapAction': {
-                        'Path': boot['path'],
-                        'Args': boot['args']
-                    }
-                } for boot in bootstrap_scripts],
-                Applications=[{'Name': app} for app in applications],
-                JobFlowRole=job_flow_role,
-                ServiceRole=service_role,
-                VisibleToAllUsers=True,
-                Configurations=configurations,
-                Tags=tags
-            )
+            response = self.emr_client.run_job_flow(**request)
             cluster_id = response['JobFlowId']
             self._vprint(f"Created cluster {cluster_id}")
         except ClientError:
@@ -179,22 +225,57 @@ class EMR:
         else:
             return str(cluster_id)
 
+    @staticmethod
+    def cluster_fingerprint(request: Dict[str, Any]) -> str:
+        """
+        Computes fingerprint of a cluster: a hash of the RunJobFlow request, without the cluster name, initial steps
+        and tags. Clusters with the same fingerprint have the same release, applications, instances, bootstrap
+        actions, configurations and roles. Started clusters are tagged with their fingerprint (FINGERPRINT_TAG).
+
+        :param request: RunJobFlow request
+        :return: the fingerprint
+        """
+        return content_hash({key: value for key, value in request.items() if key not in ('Name', 'Steps', 'Tags')})
+
+    def find_cluster(self, fingerprint: str) -> Optional[str]:
+        """
+        Finds an active cluster with a fingerprint (see cluster_fingerprint). Active clusters are listed, and
+        described concurrently to get their tags.
+
+        :param fingerprint: The fingerprint.
+        :return: ID of the cluster (waiting clusters are preferred over running, bootstrapping and starting ones);
+                 None if there is no such cluster.
+        """
+        tag = {'Key': FINGERPRINT_TAG, 'Value': fingerprint}
+        cluster_ids = [cluster['Id'] for cluster in self.list_clusters(ACTIVE_CLUSTER_STATES)]
+        matching = []
+        for cluster_id, cluster, error in self.describe_clusters(cluster_ids, bootstrap_actions=False):
+            if cluster is not None and tag in cluster.get('Tags', []) \
+                    and cluster['Status']['State'] in REUSE_PREFERENCE:
+                matching.append(cluster)
+        if not matching:
+            return None
+        best = min(matching, key=lambda c: (REUSE_PREFERENCE.index(c['Status']['State']), c['Id']))
+        return str(best['Id'])
+
     @staticmethod
     def _to_instance_fleet_boto(fleet_type: str, fleet: Dict[str, Any], ebs_volume_gb: Optional[int],
                                 instance_fleet_configs) -> Dict[str, Any]:
-        fleet_config = instance_fleet_configs[fleet['instance_fleet_name']]
+        # instance type configs may be shared (see instance_fleet_groups), so they are copied, not modified
+        fleet_config = [dict(c) for c in instance_fleet_configs[fleet['instance_fleet_name']]]
         if ebs_volume_gb:
-            fleet_config['EbsConfiguration'] = {
-                "EbsBlockDeviceConfigs": [
-                    {
-                        "VolumeSpecification": {
-                            "SizeInGB": ebs_volume_gb,
-                            "VolumeType": "gp2"
-                        },
-                        "VolumesPerInstance": 1
-                    }
-                ]
-            }
+            for instance_config in fleet_config:
+                instance_config['EbsConfiguration'] = {
+                    "EbsBlockDeviceConfigs": [
+                        {
+                            "VolumeSpecification": {
+                                "SizeInGB": ebs_volume_gb,
+                                "VolumeType": "gp2"
+                            },
+                            "VolumesPerInstance": 1
+                        }
+                    ]
+                }
         fleet_boto = {
             'InstanceFleetType': fleet_type,
             'TargetOnDemandCapacity': fleet['TargetOnDemandCapacity'],
@@ -235,23 +316,117 @@ class EMR:
             }
         return group_boto
 
-    def describe_cluster(self, cluster_id: str) -> Dict[str, Any]:
+    def describe_cluster(self, cluster_id: str, bootstrap_actions: bool = True) -> Dict[str, Any]:
         """
         Gets detailed information about a cluster.
 
+        The cluster information includes all its bootstrap actions (under 'BootstrapActions'). Throttled requests
+        are retried with jittered exponential backoff.
+
         :param cluster_id: The ID of the cluster to describe.
+        :param bootstrap_actions: Whether to list bootstrap actions of the cluster (default=True).
         :return: The retrieved cluster information.
         """
+        def on_retry(attempt: int, delay: float, e: Exception) -> None:
+            self._vprint(f"Throttled, retrying in {delay:.1f}s")
+
+        def list_bootstrap_actions() -> List[Dict[str, Any]]:
+            paginator = self.emr_client.get_paginator('list_bootstrap_actions')
+            return [action
+                    for page in paginator.paginate(ClusterId=cluster_id)
+                    for action in page['BootstrapActions']]
+
         try:
-            response = self.emr_client.describe_cluster(ClusterId=cluster_id)
-            bootstrap_actions = self.emr_client.list_bootstrap_actions(ClusterId=cluster_id)
-            cluster = {**response['Cluster'], **bootstrap_actions['BootstrapActions']}
+            response = with_retries(lambda: self.emr_client.describe_cluster(ClusterId=cluster_id), on_retry=on_retry)
+            cluster: Dict[str, Any] = response['Cluster']
+            if bootstrap_actions:
+                cluster = {**cluster, 'BootstrapActions': with_retries(list_bootstrap_actions, on_retry=on_retry)}
             self._vprint(f'Got data for cluster "{cluster["Name"]}"')
         except ClientError:
             self._vprint(f"Couldn't get data for cluster {cluster_id}")
             raise
         else:
-            return dict(cluster)
+            return cluster
+
+    def describe_clusters(self, cluster_ids: List[str], max_workers: int = 8, bootstrap_actions: bool = True) \
+            -> Iterator[Tuple[str, Optional[Dict[str, Any]], Optional[ClientError]]]:
+        """
+        Gets detailed information about many clusters concurrently (see describe_cluster).
+
+        :param cluster_ids: The IDs of the clusters to describe.
+        :param max_workers: Max. number of clusters described at the same time.
+        :param bootstrap_actions: Whether to list bootstrap actions of the clusters (default=True).
+        :return: Iterator of (cluster ID, cluster information, None), or (cluster ID, None, error) if the cluster
+         couldn't be described, in the order of completion.
+        """
+        def describe(cluster_id: str) -> Tuple[str, Optional[Dict[str, Any]], Optional[ClientError]]:
+            try:
+                return cluster_id, self.describe_cluster(cluster_id, bootstrap_actions), None
+            except ClientError as e:
+                return cluster_id, None, e
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(cluster_ids)))) as executor:
+            for future in as_completed([executor.submit(describe, cluster_id) for cluster_id in cluster_ids]):
+                yield future.result()
+
+    def wait_for_cluster(self, cluster_id: str, timeout: Optional[float] = None) -> ClusterWaitResult:
+        """
+        Waits until a cluster is ready (WAITING or RUNNING). Concurrent waits (e.g. from many threads) share one
+        polling loop.
+
+        :param cluster_id: The ID of the cluster.
+        :param timeout: Max. seconds to wait (default=None, i.e. no limit).
+        :return: The final state and time spent in each state.
+        :raises ClusterFailedError: If the cluster is terminating or terminated.
+        :raises TimeoutError: If the cluster is not ready in time.
+        """
+        try:
+            result = get_waiter(self.emr_client).wait(
+                cluster_id, timeout, lambda c, state: self._vprint(f"Cluster {c} is {state}")
+            )
+            self._vprint(f"Cluster {cluster_id} is ready after {result.seconds:.0f}s")
+        except (ClientError, ClusterFailedError, TimeoutError):
+            self._vprint(f"Cluster {cluster_id} is not ready")
+            raise
+        else:
+            return result
+
+    def list_active_clusters(self) -> List[Dict[str, Any]]:
+        """
+        Gets all active (starting, bootstrapping, running or waiting) clusters.
+
+        :return: cluster summaries, as returned by ListClusters
+        """
+        return self.list_clusters(ACTIVE_CLUSTER_STATES)
+
+    def list_clusters(self, states: Optional[List[str]] = None, created_after: Optional[datetime] = None,
+                      created_before: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        Gets all clusters matching a filter.
+
+        :param states: Cluster states (default=None, i.e. any state).
+        :param created_after: Only clusters created after this time (default=None, i.e. no limit).
+        :param created_before: Only clusters created before this time (default=None, i.e. no limit).
+        :return: cluster summaries, as returned by ListClusters
+        """
+        kwargs: Dict[str, Any] = {}
+        if states:
+            kwargs['ClusterStates'] = states
+        if created_after:
+            kwargs['CreatedAfter'] = created_after
+        if created_before:
+            kwargs['CreatedBefore'] = created_before
+        try:
+            paginator = self.emr_client.get_paginator('list_clusters')
+            clusters = [cluster
+                        for page in with_retries(lambda: list(paginator.paginate(**kwargs)))
+                        for cluster in page['Clusters']]
+            self._vprint(f"Got {len(clusters)} clusters")
+        except ClientError:
+            self._vprint("Couldn't list clusters")
+            raise
+        else:
+            return clusters
 
     def terminate_cluster(self, cluster_id: str) -> None:
         """
@@ -267,6 +442,39 @@ class EMR:
             self._vprint(f"Couldn't terminate cluster {cluster_id}")
             raise
 
+    def terminate_clusters(self, cluster_ids: List[str]) -> Dict[str, Optional[ClientError]]:
+        """
+        Terminates many clusters, using as few requests as possible. Throttled requests are retried with jittered
+        exponential backoff. When a request fails (e.g. because one of the clusters is termination protected),
+        its clusters are terminated one by one, so that one cluster doesn't prevent terminating the others.
+
+        :param cluster_ids: The IDs of the clusters to terminate.
+        :return: None for each terminated cluster, or the error if the cluster couldn't be terminated; by cluster ID
+        """
+        def terminate(ids: List[str]) -> None:
+            with_retries(lambda: self.emr_client.terminate_job_flows(JobFlowIds=ids))
+
+        result: Dict[str, Optional[ClientError]] = {}
+        for i in range(0, len(cluster_ids), MAX_CLUSTERS_PER_TERMINATE):
+            chunk = cluster_ids[i:i + MAX_CLUSTERS_PER_TERMINATE]
+            try:
+                terminate(chunk)
+                result.update((cluster_id, None) for cluster_id in chunk)
+            except ClientError as e:
+                if len(chunk) == 1:
+                    result[chunk[0]] = e
+                    continue
+                for cluster_id in chunk:
+                    try:
+                        terminate([cluster_id])
+                        result[cluster_id] = None
+                    except ClientError as cluster_error:
+                        result[cluster_id] = cluster_error
+        for cluster_id, error in result.items():
+            self._vprint(f"Couldn't terminate cluster {cluster_id}: {error}" if error else
+                         f"Terminated cluster {cluster_id}")
+        return result
+
     def add_step(self, cluster_id: str, name: str, args: List[str]) -> str:
         """
         Adds a job step to the specified cluster. This example adds a Spark
@@ -280,14 +488,7 @@ class EMR:
         try:
             response = self.emr_client.add_job_flow_steps(
                 JobFlowId=cluster_id,
-                Steps=[{
-                    'Name': name,
-                    'ActionOnFailure': 'CONTINUE',
-                    'HadoopJarStep': {
-                        'Jar': 'command-runner.jar',
-                        'Args': args
-                    }
-                }])
+                Steps=[EMR._to_step_boto(name, args)])
             step_id = str(response['StepIds'][0])
             self._vprint(f"Started step {step_id}")
         except ClientError:
@@ -296,6 +497,75 @@ class EMR:
         else:
             return step_id
 
+    def add_steps(self, cluster_id: str, steps: List[Dict[str, Any]], timeout: Optional[float] = None) -> List[str]:
+        """
+        Adds many job steps to the specified cluster, using as few requests as possible. Throttled requests
+        are retried with jittered exponential backoff.
+
+        A cluster can have at most 256 pending and running steps, so a request adds at most as many steps as the
+        cluster can still accept (counted before the request). While the cluster cannot accept any more steps,
+        the remaining steps wait (polling with jittered exponential backoff) until some of its steps finish.
+        If the wait times out, or a request fails, the steps added so far are reported by the error.
+
+        :param cluster_id: The ID of the cluster.
+        :param steps: The steps to add. Structure:
+
+                {
+                    'Name': 'string',
+                    'Args': []
+                }
+        :param timeout: Max. seconds to wait for the cluster to accept more steps (default=None, i.e. no limit).
+        :return: IDs of the newly added steps, in the order of the steps.
+        :raises StepsNotAddedError: If not all steps were added; it carries IDs of the added steps.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        step_ids: List[str] = []
+        waits = 0
+        while len(step_ids) < len(steps):
+            start = len(step_ids)
+            try:
+                capacity = MAX_ACTIVE_STEPS - self._count_active_steps(cluster_id)
+                if capacity <= 0:
+                    remaining = deadline - time.monotonic() if deadline is not None else None
+                    if remaining is not None and remaining <= 0:
+                        raise StepsNotAddedError(cluster_id, step_ids, len(steps),
+                                                 f'the cluster has had {MAX_ACTIVE_STEPS} pending or running steps '
+                                                 f'for {timeout}s')
+                    waits += 1
+                    delay = backoff_delay(waits, base_delay=5, max_delay=60)
+                    self._vprint(f"Cluster has {MAX_ACTIVE_STEPS} pending or running steps, waiting {delay:.1f}s")
+                    with timed('emr.step_capacity', cluster_id):
+                        time.sleep(min(delay, remaining) if remaining is not None else delay)
+                    continue
+                waits = 0
+                chunk = [EMR._to_step_boto(step['Name'], step['Args']) for step in steps[start:start + capacity]]
+                response = with_retries(
+                    lambda: self.emr_client.add_job_flow_steps(JobFlowId=cluster_id, Steps=chunk),
+                    on_retry=lambda attempt, delay, e: self._vprint(f"Throttled, retrying in {delay:.1f}s")
+                )
+                step_ids += [str(step_id) for step_id in response['StepIds']]
+                self._vprint(f"Started {len(step_ids)}/{len(steps)} steps")
+            except (ClientError, BotoCoreError) as e:
+                self._vprint(f"Couldn't start steps {start + 1}-{len(steps)}")
+                raise StepsNotAddedError(cluster_id, step_ids, len(steps), str(e)) from e
+        return step_ids
+
+    def _count_active_steps(self, cluster_id: str) -> int:
+        paginator = self.emr_client.get_paginator('list_steps')
+        pages = with_retries(lambda: list(paginator.paginate(ClusterId=cluster_id, StepStates=ACTIVE_STEP_STATES)))
+        return sum(len(page['Steps']) for page in pages)
+
+    @staticmethod
+    def _to_step_boto(name: str, args: List[str]) -> Dict[str, Any]:
+        return {
+            'Name': name,
+            'ActionOnFailure': 'CONTINUE',
+            'HadoopJarStep': {
+                'Jar': 'command-runner.jar',
+                'Args': args
+            }
+        }
+
     def add_spark_step(self, cluster_id: str, name: str, deploy_mode: str, master: str, application_uri: str,
                        jars: Union[List[str], str], pyfiles: Union[List[str], str], classname: Optional[str],
                        arguments: List[str]) -> str:
@@ -313,6 +583,21 @@ class EMR:
         :param arguments: Arguments to pass to the application.
         :return: The ID of the newly added step.
         """
+        return self.add_step(
+            cluster_id, name,
+            EMR.spark_submit_args(deploy_mode, master, application_uri, jars, pyfiles, classname, arguments)
+        )
+
+    @staticmethod
+    def spark_submit_args(deploy_mode: str, master: Optional[str], application_uri: str,
+                          jars: Union[List[str], str, None], pyfiles: Union[List[str], str, None],
+                          classname: Optional[str], arguments: List[str]) -> List[str]:
+        """
+        Builds spark-submit command (arguments for the command-runner). Parameters are the same as in
+        add_spark_step.
+
+        :return: spark-submit command
+        """
         jars_str = (','.join(jars) if isinstance(jars, List) else jars) if jars else ''
         pyfiles_str = (','.join(pyfiles) if isinstance(pyfiles, List) else pyfiles) if pyfiles else ''
 
@@ -320,23 +605,28 @@ class EMR:
         pyfiles_arg = ['--py-files', pyfiles_str] if pyfiles_str != '' else []
         class_arg = ['--class', classname] if classname else []
         master_arg = ['--master', master] if master else []
-        return self.add_step(
-            cluster_id, name,
-            ['spark-submit', '--deploy-mode', deploy_mode, *master_arg, *jars_arg, *pyfiles_arg, *class_arg,
-             application_uri, *arguments]
-        )
+        return ['spark-submit', '--deploy-mode', deploy_mode, *master_arg, *jars_arg, *pyfiles_arg, *class_arg,
+                application_uri, *arguments]
 
-    def list_steps(self, cluster_id: str) -> Dict[str, Any]:
+    def list_steps(self, cluster_id: str, step_states: Optional[List[str]] = None,
+                   step_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """
-        Gets a list of steps for the specified cluster. In this example, all steps are
+        Gets a list of steps for the specified cluster. By default, all steps are
         returned, including completed and failed steps.
 
         :param cluster_id: The ID of the cluster.
+        :param step_states: Return only steps in these states (optional).
+        :param step_ids: Return only steps with these IDs (optional, max. 10).
         :return: The list of steps for the specified cluster.
         """
+        filters: Dict[str, Any] = {}
+        if step_states:
+            filters['StepStates'] = step_states
+        if step_ids:
+            filters['StepIds'] = step_ids
         try:
-            response = self.emr_client.list_steps(ClusterId=cluster_id)
-            steps = dict(response['Steps'])
+            paginator = self.emr_client.get_paginator('list_steps')
+            steps = [step for page in paginator.paginate(ClusterId=cluster_id, **filters) for step in page['Steps']]
             self._vprint(f"Got {len(steps)} steps for cluster {cluster_id}")
         except ClientError:
             self._vprint(f"Couldn't get steps for cluster {cluster_id}")
@@ -344,6 +634,17 @@ class EMR:
         else:
             return steps
 
+    def track_steps(self, cluster_id: str, step_ids: List[str], interval: float = 15) -> StepTracker:
+        """
+        Creates a tracker of many steps, which polls their states in batches.
+
+        :param cluster_id: The ID of the cluster.
+        :param step_ids: The IDs of the steps to track.
+        :param interval: Polling interval in seconds.
+        :return: The step tracker.
+        """
+        return StepTracker(self.emr_client, cluster_id, step_ids, interval)
+
     def describe_step(self, cluster_id: str, step_id: str) -> Dict[str, Any]:
         """
         Gets detailed information about the specified step, including the current state of
@@ -0,0 +1,91 @@
+"""
+EMR cluster idleness
+
+Determines idleness of many EMR clusters at once from the CloudWatch "IsIdle" metric, packing metric queries
+of many clusters into each GetMetricData request.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, NamedTuple, Optional
+
+MAX_QUERIES_PER_REQUEST = 500  # GetMetricData limit
+PERIOD_SECONDS = 300  # 5-minute period, available for 63 days
+
+
+class ClusterIdleness(NamedTuple):
+    cluster_id: str
+    is_idle: bool  # idle for the whole checked time
+    idle_minutes: int  # how long the cluster has been idle until now
+
+
+def get_idleness(cloudwatch: Any, cluster_ids: List[str], idleness: timedelta, now: Optional[datetime] = None,
+                 max_workers: int = 4) -> Dict[str, ClusterIdleness]:
+    """
+    Determines idleness of EMR clusters.
+
+    :param cloudwatch: boto3 CloudWatch client
+    :param cluster_ids: cluster IDs
+    :param idleness: idleness time; a cluster is idle if it was idle for the whole time
+    :param now: end of the checked time (default=current time)
+    :param max_workers: max. number of GetMetricData requests in flight
+    :return: idleness of each cluster, by cluster ID
+    """
+    end = now if now else datetime.now(timezone.utc)
+    start = end - idleness
+    batches = [cluster_ids[i:i + MAX_QUERIES_PER_REQUEST] for i in range(0, len(cluster_ids),
+                                                                         MAX_QUERIES_PER_REQUEST)]
+    idle_cluster_value = int(idleness.total_seconds() / PERIOD_SECONDS)  # all 5-minute intervals must be 1.0
+
+    result: Dict[str, ClusterIdleness] = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as executor:
+        for batch, values in zip(batches, executor.map(lambda b: _get_metric_values(cloudwatch, b, start, end),
+                                                       batches)):
+            for i, cluster_id in enumerate(batch):
+                cluster_values = values.get(f'c{i}', [])
+                idle_period = 0
+                for v in cluster_values:
+                    if v == 1.0:
+                        idle_period += PERIOD_SECONDS // 60  # each 1.0 means 5 minutes idleness
+                    else:
+                        break
+                is_idle = sum(cluster_values) == idle_cluster_value
+                result[cluster_id] = ClusterIdleness(cluster_id, is_idle, idle_period)
+    return result
+
+
+def _get_metric_values(cloudwatch: Any, cluster_ids: List[str], start: datetime, end: datetime) \
+        -> Dict[str, List[float]]:
+    queries = [{
+        'Id': f'c{i}',
+        'MetricStat': {
+            'Metric': {
+                'Namespace': 'AWS/ElasticMapReduce',
+                'MetricName': 'IsIdle',
+                'Dimensions': [{
+                    'Name': 'JobFlowId',
+                    'Value': cluster_id
+                }]
+            },
+            'Period': PERIOD_SECONDS,
+            'Stat': 'Maximum',
+            'Unit': 'None'
+        },
+        'ReturnData': True,
+    } for i, cluster_id in enumerate(cluster_ids)]
+
+    values: Dict[str, List[float]] = {}
+    kwargs: Dict[str, Any] = {}
+    while True:
+        response = cloudwatch.get_metric_data(
+            MetricDataQueries=queries,
+            StartTime=start,
+            EndTime=end,
+            ScanBy='TimestampDescending',
+            **kwargs
+        )
+        for r in response['MetricDataResults']:
+            values.setdefault(r['Id'], []).extend(r['Values'])
+        if 'NextToken' not in response:
+            return values
+        kwargs['NextToken'] = response['NextToken']
@@ -0,0 +1,202 @@
+"""
+EMR step logs
+
+Reads and follows logs of EMR steps, which EMR pushes to the log URI of the cluster, e.g.
+"s3://my-log-bucket/logs/j-XXXX/steps/s-XXXX/stdout.gz". While a step runs, EMR periodically replaces the log
+objects with newer (longer) versions.
+
+Log objects are read by ranged GETs of bounded size and gzipped ones are decompressed as a stream, so a whole log is
+never held in memory. When a followed object is replaced (its ETag changes), it is read again and only the bytes
+not emitted yet are returned; reads are conditional on the ETag, so a version replaced during a read is abandoned
+and read again on the next poll.
+"""
+
+import time
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+from awsscripts.emr.emr import EMR
+from awsscripts.emr.steps import TERMINAL_STEP_STATES
+
+STEP_LOGS = ('stdout', 'stderr', 'controller', 'syslog')
+CHUNK_SIZE = 1024 * 1024  # bytes read by one ranged GET, and max. bytes decompressed at once
+GZIP_WBITS = 16 + zlib.MAX_WBITS  # gzip header and trailer
+S3_SCHEMES = ('s3://', 's3n://', 's3a://')
+
+
+class LogChunk(NamedTuple):
+    log: str  # e.g. "stdout"
+    data: bytes
+
+
+def parse_s3_uri(uri: str) -> Tuple[str, str]:
+    """
+    Parses an S3 URI (s3://, or s3n:// and s3a:// as used in EMR log URIs)
+    :param uri: the URI
+    :return: bucket and key (or key prefix)
+    """
+    for scheme in S3_SCHEMES:
+        if uri.startswith(scheme):
+            bucket, _, key = uri[len(scheme):].partition('/')
+            return bucket, key
+    raise ValueError(f'Not an S3 URI: {uri}')
+
+
+def step_log_location(log_uri: str, cluster_id: str, step_id: str, log: str) -> Tuple[str, str]:
+    """
+    Gets S3 location of a step log
+    :param log_uri: log URI of the cluster
+    :param cluster_id: cluster ID
+    :param step_id: step ID
+    :param log: log name (see STEP_LOGS)
+    :return: bucket and key of the (gzipped) log
+    """
+    bucket, prefix = parse_s3_uri(log_uri)
+    prefix = f'{prefix.rstrip("/")}/' if prefix.strip('/') else ''
+    return bucket, f'{prefix}{cluster_id}/steps/{step_id}/{log}.gz'
+
+
+def decompress(chunks: Iterator[bytes], max_output: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Decompresses a gzip stream (of one or more gzip members) incrementally
+    :param chunks: iterator of compressed data
+    :param max_output: max. size of one piece of decompressed data
+    :return: iterator of decompressed data
+    """
+    decompressor = zlib.decompressobj(GZIP_WBITS)
+    for data in chunks:
+        while True:
+            output = decompressor.decompress(data, max_output)
+            if output:
+                yield output
+            if decompressor.eof:  # end of a gzip member, another one may follow
+                data = decompressor.unused_data
+                decompressor = zlib.decompressobj(GZIP_WBITS)
+                if not data:
+                    break
+            else:
+                data = decompressor.unconsumed_tail
+                if not data and len(output) < max_output:
+                    break
+    output = decompressor.flush()
+    if output:
+        yield output
+
+
+class LogFollower:
+    """
+    Follows one S3 log object, which may not exist yet, and which may be replaced by longer versions.
+    """
+
+    def __init__(self, s3_client: Any, bucket: str, key: str, chunk_size: int = CHUNK_SIZE) -> None:
+        """
+        :param s3_client: boto3 S3 client
+        :param bucket: bucket of the log
+        :param key: key of the log; logs with the ".gz" suffix are decompressed
+        :param chunk_size: bytes read by one ranged GET
+        """
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.chunk_size = chunk_size
+        self.etag: Optional[str] = None  # ETag of the version read completely
+        self.last_modified: Optional[datetime] = None
+        self.position = 0  # bytes (decompressed) emitted so far
+
+    def poll(self) -> Iterator[bytes]:
+        """
+        Reads the log, if it has changed since the last poll
+        :return: iterator of new data of the log
+        """
+        try:
+            head = self.s3_client.head_object(Bucket=self.bucket, Key=self.key)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return
+            raise
+        etag = head['ETag']
+        if etag == self.etag:
+            return
+
+        gzipped = self.key.endswith('.gz')
+        # a plain log grows by appending, so only the new bytes are read; a gzipped one must be read from its start
+        start = 0 if gzipped else min(self.position, head['ContentLength'])
+        chunks = self._read(etag, start, head['ContentLength'])
+        skip = self.position - start
+        try:
+            for data in (decompress(chunks, self.chunk_size) if gzipped else chunks):
+                if skip >= len(data):
+                    skip -= len(data)
+                    continue
+                data, skip = data[skip:], 0
+                self.position += len(data)
+                yield data
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('412', 'PreconditionFailed'):
+                return  # replaced while reading, the next poll reads the new version
+            raise
+        self.etag = etag
+        self.last_modified = head['LastModified']
+
+    def _read(self, etag: str, start: int, size: int) -> Iterator[bytes]:
+        for offset in range(start, size, self.chunk_size):
+            end = min(offset + self.chunk_size, size) - 1
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=self.key, Range=f'bytes={offset}-{end}',
+                                                 IfMatch=etag)
+            yield response['Body'].read()
+
+
+def tail_step_logs(emr: EMR, s3_client: Any, cluster_id: str, step_id: str, log_uri: str,
+                   logs: Tuple[str, ...] = ('stdout',), follow: bool = False, interval: float = 15,
+                   grace: float = 600) -> Iterator[LogChunk]:
+    """
+    Reads logs of a step, and optionally follows them until the step finishes.
+
+    EMR pushes the final logs a few minutes after the step finishes, so after that, logs are followed until all
+    existing ones have a version written after the step ended, but at most for the grace time.
+
+    :param emr: EMR
+    :param s3_client: boto3 S3 client
+    :param cluster_id: cluster ID
+    :param step_id: step ID
+    :param log_uri: log URI of the cluster
+    :param logs: logs to read (see STEP_LOGS)
+    :param follow: if True, logs are followed until the step finishes; otherwise the current versions are read
+    :param interval: polling interval in seconds
+    :param grace: max. seconds to wait for the final logs after the step finished
+    :return: iterator of log data
+    """
+    followers = {log: LogFollower(s3_client, *step_log_location(log_uri, cluster_id, step_id, log)) for log in logs}
+    ended: Optional[datetime] = None
+    ended_seen: Optional[float] = None
+    while True:
+        if follow and ended_seen is None:
+            status = emr.describe_step(cluster_id, step_id)['Status']
+            if status['State'] in TERMINAL_STEP_STATES:
+                ended = status.get('Timeline', {}).get('EndDateTime')
+                ended_seen = time.monotonic()
+        for log, follower in followers.items():
+            for data in follower.poll():
+                yield LogChunk(log, data)
+        if not follow:
+            return
+        if ended_seen is not None:
+            modified = [f.last_modified for f in followers.values() if f.last_modified is not None]
+            final = ended is not None and bool(modified) and all(m >= ended for m in modified)
+            if final or time.monotonic() - ended_seen >= grace:
+                return
+        time.sleep(interval)
+
+
+def latest_step(emr: EMR, cluster_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Gets the most recently added step of a cluster (with one ListSteps request)
+    :param emr: EMR
+    :param cluster_id: cluster ID
+    :return: the step; None if the cluster has no steps
+    """
+    steps: List[Dict[str, Any]] = emr.emr_client.list_steps(ClusterId=cluster_id)['Steps']
+    return steps[0] if steps else None
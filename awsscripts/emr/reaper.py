@@ -0,0 +1,96 @@
+"""
+EMR cluster reaper
+
+Terminates idle EMR clusters matching a filter, with as few API calls as possible: active clusters are listed once,
+the ones matching a name pattern are described concurrently (to get tags and termination protection), idleness of
+all of them is determined by batched CloudWatch queries, and idle clusters are terminated in batches.
+"""
+
+from datetime import timedelta
+from fnmatch import fnmatch
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from awsscripts.emr.emr import EMR
+from awsscripts.emr.idle import get_idleness
+
+REAPED_CLUSTER_STATES = ['RUNNING', 'WAITING']  # starting clusters are never idle
+
+# actions taken with a cluster
+TERMINATED = 'TERMINATED'
+WOULD_TERMINATE = 'WOULD_TERMINATE'  # dry run
+KEPT_BUSY = 'KEPT_BUSY'
+KEPT_PROTECTED = 'KEPT_PROTECTED'
+FAILED = 'FAILED'  # could not be described or terminated
+
+
+class ReapedCluster(NamedTuple):
+    cluster_id: str
+    name: str
+    state: str
+    is_idle: bool
+    idle_minutes: int
+    protected: bool  # TerminationProtected
+    action: str  # see actions above
+    error: Optional[str]
+
+
+def reap_clusters(emr: EMR, cloudwatch: Any, idleness: timedelta, name_pattern: Optional[str] = None,
+                  tags: Optional[Dict[str, Optional[str]]] = None, dry_run: bool = False,
+                  max_workers: int = 8) -> List[ReapedCluster]:
+    """
+    Terminates idle clusters matching a filter. Termination protected clusters are never terminated.
+
+    :param emr: EMR
+    :param cloudwatch: boto3 CloudWatch client
+    :param idleness: idleness time; a cluster is idle if it was idle for the whole time
+    :param name_pattern: only clusters with names matching a shell-style pattern (default=None, i.e. any name)
+    :param tags: only clusters with all these tags; a tag value of None matches any value (default=None, i.e. any
+     tags)
+    :param dry_run: if True, idle clusters are only reported, not terminated
+    :param max_workers: max. number of clusters described at the same time
+    :return: matching clusters and actions taken with them
+    """
+    summaries = [cluster for cluster in emr.list_clusters(REAPED_CLUSTER_STATES)
+                 if not name_pattern or fnmatch(cluster['Name'], name_pattern)]
+
+    result: List[ReapedCluster] = []
+    clusters: Dict[str, Dict[str, Any]] = {}
+    for cluster_id, cluster, error in emr.describe_clusters([c['Id'] for c in summaries], max_workers,
+                                                            bootstrap_actions=False):
+        if cluster is None:
+            summary = next(c for c in summaries if c['Id'] == cluster_id)
+            result.append(ReapedCluster(cluster_id, summary['Name'], summary['Status']['State'], False, 0, False,
+                                        FAILED, str(error)))
+        elif _has_tags(cluster, tags or {}):
+            clusters[cluster_id] = cluster
+    if not clusters:
+        return result
+
+    idleness_by_id = get_idleness(cloudwatch, list(clusters), idleness)
+    idle = [cluster_id for cluster_id, cluster in clusters.items()
+            if idleness_by_id[cluster_id].is_idle and not cluster.get('TerminationProtected')]
+    errors: Dict[str, Optional[str]] = {}
+    if idle and not dry_run:
+        errors = {cluster_id: str(error) if error else None
+                  for cluster_id, error in emr.terminate_clusters(idle).items()}
+
+    for cluster_id, cluster in clusters.items():
+        cluster_idleness = idleness_by_id[cluster_id]
+        protected = bool(cluster.get('TerminationProtected'))
+        error = errors.get(cluster_id)
+        if not cluster_idleness.is_idle:
+            action = KEPT_BUSY
+        elif protected:
+            action = KEPT_PROTECTED
+        elif dry_run:
+            action = WOULD_TERMINATE
+        else:
+            action = FAILED if error else TERMINATED
+        result.append(ReapedCluster(cluster_id, cluster['Name'], cluster['Status']['State'], cluster_idleness.is_idle,
+                                    cluster_idleness.idle_minutes, protected, action, error))
+    return result
+
+
+def _has_tags(cluster: Dict[str, Any], tags: Dict[str, Optional[str]]) -> bool:
+    cluster_tags = {tag['Key']: tag.get('Value') for tag in cluster.get('Tags', [])}
+    return all(key in cluster_tags and (value is None or cluster_tags[key] == value) for key, value in tags.items())
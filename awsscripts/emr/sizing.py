@@ -0,0 +1,115 @@
+"""
+Spark sizing solver
+
+Evaluates Spark sizing (as generated by EmrConfigurations) for all instance types of the instance catalog and
+a range of node counts, and ranks the cluster shapes.
+"""
+
+import heapq
+import math
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from awsscripts.ec2.ec2 import InstanceCatalog, instance_catalog
+from awsscripts.emr.configurations import EmrConfigurations, SPARK_EXECUTOR_CORES, GBITS2GBYTES, \
+    spark_executors_count, spark_node_sizing
+
+RANKINGS = ('executor_memory', 'executor_cores', 'wasted_memory', 'cost')
+
+
+class SparkSizing(NamedTuple):
+    instance_type: str
+    node_count: int
+    executors: int
+    executor_memory: int  # memory per executor (GB)
+    total_executor_memory: int  # memory of all executors (GB)
+    total_executor_cores: int
+    wasted_memory_per_node: float  # node memory not usable by whole executors (GB)
+    cost: Optional[float]  # cost of the cluster (from the cost table), None if no cost table was given
+    spark_defaults: Dict[str, str]  # full "spark-defaults" configuration properties
+
+
+def solve_spark_sizing(node_counts: Iterable[int], rank_by: str = 'executor_memory', top: int = 10,
+                       cost_table: Optional[Dict[str, float]] = None,
+                       min_executor_memory: Optional[float] = None, min_executor_cores: Optional[int] = None,
+                       catalog: InstanceCatalog = instance_catalog) -> List[SparkSizing]:
+    """
+    Finds the best cluster shapes (instance type, node count) by given ranking.
+
+    The node-independent part of the sizing is computed once per instance type; all (instance type, node count)
+    combinations are then evaluated in a single pass, keeping only the best `top` candidates.
+
+    :param node_counts: node counts to consider (including master)
+    :param rank_by: ranking, one of:
+      - 'executor_memory': most total executor memory first
+      - 'executor_cores': most total executor cores first
+      - 'wasted_memory': least memory wasted per node first
+      - 'cost': cheapest cluster first (requires cost_table)
+    :param top: number of best candidates to return
+    :param cost_table: cost of a node by instance type (e.g. hourly price). If given, instance types missing from it
+     are not considered.
+    :param min_executor_memory: consider only shapes with at least this total executor memory (GB)
+    :param min_executor_cores: consider only shapes with at least this many executor cores
+    :param catalog: instance catalog
+    :return: best candidates, with full spark-defaults
+    """
+    if rank_by not in RANKINGS:
+        raise ValueError(f'Unknown ranking "{rank_by}", expected one of {RANKINGS}')
+    if rank_by == 'cost' and cost_table is None:
+        raise ValueError('Ranking by cost requires a cost table')
+    node_counts = list(node_counts)
+
+    # Node-independent part: (row, executors per node, executor memory, wasted memory per node, node cost)
+    nodes: List[Tuple[int, float, int, float, float]] = []
+    for row, (name, cpu, memory) in enumerate(zip(catalog.names, catalog.cpu, catalog.memory)):
+        if cpu <= SPARK_EXECUTOR_CORES or (cost_table is not None and name not in cost_table):
+            continue  # a node must fit at least one whole executor (and 1 vCPU for the node itself)
+        node = spark_node_sizing(cpu, memory)
+        if node.executor_memory <= 0:
+            continue
+        whole_executors = math.floor(node.executors_per_node)
+        used_memory = whole_executors * (node.executor_memory / GBITS2GBYTES + node.memory_overhead)
+        nodes.append((row, node.executors_per_node, node.executor_memory, max(0.0, memory - used_memory),
+                      cost_table[name] if cost_table is not None else 0.0))
+
+    def candidates() -> Iterator[Tuple[float, int, int, int, int, int, float]]:
+        for row, executors_per_node, executor_memory, wasted, node_cost in nodes:
+            for node_count in node_counts:
+                executors = spark_executors_count(executors_per_node, node_count)
+                total_memory = executors * executor_memory
+                total_cores = executors * SPARK_EXECUTOR_CORES
+                if min_executor_memory is not None and total_memory < min_executor_memory:
+                    continue
+                if min_executor_cores is not None and total_cores < min_executor_cores:
+                    continue
+                cost = node_cost * node_count
+                key: float
+                if rank_by == 'executor_memory':
+                    key = -total_memory
+                elif rank_by == 'executor_cores':
+                    key = -total_cores
+                elif rank_by == 'wasted_memory':
+                    key = wasted
+                else:
+                    key = cost
+                yield key, row, node_count, executors, total_memory, total_cores, wasted
+
+    best = heapq.nsmallest(top, candidates(), key=lambda c: (c[0], c[2], c[1]))
+    return [_to_sizing(catalog, cost_table, *candidate[1:]) for candidate in best]
+
+
+def _to_sizing(catalog: InstanceCatalog, cost_table: Optional[Dict[str, float]], row: int, node_count: int,
+               executors: int, total_memory: int, total_cores: int, wasted: float) -> SparkSizing:
+    name = catalog.names[row]
+    configurations: List[Dict[str, Any]] = EmrConfigurations._generate_spark(name, node_count)
+    spark_defaults = next(c['Properties'] for c in configurations if c['Classification'] == 'spark-defaults')
+    return SparkSizing(
+        instance_type=name,
+        node_count=node_count,
+        executors=executors,
+        executor_memory=total_memory // executors,
+        total_executor_memory=total_memory,
+        total_executor_cores=total_cores,
+        wasted_memory_per_node=wasted,
+        cost=cost_table[name] * node_count if cost_table is not None else None,
+        spark_defaults=spark_defaults
+    )
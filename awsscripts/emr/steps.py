@@ -0,0 +1,144 @@
+"""
+EMR step tracker
+
+Tracks states of many EMR steps of a cluster with as few ListSteps calls as possible, until all the steps finish.
+"""
+
+import time
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+from awsscripts.aws.retry import with_retries
+
+ACTIVE_STEP_STATES = ['PENDING', 'CANCEL_PENDING', 'RUNNING']
+TERMINAL_STEP_STATES = {'COMPLETED', 'CANCELLED', 'FAILED', 'INTERRUPTED'}
+MAX_STEP_IDS_PER_REQUEST = 10  # ListSteps accepts max. 10 step IDs
+MAX_ACTIVE_STEPS = 256  # max. number of pending and running steps of a cluster
+
+
+class StepsNotAddedError(RuntimeError):
+    """
+    Raised when not all steps could be added to a cluster. Steps added before the failure are queued on the cluster.
+    """
+
+    def __init__(self, cluster_id: str, step_ids: List[str], total: int, reason: str) -> None:
+        super().__init__(f'Only {len(step_ids)} of {total} steps were added to cluster {cluster_id}: {reason}')
+        self.cluster_id = cluster_id
+        self.step_ids = step_ids  # IDs of the steps added before the failure
+        self.total = total
+
+
+class StepNotFoundError(RuntimeError):
+
+    def __init__(self, cluster_id: str, step_ids: List[str]) -> None:
+        super().__init__(f'Steps not found in cluster {cluster_id}: {", ".join(step_ids)}')
+        self.cluster_id = cluster_id
+        self.step_ids = step_ids
+
+
+class StepEvent(NamedTuple):
+    step_id: str
+    name: str
+    state: str
+    previous_state: Optional[str]
+    reason: Optional[str]  # failure message, if any
+
+
+class StepSummary(NamedTuple):
+    states: Dict[str, str]  # final state of each step
+    counts: Dict[str, int]  # number of steps in each final state
+    seconds: float  # how long the tracking took
+
+    @property
+    def succeeded(self) -> bool:
+        return all(state == 'COMPLETED' for state in self.states.values())
+
+
+class StepTracker:
+    """
+    Tracks steps of a cluster until they all are in a terminal state.
+
+    While at most 10 steps are still running, they are looked up by their IDs. Otherwise, one paginated listing
+    of active (pending or running) steps updates all of them; tracked steps missing from the listing have
+    finished, and only those are looked up by their IDs to get their final state. Throttled ListSteps calls are
+    retried.
+    """
+
+    def __init__(self, emr_client: Any, cluster_id: str, step_ids: List[str], interval: float = 15) -> None:
+        """
+        :param emr_client: boto3 EMR client
+        :param cluster_id: cluster ID
+        :param step_ids: IDs of steps to track
+        :param interval: polling interval in seconds
+        """
+        self.emr_client = emr_client
+        self.cluster_id = cluster_id
+        self.interval = interval
+        self.states: Dict[str, Optional[str]] = {step_id: None for step_id in step_ids}
+        self.names: Dict[str, str] = {}
+        self._started = time.monotonic()
+
+    @property
+    def done(self) -> bool:
+        return all(state in TERMINAL_STEP_STATES for state in self.states.values())
+
+    def poll(self) -> List[StepEvent]:
+        """
+        Updates states of all not yet finished steps.
+        :return: state changes
+        :raises StepNotFoundError: if some steps do not exist in the cluster
+        """
+        pending = [step_id for step_id, state in self.states.items() if state not in TERMINAL_STEP_STATES]
+        if len(pending) > MAX_STEP_IDS_PER_REQUEST:
+            steps = self._list_steps(StepStates=ACTIVE_STEP_STATES)
+            active = {step['Id'] for step in steps}
+            finished = [step_id for step_id in pending if step_id not in active]
+        else:
+            steps = []
+            finished = pending
+        for i in range(0, len(finished), MAX_STEP_IDS_PER_REQUEST):
+            steps += self._list_steps(StepIds=finished[i:i + MAX_STEP_IDS_PER_REQUEST])
+        listed = {step['Id'] for step in steps}
+        unknown = [step_id for step_id in finished if step_id not in listed]
+        if unknown:  # not active, and not found by ID either
+            raise StepNotFoundError(self.cluster_id, unknown)
+
+        events = []
+        for step in steps:
+            step_id = step['Id']
+            if step_id not in self.states:
+                continue
+            self.names[step_id] = step['Name']
+            state = step['Status']['State']
+            if state != self.states[step_id]:
+                reason = step['Status'].get('FailureDetails', {}).get('Message')
+                events.append(StepEvent(step_id, step['Name'], state, self.states[step_id], reason))
+                self.states[step_id] = state
+        return events
+
+    def track(self) -> Iterator[StepEvent]:
+        """
+        Polls until all steps are finished, and yields their state changes.
+        :return: iterator of state changes
+        :raises StepNotFoundError: if some steps do not exist in the cluster
+        """
+        while True:
+            yield from self.poll()
+            if self.done:
+                return
+            time.sleep(self.interval)
+
+    def summary(self) -> StepSummary:
+        """
+        Summarizes states of the tracked steps
+        :return: the summary
+        """
+        states = {step_id: state or 'UNKNOWN' for step_id, state in self.states.items()}
+        counts: Dict[str, int] = {}
+        for state in states.values():
+            counts[state] = counts.get(state, 0) + 1
+        return StepSummary(states, counts, time.monotonic() - self._started)
+
+    def _list_steps(self, **kwargs: Any) -> List[Dict[str, Any]]:
+        paginator = self.emr_client.get_paginator('list_steps')
+        pages = with_retries(lambda: list(paginator.paginate(ClusterId=self.cluster_id, **kwargs)))
+        return [step for page in pages for step in page['Steps']]
@@ -0,0 +1,224 @@
+"""
+EMR cluster waiter
+
+Waits until EMR clusters are ready. All waits on the same EMR client share one polling loop, which looks up all
+waited clusters at once, and polls adaptively: rarely while a cluster has been just created, more often as it
+approaches the expected ready time, and backing off again when it takes longer than expected.
+"""
+
+import threading
+import time
+import weakref
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from awsscripts.aws.retry import with_retries
+
+READY_STATES = {'WAITING', 'RUNNING'}
+FAILED_STATES = {'TERMINATING', 'TERMINATED', 'TERMINATED_WITH_ERRORS'}
+
+
+class ClusterWaitResult(NamedTuple):
+    cluster_id: str
+    state: str  # final state (WAITING or RUNNING)
+    seconds: float  # how long the wait took
+    time_in_state: Dict[str, float]  # seconds spent in each observed state during the wait
+
+
+class ClusterFailedError(RuntimeError):
+
+    def __init__(self, cluster_id: str, state: str, reason: Dict[str, Any]) -> None:
+        super().__init__(f"Cluster {cluster_id} is {state}: {reason.get('Code', 'UNKNOWN')} - "
+                         f"{reason.get('Message', 'no reason given')}")
+        self.cluster_id = cluster_id
+        self.state = state
+        self.reason = reason
+
+
+class _Wait:
+
+    def __init__(self, cluster_id: str, on_state_change: Optional[Callable[[str, str], None]]) -> None:
+        self.cluster_id = cluster_id
+        self.on_state_change = on_state_change
+        self.started = time.monotonic()
+        self.state: Optional[str] = None
+        self.state_since = self.started
+        self.time_in_state: Dict[str, float] = {}
+        self.created: Optional[datetime] = None
+        self.interval: Optional[float] = None
+        self.result: Optional[ClusterWaitResult] = None
+        self.error: Optional[Exception] = None
+
+    @property
+    def done(self) -> bool:
+        return self.result is not None or self.error is not None
+
+
+class ClusterWaiter:
+    """
+    Waits for EMR clusters to become ready (WAITING or RUNNING). Many threads can wait at the same time; a single
+    polling thread serves them all, with one DescribeCluster call per new cluster and then one (paginated)
+    ListClusters call per poll for all clusters. Throttled calls are retried, and a failed lookup of a cluster
+    (e.g. of an unknown cluster ID) fails only the waits for that cluster.
+    """
+
+    def __init__(self, emr_client: Any, expected_ready_seconds: float = 600, min_interval: float = 5,
+                 max_interval: float = 60) -> None:
+        """
+        :param emr_client: boto3 EMR client
+        :param expected_ready_seconds: expected time from cluster creation until it is ready
+        :param min_interval: min. polling interval in seconds
+        :param max_interval: max. polling interval in seconds
+        """
+        self.emr_client = emr_client
+        self.expected_ready_seconds = expected_ready_seconds
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._waits: Dict[str, List[_Wait]] = {}
+        self._condition = threading.Condition()
+        self._wakeup = threading.Event()
+        self._poller: Optional[threading.Thread] = None
+
+    def wait(self, cluster_id: str, timeout: Optional[float] = None,
+             on_state_change: Optional[Callable[[str, str], None]] = None) -> ClusterWaitResult:
+        """
+        Waits until a cluster is ready.
+
+        :param cluster_id: cluster ID
+        :param timeout: max. seconds to wait (default=None, i.e. no limit)
+        :param on_state_change: called (from the polling thread) with cluster ID and new state on every observed
+         state change
+        :return: the result with time-in-state metrics
+        :raises ClusterFailedError: if the cluster is terminating or terminated
+        :raises TimeoutError: if the cluster is not ready in time
+        """
+        wait = _Wait(cluster_id, on_state_change)
+        with self._condition:
+            self._waits.setdefault(cluster_id, []).append(wait)
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll_loop, name='emr-cluster-waiter', daemon=True)
+                self._poller.start()
+            else:
+                self._wakeup.set()  # look up the new cluster right away
+            finished = self._condition.wait_for(lambda: wait.done, timeout)
+            if not finished:
+                self._remove(wait)
+                raise TimeoutError(f'Cluster {cluster_id} is not ready after {timeout} seconds')
+        if wait.error:
+            raise wait.error
+        assert wait.result is not None
+        return wait.result
+
+    def _remove(self, wait: _Wait) -> None:
+        waits = self._waits.get(wait.cluster_id, [])
+        if wait in waits:
+            waits.remove(wait)
+        if not waits:
+            self._waits.pop(wait.cluster_id, None)
+
+    def _poll_loop(self) -> None:
+        while True:
+            self._wakeup.clear()  # before the snapshot, so that waits added after it wake up the next sleep
+            with self._condition:
+                if not self._waits:
+                    self._poller = None
+                    return
+                waits = {cluster_id: list(w) for cluster_id, w in self._waits.items()}
+
+            statuses, errors = self._lookup(waits)
+
+            callbacks: List[Tuple[Callable[[str, str], None], str, str]] = []
+            with self._condition:
+                for cluster_id, error in errors.items():  # report lookup errors to the threads waiting for the cluster
+                    for wait in waits.get(cluster_id, []):
+                        wait.error = error
+                        self._remove(wait)
+                now = time.monotonic()
+                for cluster_id, (status, created) in statuses.items():
+                    for wait in waits.get(cluster_id, []):
+                        wait.created = wait.created or created
+                        state = status['State']
+                        if state != wait.state:
+                            if wait.state:
+                                wait.time_in_state[wait.state] = wait.time_in_state.get(wait.state, 0) + \
+                                                                 now - wait.state_since
+                            wait.state = state
+                            wait.state_since = now
+                            if wait.on_state_change:
+                                callbacks.append((wait.on_state_change, cluster_id, state))
+                        if state in READY_STATES or state in FAILED_STATES:
+                            wait.time_in_state[state] = wait.time_in_state.get(state, 0) + now - wait.state_since
+                            if state in READY_STATES:
+                                wait.result = ClusterWaitResult(cluster_id, state, now - wait.started,
+                                                                dict(wait.time_in_state))
+                            else:
+                                wait.error = ClusterFailedError(cluster_id, state,
+                                                                status.get('StateChangeReason', {}))
+                            self._remove(wait)
+                        else:
+                            wait.interval = self._next_interval(wait)
+                intervals = [w.interval for ws in self._waits.values() for w in ws if w.interval is not None]
+
+            for callback, cluster_id, state in callbacks:
+                callback(cluster_id, state)
+            with self._condition:
+                self._condition.notify_all()
+            self._wakeup.wait(min(intervals) if intervals else self.min_interval)
+
+    def _next_interval(self, wait: _Wait) -> float:
+        if wait.state != 'STARTING' or wait.created is None:
+            return self.min_interval  # bootstrapping is the last phase before the cluster is ready
+        elapsed = (datetime.now(wait.created.tzinfo) - wait.created).total_seconds()
+        remaining = self.expected_ready_seconds - elapsed
+        if remaining > 0:
+            interval = remaining / 2  # tighten as the expected ready time approaches
+        else:
+            interval = (wait.interval or self.min_interval) * 1.5  # back off, it takes longer than expected
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def _lookup(self, waits: Dict[str, List[_Wait]]) \
+            -> Tuple[Dict[str, Tuple[Dict[str, Any], Optional[datetime]]], Dict[str, Exception]]:
+        # statuses of the clusters which were looked up, and errors of the ones which were not
+        statuses: Dict[str, Tuple[Dict[str, Any], Optional[datetime]]] = {}
+        errors: Dict[str, Exception] = {}
+        created = [w.created for ws in waits.values() for w in ws if w.created]
+        if len(waits) > 1 and created:
+            created_after = min(created) - timedelta(seconds=1)
+            paginator = self.emr_client.get_paginator('list_clusters')
+            try:
+                pages = with_retries(lambda: list(paginator.paginate(CreatedAfter=created_after)))
+            except Exception:  # the clusters are described one by one below
+                pages = []
+            for page in pages:
+                for cluster in page['Clusters']:
+                    if cluster['Id'] in waits:
+                        statuses[cluster['Id']] = (cluster['Status'],
+                                                   cluster['Status'].get('Timeline', {}).get('CreationDateTime'))
+        for cluster_id in waits:
+            if cluster_id not in statuses:  # new or not listed clusters
+                try:
+                    cluster = with_retries(lambda: self.emr_client.describe_cluster(ClusterId=cluster_id)['Cluster'])
+                except Exception as e:
+                    errors[cluster_id] = e
+                    continue
+                statuses[cluster_id] = (cluster['Status'],
+                                        cluster['Status'].get('Timeline', {}).get('CreationDateTime'))
+        return statuses, errors
+
+
+_waiters: 'weakref.WeakKeyDictionary[Any, ClusterWaiter]' = weakref.WeakKeyDictionary()
+_waiters_lock = threading.Lock()
+
+
+def get_waiter(emr_client: Any) -> ClusterWaiter:
+    """
+    Gets the waiter shared by all waits using an EMR client
+    :param emr_client: boto3 EMR client
+    :return: cluster waiter
+    """
+    with _waiters_lock:
+        waiter = _waiters.get(emr_client)
+        if waiter is None:
+            waiter = ClusterWaiter(emr_client)
+            _waiters[emr_client] = waiter
+        return waiter
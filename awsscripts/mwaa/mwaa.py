@@ -0,0 +1,215 @@
+"""
+MWAA - Managed Workflows for Apache Airflow
+
+Helper class to run Airflow CLI commands on MWAA environments using Boto3 Python library and the MWAA CLI
+HTTP endpoint.
+"""
+
+import base64
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+import requests
+from botocore.exceptions import ClientError
+
+from awsscripts.aws.clients import get_client
+from awsscripts.aws.instrumentation import timed
+
+CLI_TOKEN_TTL = 60  # seconds; MWAA CLI tokens are valid for 60 seconds
+CLI_TOKEN_MARGIN = 10  # seconds; tokens are not used when they are about to expire
+
+
+class CliToken(NamedTuple):
+    token: str
+    hostname: str
+    expires: float  # expiration time (seconds since the epoch)
+
+
+class CliResult(NamedTuple):
+    environment: str
+    command: str
+    stdout: str
+    stderr: str
+    status: int  # HTTP status code; 0 if the request was not sent
+    seconds: float  # duration of the command (including getting a CLI token)
+
+    @property
+    def exit_code(self) -> int:
+        return 0 if self.status == 200 else 1
+
+
+class MWAA:
+
+    def __init__(self, verbose: Optional[bool], region: Optional[str] = None, profile: Optional[str] = None,
+                 mwaa_client: Any = None, token_cache_dir: Optional[Path] = None, scheme: str = 'https'):
+        """
+        :param verbose: print progress messages
+        :param region: AWS region (default=None, i.e. the region of the profile)
+        :param profile: AWS profile (default=None, i.e. the default credential chain)
+        :param mwaa_client: MWAA client to use (default=None, i.e. the shared client for the region and profile)
+        :param token_cache_dir: directory where CLI tokens are cached between processes (default=None, i.e. tokens
+         are cached only in memory)
+        :param scheme: scheme of the web server URL (default=https)
+        """
+        self.mwaa_client = mwaa_client if mwaa_client else get_client('mwaa', region, profile)
+        self.verbose = verbose
+        self.token_cache_dir = token_cache_dir
+        self.scheme = scheme
+        self._cache_prefix = f'{profile or "default"}.{region or "default"}.'
+        self._tokens: Dict[str, CliToken] = {}
+        self._token_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        """
+        HTTP session (with keep-alive connections) of the current thread
+        """
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            self._local.session = session
+        return session
+
+    def get_cli_token(self, environment: str) -> CliToken:
+        """
+        Gets a CLI token of an environment. Tokens are cached until shortly before they expire.
+
+        :param environment: MWAA environment name
+        :return: CLI token with web server hostname
+        """
+        with self._token_lock(environment):
+            token = self._tokens.get(environment)
+            if token is None or not self._is_valid(token):
+                token = self._read_cached_token(environment)
+            if token is None or not self._is_valid(token):
+                try:
+                    response = self.mwaa_client.create_cli_token(Name=environment)
+                    self._vprint(f"Created CLI token for environment {environment}")
+                except ClientError:
+                    self._vprint(f"Couldn't create CLI token for environment {environment}")
+                    raise
+                token = CliToken(response['CliToken'], response['WebServerHostname'], time.time() + CLI_TOKEN_TTL)
+                self._write_cached_token(environment, token)
+            self._tokens[environment] = token
+            return token
+
+    def invalidate_cli_token(self, environment: str) -> None:
+        """
+        Removes a CLI token of an environment from the cache.
+
+        :param environment: MWAA environment name
+        :return: nothing
+        """
+        with self._token_lock(environment):
+            self._tokens.pop(environment, None)
+            if self.token_cache_dir:
+                (self.token_cache_dir / self._cache_file_name(environment)).unlink(missing_ok=True)
+
+    def cli(self, environment: str, command: str) -> CliResult:
+        """
+        Runs Airflow CLI command on an environment.
+
+        :param environment: MWAA environment name
+        :param command: Airflow CLI command, e.g. 'dags list'
+        :return: decoded command output
+        """
+        start = time.monotonic()
+        token = self.get_cli_token(environment)
+        response = self._post(token, command)
+        if response.status_code in (401, 403):
+            # the token might have been revoked; retry once with a new one
+            self.invalidate_cli_token(environment)
+            response = self._post(self.get_cli_token(environment), command)
+
+        if response.status_code != 200:
+            return CliResult(environment, command, '', response.text, response.status_code, time.monotonic() - start)
+        r = response.json()
+        return CliResult(environment, command, MWAA._decode(r.get('stdout')), MWAA._decode(r.get('stderr')),
+                         response.status_code, time.monotonic() - start)
+
+    def cli_many(self, environments: List[str], command: str, max_workers: int = 8) -> Iterator[CliResult]:
+        """
+        Runs Airflow CLI command on many environments concurrently. Results are yielded as soon as each
+        environment finishes. Failures (e.g. of getting a CLI token) are reported as results with status 0.
+
+        :param environments: MWAA environment names
+        :param command: Airflow CLI command, e.g. 'dags list'
+        :param max_workers: max. number of environments the command runs on at the same time
+        :return: iterator of results, in the order of completion
+        """
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(environments)))) as executor:
+            futures = [executor.submit(self.try_cli, environment, command) for environment in environments]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def try_cli(self, environment: str, command: str) -> CliResult:
+        """
+        Runs Airflow CLI command on an environment. Failures (e.g. of getting a CLI token) are reported as
+        a result with status 0.
+
+        :param environment: MWAA environment name
+        :param command: Airflow CLI command, e.g. 'dags list'
+        :return: decoded command output, or the failure in stderr
+        """
+        start = time.monotonic()
+        try:
+            return self.cli(environment, command)
+        except (ClientError, requests.RequestException, ValueError) as e:
+            self._vprint(f"Couldn't run command on environment {environment}")
+            return CliResult(environment, command, '', str(e), 0, time.monotonic() - start)
+
+    def _token_lock(self, environment: str) -> threading.Lock:
+        with self._lock:
+            return self._token_locks.setdefault(environment, threading.Lock())
+
+    def _post(self, token: CliToken, command: str) -> requests.Response:
+        with timed('mwaa.cli', command.split(' ', 1)[0]):
+            return self.session.post(f'{self.scheme}://{token.hostname}/aws_mwaa/cli', data=command, headers={
+                'Authorization': f'Bearer {token.token}',
+                'Content-Type': 'text/plain'
+            })
+
+    @staticmethod
+    def _decode(value: Optional[str]) -> str:
+        return base64.b64decode(value).decode('utf-8', errors='replace') if value else ''
+
+    @staticmethod
+    def _is_valid(token: CliToken) -> bool:
+        return token.expires - CLI_TOKEN_MARGIN > time.time()
+
+    def _cache_file_name(self, environment: str) -> str:
+        return f'{self._cache_prefix}{environment}.json'
+
+    def _read_cached_token(self, environment: str) -> Optional[CliToken]:
+        if not self.token_cache_dir:
+            return None
+        try:
+            with (self.token_cache_dir / self._cache_file_name(environment)).open() as f:
+                return CliToken(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def _write_cached_token(self, environment: str, token: CliToken) -> None:
+        if not self.token_cache_dir:
+            return
+        self.token_cache_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.token_cache_dir, prefix='.tmp-')  # created with 0600 permissions
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(token._asdict(), f)
+            os.replace(tmp, self.token_cache_dir / self._cache_file_name(environment))
+        except OSError:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    def _vprint(self, msg: str) -> None:
+        if self.verbose:
+            print(msg)
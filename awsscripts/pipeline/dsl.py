@@ -0,0 +1,264 @@
+"""
+Pipeline DSL
+
+A pipeline is a JSON file describing a DAG of tasks:
+
+  {
+    "variables": {"bucket": "s3://my-bucket", "start": "2021-01-01"},
+    "sketch": "mysketch",                              <-- sketch of "sketch.*" references (default: awss -s)
+    "workers": 4,                                      <-- max. number of units running at once
+    "tasks": [
+      {"id": "cluster", "type": "emr.start", "params": {"name": "backfill", "count": 5, "wait": true}},
+      {"id": "day", "type": "emr.submit",
+       "foreach": {"var": "date", "dates": {"start": "${start}", "end": "2023-12-31", "days": 1}},
+       "params": {"clusterid": "${cluster.cluster_id}", "stepname": "etl-${date}",
+                  "application": "${bucket}/etl.py", "arguments": ["--date", "${date}"], "wait": true}},
+      {"id": "stop", "type": "emr.terminate", "after": ["day"],
+       "params": {"clusterid": "${cluster.cluster_id}"}}
+    ]
+  }
+
+String values in task params and loops may reference values with "${name}" or "${name.key.key}", where name is:
+  - a loop variable of the task, or a pipeline variable
+  - ID of a task: its outputs (e.g. "${cluster.cluster_id}"); the reference makes the task depend on it
+  - "sketch": the interpreted pipeline sketch (e.g. "${sketch.emr.log_uri}")
+A string consisting only of one reference is replaced by the referenced value as is (e.g. a list or a number).
+"$$" is a literal "$".
+
+A task with "foreach" runs once per loop value (a "unit"); loop values are generated lazily while the task runs,
+so long date ranges are never materialized.
+"""
+
+import json
+import re
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+DEFAULT_WORKERS = 4
+DEFAULT_DATE_FORMAT = '%Y-%m-%d'
+
+_REFERENCE = re.compile(r'\$(\$|\{([^${}]+)\})')
+
+
+class PipelineError(ValueError):
+    pass
+
+
+class TaskSpec(NamedTuple):
+    id: str
+    type: str
+    params: Dict[str, Any]
+    after: Tuple[str, ...]  # IDs of tasks this task depends on (explicit and referenced)
+    foreach: Optional[Dict[str, Any]]  # loop, see iterations()
+    parallel: Optional[int]  # max. number of units of the task running at once (default=None, i.e. no limit)
+
+
+class PipelineSpec(NamedTuple):
+    variables: Dict[str, Any]
+    sketch: Optional[str]
+    workers: int
+    tasks: Dict[str, TaskSpec]  # by IDs, in the order of definition
+
+
+def load_pipeline(path: Path, variables: Optional[Dict[str, Any]] = None) -> PipelineSpec:
+    """
+    Loads a pipeline file
+    :param path: pipeline file (JSON)
+    :param variables: variables overriding the ones defined in the file
+    :return: the pipeline
+    :raises PipelineError: if the pipeline is not valid
+    """
+    try:
+        with path.open() as f:
+            content = json.load(f)
+    except json.JSONDecodeError as e:
+        raise PipelineError(f'Pipeline {path} is not valid JSON: {e}') from None
+    if variables:
+        content = {**content, 'variables': {**content.get('variables', {}), **variables}}
+    return parse_pipeline(content)
+
+
+def parse_pipeline(content: Dict[str, Any]) -> PipelineSpec:
+    """
+    Parses and validates pipeline content
+    :param content: pipeline content (see module docs)
+    :return: the pipeline
+    :raises PipelineError: if the pipeline is not valid (unknown keys, duplicate task IDs, unknown dependencies,
+     dependency cycles)
+    """
+    _check_keys('pipeline', content, {'variables', 'sketch', 'workers', 'tasks'})
+    variables = content.get('variables', {})
+    if not isinstance(variables, dict):
+        raise PipelineError('Pipeline "variables" must be an object')
+    workers = content.get('workers', DEFAULT_WORKERS)
+    if not isinstance(workers, int) or workers < 1:
+        raise PipelineError('Pipeline "workers" must be a positive number')
+
+    tasks: Dict[str, TaskSpec] = {}
+    for number, task in enumerate(content.get('tasks', []), start=1):
+        if not isinstance(task, dict) or 'id' not in task or 'type' not in task:
+            raise PipelineError(f'Task #{number} must be an object with "id" and "type"')
+        task_id = task['id']
+        _check_keys(f'task "{task_id}"', task, {'id', 'type', 'params', 'after', 'foreach', 'parallel'})
+        if task_id in tasks:
+            raise PipelineError(f'Duplicate task ID "{task_id}"')
+        if task_id in variables or task_id == 'sketch':
+            raise PipelineError(f'Task ID "{task_id}" hides a variable')
+        foreach = task.get('foreach')
+        if foreach is not None:
+            _check_loop(task_id, foreach)
+        parallel = task.get('parallel')
+        if parallel is not None and (not isinstance(parallel, int) or parallel < 1):
+            raise PipelineError(f'"parallel" of task "{task_id}" must be a positive number')
+        tasks[task_id] = TaskSpec(task_id, task['type'], task.get('params', {}), tuple(task.get('after', [])),
+                                  foreach, parallel)
+
+    # references to task outputs are implicit dependencies
+    for task_id, task in tasks.items():
+        loop_var = task.foreach['var'] if task.foreach else None
+        referenced = [name for name in references([task.params, task.foreach])
+                      if name in tasks and name != loop_var]
+        after = tuple(dict.fromkeys((*task.after, *referenced)))
+        for dependency in after:
+            if dependency not in tasks:
+                raise PipelineError(f'Task "{task_id}" depends on unknown task "{dependency}"')
+            if dependency == task_id:
+                raise PipelineError(f'Task "{task_id}" depends on itself')
+        tasks[task_id] = task._replace(after=after)
+
+    _check_cycles(tasks)
+    return PipelineSpec(variables, content.get('sketch'), workers, tasks)
+
+
+def _check_keys(what: str, content: Dict[str, Any], allowed: Set[str]) -> None:
+    unknown = set(content) - allowed
+    if unknown:
+        raise PipelineError(f'Unknown keys of {what}: {sorted(unknown)}; expected {sorted(allowed)}')
+
+
+def _check_loop(task_id: str, foreach: Any) -> None:
+    if not isinstance(foreach, dict) or 'var' not in foreach or ('values' in foreach) == ('dates' in foreach):
+        raise PipelineError(f'Loop of task "{task_id}" must define "var", and either "values" or "dates"')
+    if 'dates' in foreach:
+        _check_keys(f'date range of task "{task_id}"', foreach['dates'], {'start', 'end', 'days', 'format'})
+
+
+def _check_cycles(tasks: Dict[str, TaskSpec]) -> None:
+    remaining = {task_id: set(task.after) for task_id, task in tasks.items()}
+    while remaining:
+        ready = [task_id for task_id, after in remaining.items() if not after]
+        if not ready:
+            raise PipelineError(f'Tasks depend on each other in a cycle: {sorted(remaining)}')
+        for task_id in ready:
+            del remaining[task_id]
+        for after in remaining.values():
+            after.difference_update(ready)
+
+
+def references(value: Any) -> Iterator[str]:
+    """
+    Finds references in a value
+    :param value: JSON value
+    :return: iterator of referenced names (the first part of each reference, e.g. "cluster" in "${cluster.id}")
+    """
+    if isinstance(value, str):
+        for match in _REFERENCE.finditer(value):
+            if match.group(2):
+                yield match.group(2).strip().split('.')[0]
+    elif isinstance(value, dict):
+        for child in value.values():
+            yield from references(child)
+    elif isinstance(value, list):
+        for child in value:
+            yield from references(child)
+
+
+def render(value: Any, lookup: Callable[[str], Any]) -> Any:
+    """
+    Replaces references in a value (see module docs)
+    :param value: JSON value
+    :param lookup: function returning a value of a reference (e.g. "cluster.cluster_id")
+    :return: value with references replaced
+    """
+    if isinstance(value, str):
+        match = _REFERENCE.fullmatch(value)
+        if match and match.group(2):
+            return lookup(match.group(2).strip())
+        return _REFERENCE.sub(lambda m: '$' if m.group(1) == '$' else str(lookup(m.group(2).strip())), value)
+    if isinstance(value, dict):
+        return {key: render(child, lookup) for key, child in value.items()}
+    if isinstance(value, list):
+        return [render(child, lookup) for child in value]
+    return value
+
+
+def resolve(reference: str, scopes: List[Dict[str, Any]]) -> Any:
+    """
+    Resolves a reference in scopes
+    :param reference: reference, e.g. "cluster.cluster_id"
+    :param scopes: values by names, the first scope containing the name wins
+    :return: the referenced value
+    :raises PipelineError: if the reference cannot be resolved
+    """
+    name, *keys = reference.split('.')
+    for scope in scopes:
+        if name in scope:
+            value = scope[name]
+            break
+    else:
+        raise PipelineError(f'Unknown reference "${{{reference}}}"')
+    for key in keys:
+        if isinstance(value, dict) and key in value:
+            value = value[key]
+        elif isinstance(value, list) and key.isdigit() and int(key) < len(value):
+            value = value[int(key)]
+        else:
+            raise PipelineError(f'Unknown reference "${{{reference}}}": no "{key}"')
+    return value
+
+
+def iterations(foreach: Optional[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """
+    Generates loop variables of a (rendered) loop lazily
+    :param foreach: loop: {"var": name, "values": [...]} or {"var": name, "dates": {"start": date, "end": date,
+     "days": step (default=1), "format": format of dates (default="%Y-%m-%d")}}; None if the task is not a loop
+    :return: iterator of loop variables (one empty dictionary if there is no loop)
+    """
+    if foreach is None:
+        yield {}
+        return
+    var = foreach['var']
+    if 'values' in foreach:
+        for value in foreach['values']:
+            yield {var: value}
+    else:
+        dates = foreach['dates']
+        for day in date_range(dates['start'], dates['end'], dates.get('days', 1),
+                              dates.get('format', DEFAULT_DATE_FORMAT)):
+            yield {var: day}
+
+
+def date_range(start: str, end: str, days: int = 1, date_format: str = DEFAULT_DATE_FORMAT) -> Iterator[str]:
+    """
+    Generates dates lazily
+    :param start: first date
+    :param end: last date (inclusive)
+    :param days: step in days; negative steps go back in time
+    :param date_format: format of the dates (strftime)
+    :return: iterator of formatted dates
+    """
+    if not days:
+        raise PipelineError('Date range step must not be 0')
+    current, last = _parse_date(start, date_format), _parse_date(end, date_format)
+    step = timedelta(days=days)
+    while (current <= last) if days > 0 else (current >= last):
+        yield current.strftime(date_format)
+        current += step
+
+
+def _parse_date(value: str, date_format: str) -> date:
+    try:
+        return datetime.strptime(value, date_format).date()
+    except ValueError:
+        raise PipelineError(f'Date "{value}" does not match format "{date_format}"') from None
@@ -0,0 +1,154 @@
+"""
+Pipeline progress journal
+
+An append-only JSON lines file recording progress of pipeline runs, kept in ~/.aws-scripts/journal. Every task
+unit (a task, or one iteration of a loop) is identified by a key (task ID and loop variables), and its records
+carry a hash of its inputs (task type and rendered params):
+
+  {"event": "run", "resume": false, "time": ...}                   <-- a new run (resume=false) forgets older records
+  {"event": "start", "key": "day{\"date\":\"2021-01-01\"}", "inputs": "<hash>", "time": ...}
+  {"event": "checkpoint", "key": ..., "resources": {"step_ids": ["s-1"]}, "time": ...}
+  {"event": "end", "key": ..., "inputs": ..., "status": "SUCCEEDED", "outputs": {...}, "error": null, "time": ...}
+
+Records are flushed to the OS as they are written, so they survive the process being killed, but they are synced to
+disk (fsync) in batches: at most once per sync interval, except checkpoints of created AWS resources, which are
+synced immediately. A crash of the whole machine may therefore lose records of the last interval.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, NamedTuple, Optional
+
+from awsscripts.sketches.hashing import canonical_json
+
+SYNC_INTERVAL = 1.0  # seconds
+
+STARTED = 'STARTED'
+
+
+class JournalEntry(NamedTuple):
+    inputs: str  # hash of unit inputs
+    status: str  # STARTED (not finished, e.g. interrupted), SUCCEEDED or FAILED
+    outputs: Dict[str, Any]
+    resources: Dict[str, Any]  # AWS resources created by the unit (e.g. cluster ID, step IDs)
+    error: Optional[str]
+
+
+def journal_path(pipeline_file: Path) -> Path:
+    """
+    Gets journal of a pipeline file
+    :param pipeline_file: pipeline file
+    :return: ~/.aws-scripts/journal/<file name>-<hash of the absolute path>.jsonl
+    """
+    digest = hashlib.sha256(str(pipeline_file.resolve()).encode('utf-8')).hexdigest()[:12]
+    return Path.home() / '.aws-scripts' / 'journal' / f'{pipeline_file.stem}-{digest}.jsonl'
+
+
+def unit_key(task_id: str, variables: Dict[str, Any]) -> str:
+    """
+    Gets key of a task unit
+    :param task_id: task ID
+    :param variables: loop variables of the unit
+    :return: the key
+    """
+    return f'{task_id}{canonical_json(variables)}' if variables else task_id
+
+
+class Journal:
+    """
+    Progress journal of a pipeline (see module docs). Thread-safe.
+    """
+
+    def __init__(self, path: Path, resume: bool = False, sync_interval: float = SYNC_INTERVAL) -> None:
+        """
+        :param path: journal file (created if it does not exist)
+        :param resume: if True, entries of the previous runs are loaded (see entry()); otherwise a new run starts
+        :param sync_interval: min. seconds between syncs of the journal to disk
+        """
+        self.path = path
+        self.sync_interval = sync_interval
+        self.entries: Dict[str, JournalEntry] = self._load() if resume else {}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = self.path.open('a')
+        self._synced = 0.0
+        self._append({'event': 'run', 'resume': resume}, sync=True)
+
+    def _load(self) -> Dict[str, JournalEntry]:
+        entries: Dict[str, JournalEntry] = {}
+        try:
+            with self.path.open() as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return entries
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a torn write of an interrupted run
+            event = record.get('event')
+            if event == 'run' and not record.get('resume'):
+                entries.clear()
+            elif event == 'start':
+                # resources recorded by earlier runs are kept, a resumed unit may reattach to them again
+                previous = entries.get(record['key'])
+                resources = previous.resources if previous and previous.inputs == record['inputs'] else {}
+                entries[record['key']] = JournalEntry(record['inputs'], STARTED, {}, resources, None)
+            elif event == 'checkpoint' and record['key'] in entries:
+                entry = entries[record['key']]
+                entries[record['key']] = entry._replace(resources={**entry.resources, **record['resources']})
+            elif event == 'end' and record['key'] in entries:
+                entries[record['key']] = entries[record['key']]._replace(
+                    status=record['status'], outputs=record.get('outputs') or {}, error=record.get('error'))
+        return entries
+
+    def entry(self, key: str) -> Optional[JournalEntry]:
+        """
+        Gets the last known state of a unit from the previous runs (only when resuming)
+        :param key: unit key
+        :return: the state; None if unknown
+        """
+        return self.entries.get(key)
+
+    def started(self, key: str, inputs: str) -> None:
+        self._append({'event': 'start', 'key': key, 'inputs': inputs})
+
+    def checkpoint(self, key: str, resources: Dict[str, Any]) -> None:
+        """
+        Records AWS resources created by a running unit (synced immediately)
+        :param key: unit key
+        :param resources: the resources, e.g. {"cluster_id": "j-..."}
+        :return: nothing
+        """
+        self._append({'event': 'checkpoint', 'key': key, 'resources': resources}, sync=True)
+
+    def finished(self, key: str, inputs: str, status: str, outputs: Dict[str, Any], error: Optional[str]) -> None:
+        self._append({'event': 'end', 'key': key, 'inputs': inputs, 'status': status, 'outputs': outputs,
+                      'error': error})
+
+    def _append(self, record: Dict[str, Any], sync: bool = False) -> None:
+        line = json.dumps({**record, 'time': time.time()}, default=str) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            now = time.monotonic()
+            if sync or now - self._synced >= self.sync_interval:
+                os.fsync(self._file.fileno())
+                self._synced = now
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+
+    def __enter__(self) -> 'Journal':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
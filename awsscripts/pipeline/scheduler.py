@@ -0,0 +1,271 @@
+"""
+Pipeline scheduler
+
+Runs tasks of a pipeline in the order of their dependencies. Independent tasks run concurrently, and so do units
+(loop iterations) of a task, with at most "workers" units running at once. Units of a loop are generated only when
+there is a free worker for them, and free workers are shared by running tasks in turns.
+
+When a unit fails, its task stops generating further units and fails once its running units finish; tasks
+depending on a failed task are skipped, while independent tasks go on.
+
+With a journal (see awsscripts.pipeline.journal), progress of units is recorded, and when resuming, units which
+succeeded with the same inputs before are not run again (their recorded outputs are used), and interrupted and
+failed units run again, reattaching to AWS resources they created which are still usable (e.g. a running
+cluster).
+"""
+
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Set
+
+from awsscripts.aws.instrumentation import timed
+from awsscripts.pipeline.dsl import PipelineError, PipelineSpec, TaskSpec, iterations, render, resolve
+from awsscripts.pipeline.journal import Journal, unit_key
+from awsscripts.pipeline.tasks import TASK_TYPES, TaskContext, TaskRunner
+from awsscripts.sketches.hashing import content_hash
+
+SUCCEEDED = 'SUCCEEDED'
+FAILED = 'FAILED'
+SKIPPED = 'SKIPPED'
+COMPLETED = 'COMPLETED'
+
+
+class PipelineEvent(NamedTuple):
+    task_id: str
+    unit: Optional[int]  # index of the loop iteration; None for events of the whole task
+    variables: Dict[str, Any]  # loop variables of the unit
+    state: str  # STARTED, SUCCEEDED, FAILED, SKIPPED or COMPLETED (succeeded in a previous run, see Journal)
+    error: Optional[str]
+    seconds: float  # duration of the unit or task (0 for STARTED)
+
+
+class TaskResult(NamedTuple):
+    task_id: str
+    state: str  # SUCCEEDED, FAILED or SKIPPED
+    outputs: Dict[str, Any]  # task outputs; outputs of a loop are {"units": [outputs of each unit]}
+    error: Optional[str]  # the first error
+    units: int  # number of units started
+    seconds: float
+
+
+class PipelineResult(NamedTuple):
+    tasks: Dict[str, TaskResult]  # in the order of completion
+    seconds: float
+
+    @property
+    def succeeded(self) -> bool:
+        return all(task.state == SUCCEEDED for task in self.tasks.values())
+
+
+class _Unit(NamedTuple):
+    task: '_RunningTask'
+    position: int  # index of the loop iteration
+    variables: Dict[str, Any]
+    key: str  # journal key
+    inputs: str  # hash of the task type and rendered params
+    started: float
+
+
+class _RunningTask:
+
+    def __init__(self, spec: TaskSpec, units: Iterator[Dict[str, Any]]) -> None:
+        self.spec = spec
+        self.units = units
+        self.started = time.monotonic()
+        self.next_unit = 0
+        self.running = 0
+        self.exhausted = False
+        self.error: Optional[str] = None
+        self.outputs: Dict[int, Dict[str, Any]] = {}
+
+    @property
+    def can_submit(self) -> bool:
+        return not self.exhausted and self.error is None and \
+            (self.spec.parallel is None or self.running < self.spec.parallel)
+
+
+class Scheduler:
+    """
+    Runs a pipeline. Task units run in worker threads, while scheduling and rendering of task parameters happen
+    in the calling thread.
+    """
+
+    def __init__(self, pipeline: PipelineSpec, context: TaskContext, runners: Optional[Dict[str, TaskRunner]] = None,
+                 workers: Optional[int] = None, on_event: Optional[Callable[[PipelineEvent], None]] = None,
+                 journal: Optional[Journal] = None) -> None:
+        """
+        :param pipeline: the pipeline
+        :param context: context passed to task runners (AWS clients, sketches)
+        :param runners: task runners by task types (default=None, i.e. TASK_TYPES)
+        :param workers: max. number of units running at once (default=None, i.e. as defined by the pipeline)
+        :param on_event: called (in the calling thread) when a task or unit starts or finishes
+        :param journal: progress journal (default=None, i.e. progress is not recorded)
+        :raises PipelineError: if a task type is unknown
+        """
+        self.pipeline = pipeline
+        self.context = context
+        self.runners = runners if runners is not None else TASK_TYPES
+        self.workers = workers or pipeline.workers
+        self.on_event = on_event
+        self.journal = journal
+        for task in pipeline.tasks.values():
+            if task.type not in self.runners:
+                raise PipelineError(f'Unknown type "{task.type}" of task "{task.id}"; expected one of '
+                                    f'{sorted(self.runners)}')
+        self._results: Dict[str, TaskResult] = {}
+        self._running: Dict[str, _RunningTask] = {}
+        self._futures: Dict['Future[Dict[str, Any]]', _Unit] = {}
+
+    def run(self) -> PipelineResult:
+        """
+        Runs the pipeline until all tasks finish or are skipped
+        :return: results of the tasks
+        """
+        started = time.monotonic()
+        waiting = {task_id: set(task.after) for task_id, task in self.pipeline.tasks.items()}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='pipeline') as executor:
+            while waiting or self._running:
+                changed = self._start_ready(waiting)
+                self._submit(executor)
+                changed = self._finish_done() or changed
+                if self._futures:
+                    done, _ = wait(list(self._futures), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._unit_done(future)
+                elif not changed:
+                    break
+        return PipelineResult(dict(self._results), time.monotonic() - started)
+
+    def _start_ready(self, waiting: Dict[str, Set[str]]) -> bool:
+        changed = False
+        for task_id, after in list(waiting.items()):
+            if not after.issubset(self._results):
+                continue
+            del waiting[task_id]
+            changed = True
+            task = self.pipeline.tasks[task_id]
+            failed = [dependency for dependency in after if self._results[dependency].state != SUCCEEDED]
+            if failed:
+                self._task_done(task, SKIPPED, {}, f'Dependency "{failed[0]}" did not succeed', 0, 0)
+                continue
+            try:
+                foreach = render(task.foreach, self._lookup({})) if task.foreach else None
+            except PipelineError as e:
+                self._task_done(task, FAILED, {}, str(e), 0, 0)
+                continue
+            self._running[task_id] = _RunningTask(task, iterations(foreach))
+            self._event(PipelineEvent(task_id, None, {}, 'STARTED', None, 0))
+        return changed
+
+    def _submit(self, executor: ThreadPoolExecutor) -> None:
+        # fills free workers, taking one unit of each running task in turns
+        while len(self._futures) < self.workers:
+            submitted = False
+            for task in list(self._running.values()):
+                if len(self._futures) >= self.workers:
+                    break
+                if not task.can_submit:
+                    continue
+                try:
+                    variables = next(task.units, None)
+                    if variables is None:
+                        task.exhausted = True
+                        continue
+                    params = render(task.spec.params, self._lookup(variables))
+                except PipelineError as e:
+                    task.error = str(e)
+                    continue
+                unit = _Unit(task, task.next_unit, variables, unit_key(task.spec.id, variables),
+                             content_hash({'type': task.spec.type, 'params': params}), time.monotonic())
+                task.next_unit += 1
+                submitted = True
+                entry = self.journal.entry(unit.key) if self.journal else None
+                if entry is not None and entry.inputs != unit.inputs:
+                    entry = None  # inputs changed, the unit runs anew
+                if entry is not None and entry.status == SUCCEEDED:
+                    task.outputs[unit.position] = entry.outputs
+                    self._event(PipelineEvent(task.spec.id, unit.position, variables, COMPLETED, None, 0))
+                    continue
+                resources = entry.resources if entry is not None else {}  # of an interrupted or failed run
+                if self.journal:
+                    self.journal.started(unit.key, unit.inputs)
+                task.running += 1
+                self._futures[executor.submit(self._run_unit, unit, params, resources)] = unit
+            if not submitted:
+                return
+
+    def _run_unit(self, unit: _Unit, params: Dict[str, Any], resources: Dict[str, Any]) -> Dict[str, Any]:
+        task = unit.task.spec
+        journal = self.journal
+        checkpoint = (lambda r: journal.checkpoint(unit.key, r)) if journal else None
+        with self.context.unit(checkpoint, resources), \
+                timed(f'pipeline.{task.type}', f'{task.id}[{unit.position}]' if task.foreach else task.id):
+            return self.runners[task.type](self.context, params) or {}
+
+    def _unit_done(self, future: 'Future[Dict[str, Any]]') -> None:
+        unit = self._futures.pop(future)
+        task = unit.task
+        task.running -= 1
+        seconds = time.monotonic() - unit.started
+        try:
+            outputs = future.result()
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+            task.error = task.error or error
+            if self.journal:
+                self.journal.finished(unit.key, unit.inputs, FAILED, {}, error)
+            self._event(PipelineEvent(task.spec.id, unit.position, unit.variables, FAILED, error, seconds))
+        else:
+            task.outputs[unit.position] = outputs
+            if self.journal:
+                self.journal.finished(unit.key, unit.inputs, SUCCEEDED, outputs, None)
+            self._event(PipelineEvent(task.spec.id, unit.position, unit.variables, SUCCEEDED, None, seconds))
+
+    def _finish_done(self) -> bool:
+        finished = [task for task in self._running.values()
+                    if task.running == 0 and (task.exhausted or task.error is not None)]
+        for task in finished:
+            del self._running[task.spec.id]
+            if task.spec.foreach:
+                outputs = {'units': [task.outputs[unit] for unit in sorted(task.outputs)]}
+            else:
+                outputs = task.outputs.get(0, {})
+            self._task_done(task.spec, SUCCEEDED if task.error is None else FAILED, outputs, task.error,
+                            task.next_unit, time.monotonic() - task.started)
+        return bool(finished)
+
+    def _task_done(self, task: TaskSpec, state: str, outputs: Dict[str, Any], error: Optional[str], units: int,
+                   seconds: float) -> None:
+        self._results[task.id] = TaskResult(task.id, state, outputs, error, units, seconds)
+        self._event(PipelineEvent(task.id, None, {}, state, error, seconds))
+
+    def _lookup(self, variables: Dict[str, Any]) -> Callable[[str], Any]:
+        def lookup(reference: str) -> Any:
+            scopes: List[Dict[str, Any]] = [
+                variables,
+                self.pipeline.variables,
+                {task_id: result.outputs for task_id, result in self._results.items() if result.state == SUCCEEDED}
+            ]
+            if reference.split('.')[0] == 'sketch':
+                scopes.append({'sketch': self.context.sketch_content()})
+            return resolve(reference, scopes)
+        return lookup
+
+    def _event(self, event: PipelineEvent) -> None:
+        if self.on_event:
+            self.on_event(event)
+
+
+def run_pipeline(pipeline: PipelineSpec, context: TaskContext, workers: Optional[int] = None,
+                 on_event: Optional[Callable[[PipelineEvent], None]] = None,
+                 journal: Optional[Journal] = None) -> PipelineResult:
+    """
+    Runs a pipeline with the built-in task types
+    :param pipeline: the pipeline
+    :param context: context of tasks
+    :param workers: max. number of units running at once (default=None, i.e. as defined by the pipeline)
+    :param on_event: called when a task or unit starts or finishes
+    :param journal: progress journal (default=None, i.e. progress is not recorded)
+    :return: results of the tasks
+    """
+    return Scheduler(pipeline, context, workers=workers, on_event=on_event, journal=journal).run()
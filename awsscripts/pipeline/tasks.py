@@ -0,0 +1,259 @@
+"""
+Pipeline task types
+
+A task runner gets the task context and rendered task params, and returns task outputs (a dictionary), which
+other tasks can reference. Built-in task types:
+  - "emr.start": starts an EMR cluster from the pipeline sketch; params are the ones of "awss emr start"
+    (e.g. "name", "count", "fleet", "wait"); outputs: {"cluster_id": ...}
+  - "emr.submit": submits Spark step(s); params are the ones of "awss emr submit" (e.g. "clusterid", "stepname",
+    "application", "arguments", "batch", "wait"); outputs: {"step_ids": [...]}. With "wait", the task fails if
+    any step does not complete.
+  - "emr.terminate": terminates an EMR cluster; params: {"clusterid": ...}
+  - "s3.copy": copies a file between S3 and a local file system; params: {"source": ..., "target": ...} (S3
+    locations as "s3://bucket/key"); outputs: {"target": ...}
+  - "print": prints a message; params: {"message": ...}
+
+Runners record AWS resources they create with TaskContext.checkpoint(), and a unit resumed after an interruption
+or a failure reattaches to them (TaskContext.resumed()) instead of creating them again, if they are still usable:
+"emr.start" waits for the cluster if it is still active (and starts a new one if it is not), and "emr.submit"
+tracks the submitted steps unless some of them failed (and submits the rest, if a failure interrupted the
+submission).
+"""
+
+import argparse
+import threading
+from contextlib import contextmanager
+from types import ModuleType
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from awsscripts.pipeline.dsl import PipelineError
+from awsscripts.sketches.sketches import Sketches
+
+
+class TaskContext:
+    """
+    Context shared by all tasks of a pipeline run. EMR, S3 and sketches are created lazily and shared; pass them
+    explicitly (e.g. with stubbed clients) to run pipelines without AWS.
+    """
+
+    def __init__(self, sketch: Optional[str] = None, verbose: bool = False, region: Optional[str] = None,
+                 profile: Optional[str] = None, emr: Any = None, s3_client: Any = None,
+                 sketches: Optional[Sketches] = None) -> None:
+        """
+        :param sketch: name of the pipeline sketch
+        :param verbose: verbose mode of EMR operations
+        :param region: AWS region (default=None, i.e. the region of the profile)
+        :param profile: AWS profile (default=None, i.e. the default credential chain)
+        :param emr: EMR (default=None, i.e. EMR with the shared client for the region and profile)
+        :param s3_client: S3 client (default=None, i.e. the shared client for the region and profile)
+        :param sketches: sketches (default=None, i.e. the default sketch store)
+        """
+        self.sketch = sketch
+        self.verbose = verbose
+        self.region = region
+        self.profile = profile
+        self._emr = emr
+        self._s3_client = s3_client
+        self._sketches = sketches
+        self._lock = threading.Lock()
+        self._unit = threading.local()
+
+    @property
+    def emr(self) -> Any:
+        with self._lock:
+            if self._emr is None:
+                from awsscripts.emr.emr import EMR  # imported lazily, it loads boto3
+
+                self._emr = EMR(self.verbose, self.region, self.profile)
+            return self._emr
+
+    @property
+    def s3_client(self) -> Any:
+        with self._lock:
+            if self._s3_client is None:
+                from awsscripts.aws.clients import get_client  # imported lazily, it loads boto3
+
+                self._s3_client = get_client('s3', self.region, self.profile)
+            return self._s3_client
+
+    @property
+    def sketches(self) -> Sketches:
+        with self._lock:
+            if self._sketches is None:
+                self._sketches = Sketches()
+            return self._sketches
+
+    def sketch_content(self) -> Dict[str, Any]:
+        """
+        Gets interpreted content of the pipeline sketch
+        :return: the content
+        :raises PipelineError: if no sketch is set
+        """
+        if not self.sketch:
+            raise PipelineError('Pipeline sketch is not set, and no default sketch exists')
+        return self.sketches[self.sketch]
+
+    @contextmanager
+    def unit(self, checkpoint: Optional[Callable[[Dict[str, Any]], None]] = None,
+             resources: Optional[Dict[str, Any]] = None) -> Iterator[None]:
+        """
+        Binds a running unit to the current thread (used by the scheduler)
+        :param checkpoint: called with resources recorded by the unit
+        :param resources: resources recorded by an interrupted or failed previous run of the unit
+        :return: the context
+        """
+        self._unit.checkpoint = checkpoint
+        self._unit.resources = resources or {}
+        try:
+            yield
+        finally:
+            self._unit.checkpoint = None
+            self._unit.resources = {}
+
+    def checkpoint(self, **resources: Any) -> None:
+        """
+        Records AWS resources created by the running unit (e.g. cluster_id="j-..."), so that the unit can reattach
+        to them when it is resumed after an interruption or a failure
+        :param resources: the resources
+        :return: nothing
+        """
+        checkpoint = getattr(self._unit, 'checkpoint', None)
+        if checkpoint:
+            checkpoint(resources)
+
+    def resumed(self) -> Dict[str, Any]:
+        """
+        Gets resources recorded by an interrupted or failed previous run of the running unit. The runner must check
+        that they are still usable (e.g. that a cluster was not terminated).
+        :return: the resources; empty if the unit runs for the first time
+        """
+        return dict(getattr(self._unit, 'resources', {}))
+
+
+TaskRunner = Callable[[TaskContext, Dict[str, Any]], Dict[str, Any]]
+
+
+def _arguments(module: ModuleType, params: Dict[str, Any], context: TaskContext) -> argparse.Namespace:
+    # arguments of a command: defaults of its parser, overridden by task params
+    parser = argparse.ArgumentParser()
+    module.configure_parser(parser)
+    actions = [action for action in parser._actions if action.dest != 'help']
+    unknown = set(params) - {action.dest for action in actions} - {'sketch'}
+    if unknown:
+        raise PipelineError(f'Unknown params: {sorted(unknown)}; expected {sorted(a.dest for a in actions)}')
+    # argparse marks positional arguments with nargs="*" as required, although they may be empty
+    missing = [action.dest for action in actions
+               if action.required and action.nargs != '*' and action.dest not in params]
+    if missing:
+        raise PipelineError(f'Missing params: {missing}')
+    values = {action.dest: [] if action.nargs == '*' and not action.option_strings else action.default
+              for action in actions}
+    values.update(sketch=context.sketch, verbose=context.verbose, region=context.region, profile=context.profile)
+    values.update(params)
+    return argparse.Namespace(**values)
+
+
+def emr_start(context: TaskContext, params: Dict[str, Any]) -> Dict[str, Any]:
+    from awsscripts.scripts import emr_start as command
+
+    args = _arguments(command, params, context)
+    cluster_id = context.resumed().get('cluster_id')
+    if cluster_id and _is_active(context, cluster_id):
+        print(f'Reattached to cluster {cluster_id}', flush=True)
+    else:
+        cluster_id = command.start(args, context.emr, context.sketches)
+        context.checkpoint(cluster_id=cluster_id)
+    if args.wait:
+        context.emr.wait_for_cluster(cluster_id, args.timeout)
+    return {'cluster_id': cluster_id}
+
+
+def _is_active(context: TaskContext, cluster_id: str) -> bool:
+    from awsscripts.emr.emr import ACTIVE_CLUSTER_STATES
+
+    return context.emr.describe_cluster(cluster_id)['Status']['State'] in ACTIVE_CLUSTER_STATES
+
+
+def emr_submit(context: TaskContext, params: Dict[str, Any]) -> Dict[str, Any]:
+    from awsscripts.emr.steps import StepsNotAddedError
+    from awsscripts.scripts import emr_submit as command
+
+    args = _arguments(command, params, context)
+    args.arguments = [str(argument) for argument in args.arguments]
+    submitted = context.resumed().get('step_ids') or []
+    if submitted and _steps_failed(context, args.clusterid, submitted):
+        print(f'Steps {", ".join(submitted)} did not complete, submitting them again', flush=True)
+        submitted = []
+    elif submitted:
+        print(f'Reattached to steps {", ".join(submitted)}', flush=True)
+    try:
+        step_ids = submitted + command.submit(args, context.emr, len(submitted))
+    except StepsNotAddedError as e:
+        context.checkpoint(step_ids=submitted + e.step_ids)
+        raise
+    if step_ids != submitted:
+        context.checkpoint(step_ids=step_ids)
+    if args.wait:
+        tracker = context.emr.track_steps(args.clusterid, step_ids, args.interval)
+        for _ in tracker.track():
+            pass
+        summary = tracker.summary()
+        if not summary.succeeded:
+            raise RuntimeError('Steps did not complete: ' +
+                               ', '.join(f'{state}={count}' for state, count in sorted(summary.counts.items())))
+    return {'step_ids': step_ids}
+
+
+def _steps_failed(context: TaskContext, cluster_id: str, step_ids: List[str]) -> bool:
+    from awsscripts.emr.steps import StepNotFoundError
+
+    tracker = context.emr.track_steps(cluster_id, step_ids)
+    try:
+        tracker.poll()
+    except StepNotFoundError:
+        return True
+    return any(state in ('CANCELLED', 'FAILED', 'INTERRUPTED') for state in tracker.states.values())
+
+
+def emr_terminate(context: TaskContext, params: Dict[str, Any]) -> Dict[str, Any]:
+    from awsscripts.scripts import emr_terminate as command
+
+    args = _arguments(command, params, context)
+    context.emr.terminate_cluster(args.clusterid)
+    return {}
+
+
+def s3_copy(context: TaskContext, params: Dict[str, Any]) -> Dict[str, Any]:
+    if set(params) != {'source', 'target'}:
+        raise PipelineError('Params "source" and "target" must be defined')
+    source, target = _s3_location(params['source']), _s3_location(params['target'])
+    if source and target:
+        context.s3_client.copy({'Bucket': source[0], 'Key': source[1]}, target[0], target[1])
+    elif source:
+        context.s3_client.download_file(source[0], source[1], params['target'])
+    elif target:
+        context.s3_client.upload_file(params['source'], target[0], target[1])
+    else:
+        raise PipelineError('Source or target must be an S3 location (s3://bucket/key)')
+    return {'target': params['target']}
+
+
+def _s3_location(location: str) -> Optional[Tuple[str, str]]:
+    if not location.startswith('s3://'):
+        return None
+    bucket, _, key = location[len('s3://'):].partition('/')
+    return bucket, key
+
+
+def print_message(context: TaskContext, params: Dict[str, Any]) -> Dict[str, Any]:
+    print(params.get('message', ''), flush=True)
+    return {'message': params.get('message', '')}
+
+
+TASK_TYPES: Dict[str, TaskRunner] = {
+    'emr.start': emr_start,
+    'emr.submit': emr_submit,
+    'emr.terminate': emr_terminate,
+    's3.copy': s3_copy,
+    'print': print_message,
+}
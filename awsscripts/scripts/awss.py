@@ -1,71 +1,136 @@
 import argparse
+import importlib
+import sys
+from typing import TYPE_CHECKING, Any, Dict, Optional, Sequence, Union, cast
 
-import awsscripts.scripts.ca_login as ca_login
-import awsscripts.scripts.ca_logout as ca_logout
-import awsscripts.scripts.emr_isidle as emr_isidle
-import awsscripts.scripts.emr_start as emr_start
-import awsscripts.scripts.emr_submit as emr_submit
-import awsscripts.scripts.emr_terminate as emr_terminate
-import awsscripts.scripts.mwaa as mwaa
-import awsscripts.scripts.sketches as ske
+from awsscripts.aws import instrumentation
 from awsscripts.sketches.sketches import Sketches
 
+# Command registry. A command is either a module implementing configure_parser(parser) and execute(args),
+# or a nested registry of subcommands. Modules are imported only when their command is chosen on the command
+# line, so that e.g. "awss s -l" or "awss --help" do not pay for importing boto3, botocore or requests.
+#
+#   name -> (help, module name or nested registry)
+commands: Dict[str, Any] = {
+    'emr': ('elastic map reduce', {
+        'start': ('starts EMR cluster', 'awsscripts.scripts.emr_start'),
+        'submit': ('submits Spark step', 'awsscripts.scripts.emr_submit'),
+        'terminate': ('terminates EMR cluster', 'awsscripts.scripts.emr_terminate'),
+        'isidle': ('determines if EMR cluster is idle', 'awsscripts.scripts.emr_isidle'),
+        'reap': ('terminates idle EMR clusters', 'awsscripts.scripts.emr_reap'),
+        'logs': ('prints (follows) logs of EMR step', 'awsscripts.scripts.emr_logs'),
+    }),
+    'mwaa': ('managed workflows for apache airflow', 'awsscripts.scripts.mwaa'),
+    'ca': ('code artifact', {
+        'login': ('login to CA', 'awsscripts.scripts.ca_login'),
+        'logout': ('logout from CA', 'awsscripts.scripts.ca_logout'),
+    }),
+    's': ('sketches', 'awsscripts.scripts.sketches'),
+    'pipeline': ('pipelines', {
+        'run': ('runs a pipeline file', 'awsscripts.scripts.pipeline_run'),
+    }),
+}
+
+subcommand_titles = {
+    'emr': 'EMR subcommands',
+    'ca': 'CodeArtifact subcommands',
+    'pipeline': 'Pipeline subcommands',
+}
+
+
+if TYPE_CHECKING:
+    _SubParsersAction = argparse._SubParsersAction[argparse.ArgumentParser]
+else:
+    _SubParsersAction = argparse._SubParsersAction  # not subscriptable at runtime
+
+
+class _LazySubParsersAction(_SubParsersAction):
+    """
+    Subparsers action which configures a subcommand parser (and imports its module) only when the subcommand
+    is being parsed.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._lazy_modules: Dict[str, str] = {}
+
+    def add_lazy_parser(self, name: str, module: str, **kwargs: Any) -> argparse.ArgumentParser:
+        parser: argparse.ArgumentParser = self.add_parser(name, **kwargs)
+        self._lazy_modules[name] = module
+        return parser
+
+    def __call__(self, parser: argparse.ArgumentParser, namespace: argparse.Namespace,
+                 values: Union[str, Sequence[Any], None], option_string: Optional[str] = None) -> None:
+        name = values[0] if values else None
+        if name in self._lazy_modules:
+            module = importlib.import_module(self._lazy_modules.pop(name))
+            subparser = self._name_parser_map[name]
+            subparser.set_defaults(func=module.execute)
+            module.configure_parser(subparser)
+        super().__call__(parser, namespace, values, option_string)
+
+
+class _SketchesHelpAction(argparse._HelpAction):
+    """
+    Help action which lists available sketches only when the help is really printed.
+    """
+
+    def __call__(self, parser: argparse.ArgumentParser, namespace: argparse.Namespace,
+                 values: Union[str, Sequence[Any], None], option_string: Optional[str] = None) -> None:
+        for action in parser._actions:
+            if action.dest == 'sketch':
+                action.help = f'{action.help}. One of: {Sketches().list()}'
+        super().__call__(parser, namespace, values, option_string)
+
+
+def _add_commands(parser: argparse.ArgumentParser, registry: Dict[str, Any], title: str, nested: bool) -> None:
+    subparsers = cast(_LazySubParsersAction, parser.add_subparsers(title=title, action=_LazySubParsersAction))
+    for name, (help_msg, command) in registry.items():
+        kwargs = {'description': help_msg} if nested else {'help': help_msg}
+        if isinstance(command, dict):
+            _add_commands(subparsers.add_parser(name, **kwargs), command, subcommand_titles[name], True)
+        else:
+            subparsers.add_lazy_parser(name, command, **kwargs)
+
 
 def main() -> None:
-    sketches = Sketches()
-    default_sketch = sketches.get_default()
+    # --timings is looked up before parsing, so that the whole run is timed
+    timings = instrumentation.HistogramSink() if '--timings' in sys.argv[1:] else None
+    if timings:
+        instrumentation.add_sink(timings)
+    try:
+        _main()
+    finally:
+        if timings:
+            print(timings.format(), file=sys.stderr)
+
+
+def _main() -> None:
+    with instrumentation.timed('awss.default_sketch'):
+        default_sketch = Sketches().get_default()
     default_msg = f' (default={default_sketch})' if default_sketch else ''
 
-    parser = argparse.ArgumentParser(description='AWSome Scripts')
+    parser = argparse.ArgumentParser(description='AWSome Scripts', add_help=False)
     parser.set_defaults(func=(lambda a: 0))
+    parser.add_argument('-h', '--help', action=_SketchesHelpAction, help='show this help message and exit')
     parser.add_argument('-s', '--sketch', metavar='SKETCH', default=default_sketch, required=False,
-                        help=f"AWS sketch{default_msg}. One of: {sketches.list()}")
+                        help=f"AWS sketch{default_msg}")
     parser.add_argument('-v', '--verbose', action='store_true', help='Verbose mode')
-
-    subparsers = parser.add_subparsers(title='Available commands')
-    pemr = subparsers.add_parser('emr', help='elastic map reduce')
-    pmwaa = subparsers.add_parser('mwaa', help='managed workflows for apache airflow')
-    pca = subparsers.add_parser('ca', help='code artifact')
-    psketches = subparsers.add_parser('s', help='sketches')
-
-    # Sketches
-    psketches.set_defaults(func=ske.execute)
-    ske.configure_parser(psketches)
-
-    # EMR
-    pemr_subparsers = pemr.add_subparsers(title='EMR subcommands')
-    pemr_start = pemr_subparsers.add_parser('start', description='starts EMR cluster')
-    pemr_start.set_defaults(func=emr_start.execute)
-    emr_start.configure_parser(pemr_start)
-
-    pemr_submit = pemr_subparsers.add_parser('submit', description='submits Spark step')
-    pemr_submit.set_defaults(func=emr_submit.execute)
-    emr_submit.configure_parser(pemr_submit)
-
-    pemr_terminate = pemr_subparsers.add_parser('terminate', description='terminates EMR cluster')
-    pemr_terminate.set_defaults(func=emr_terminate.execute)
-    emr_terminate.configure_parser(pemr_terminate)
-
-    pemr_isidle = pemr_subparsers.add_parser('isidle', description='determines if EMR cluster is idle')
-    pemr_isidle.set_defaults(func=emr_isidle.execute)
-    emr_isidle.configure_parser(pemr_isidle)
-
-    # CodeArtifact
-    pca_subparsers = pca.add_subparsers(title='CodeArtifact subcommands')
-    pca_login = pca_subparsers.add_parser('login', description='login to CA')
-    pca_login.set_defaults(func=ca_login.execute)
-    ca_login.configure_parser(pca_login)
-
-    pca_logout = pca_subparsers.add_parser('logout', description='logout from CA')
-    pca_logout.set_defaults(func=ca_logout.execute)
-    ca_logout.configure_parser(pca_logout)
-
-    # MWAA
-    pmwaa.set_defaults(func=mwaa.execute)
-    mwaa.configure_parser(pmwaa)
-
-    args = parser.parse_args()
-    args.func(args)
+    parser.add_argument('--region', metavar='REGION', help='AWS region (default: region of the AWS profile)')
+    parser.add_argument('--profile', metavar='PROFILE', help='AWS profile (default: default credential chain)')
+    parser.add_argument('--timings', action='store_true',
+                        help='Print timing breakdown (AWS calls, sketch loading, ...) at exit')
+    parser.add_argument('--metrics', metavar='SINK', type=str,
+                        help='Record timings of AWS calls and other phases into a sink: jsonl:PATH or '
+                             'statsd:HOST:PORT')
+    _add_commands(parser, commands, 'Available commands', False)
+
+    with instrumentation.timed('awss.parse'):  # includes importing the command module
+        args = parser.parse_args()
+    if args.metrics:
+        instrumentation.add_sink(instrumentation.sink_from_uri(args.metrics))
+    with instrumentation.timed('awss.command'):
+        args.func(args)
 
 
 if __name__ == "__main__":
@@ -1,58 +1,38 @@
-from datetime import datetime, timedelta, timezone
+import json
+import sys
+from datetime import timedelta
 
-import boto3
+from awsscripts.aws.clients import get_client
+from awsscripts.emr.emr import EMR
+from awsscripts.emr.idle import get_idleness
 
 
 def configure_parser(parser) -> None:
-    parser.add_argument('-c', '--cluster', metavar='CLUSTER_ID', type=str, required=True, help='cluster ID')
+    parser.add_argument('-c', '--cluster', metavar='CLUSTER_ID', type=str, nargs='+', help='cluster ID(s)')
+    parser.add_argument('-a', '--all', action='store_true', help='Check all active clusters')
     parser.add_argument('-i', '--idleness', metavar='HOURS', type=int, default=2,
                         help='Idleness time in hours (default=2)')
+    parser.add_argument('-j', '--json', action='store_true',
+                        help='Print JSON lines report (default when more clusters are checked)')
 
 
 def execute(args) -> None:
-    min_age = timedelta(hours=args.idleness)
-    period_seconds = 300  # 5-minute period, available for 63 days
-
-    cloudwatch = boto3.client('cloudwatch')
-
-    now = datetime.now(timezone.utc)
-    response = cloudwatch.get_metric_data(
-        MetricDataQueries=[
-            {
-                'Id': 'emrIdleClusters',
-                'MetricStat': {
-                    'Metric': {
-                        'Namespace': 'AWS/ElasticMapReduce',
-                        'MetricName': 'IsIdle',
-                        'Dimensions': [{
-                            'Name': 'JobFlowId',
-                            'Value': args.cluster
-                        }]
-                    },
-                    'Period': period_seconds,
-                    'Stat': 'Maximum',
-                    'Unit': 'None'
-                },
-
-                'Label': '${SUM}',
-                'ReturnData': True,
-            },
-        ],
-        StartTime=now - min_age,
-        EndTime=now,
-        ScanBy='TimestampDescending'
-    )['MetricDataResults'][0]
-
-    idle_cluster_value = int(min_age.total_seconds() / period_seconds)  # all 5-minute intervals must be 1.0
-    is_idle = response['Label'] == str(idle_cluster_value)
-
-    idle_period = 0
-    for v in response['Values']:
-        if v == 1.0:
-            idle_period += 5  # each 1.0 means 5 minutes idleness
-        else:
-            break
-
-    if is_idle:
-        print("Cluster is idle now")
-    print(f"Cluster was idle for {idle_period} minutes")
+    if args.all:
+        cluster_ids = [c['Id'] for c in EMR(args.verbose, args.region, args.profile).list_active_clusters()]
+    elif args.cluster:
+        cluster_ids = args.cluster
+    else:
+        print('Cluster ID(s) must be given, or all active clusters must be checked (--all)')
+        sys.exit(1)
+
+    cloudwatch = get_client('cloudwatch', args.region, args.profile)
+    report = get_idleness(cloudwatch, cluster_ids, timedelta(hours=args.idleness))
+
+    if args.json or args.all or len(cluster_ids) > 1:
+        for cluster_id in cluster_ids:
+            print(json.dumps(report[cluster_id]._asdict()))
+    else:
+        idleness = report[cluster_ids[0]]
+        if idleness.is_idle:
+            print("Cluster is idle now")
+        print(f"Cluster was idle for {idleness.idle_minutes} minutes")
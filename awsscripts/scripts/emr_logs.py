@@ -0,0 +1,54 @@
+import argparse
+import sys
+
+from awsscripts.aws.clients import get_client
+from awsscripts.emr.emr import EMR
+from awsscripts.emr.logs import STEP_LOGS, latest_step, tail_step_logs
+from awsscripts.sketches.emr import EmrSketchItem
+from awsscripts.sketches.sketches import Sketches
+
+
+def configure_parser(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('-c', '--clusterid', metavar='ID', type=str, required=True, help='cluster ID')
+    parser.add_argument('-S', '--step', metavar='STEP_ID', type=str,
+                        help='step ID (default: the most recently added step)')
+    parser.add_argument('-l', '--log', metavar='LOG', type=str, action='append', choices=STEP_LOGS,
+                        help=f'Log to print, one of {", ".join(STEP_LOGS)}. Can be repeated (default=stdout). '
+                             'The stderr log is printed to standard error.')
+    parser.add_argument('-f', '--follow', action='store_true',
+                        help='Follow the logs (print new output as it appears) until the step finishes')
+    parser.add_argument('-i', '--interval', metavar='SECONDS', type=float, default=15,
+                        help='Polling interval when following the logs (default=15)')
+    parser.add_argument('-g', '--grace', metavar='SECONDS', type=float, default=600,
+                        help='Max. time to wait for the final logs after the step finished (default=600)')
+    parser.add_argument('-u', '--log-uri', metavar='URI', type=str,
+                        help='Log URI (default: log URI of the cluster, or of the sketch)')
+    parser.add_argument('--endpoint-url', metavar='URL', type=str,
+                        help='S3 endpoint, e.g. of a local S3 stand-in (default: AWS endpoint)')
+
+
+def execute(args: argparse.Namespace) -> None:
+    emr = EMR(args.verbose, args.region, args.profile)
+    if args.step:
+        step_id = args.step
+    else:
+        step = latest_step(emr, args.clusterid)
+        if step is None:
+            print(f'Cluster {args.clusterid} has no steps')
+            sys.exit(1)
+        step_id = step['Id']
+
+    log_uri = args.log_uri or emr.describe_cluster(args.clusterid, bootstrap_actions=False).get('LogUri')
+    if not log_uri and args.sketch:
+        sketch = Sketches()[args.sketch]
+        log_uri = EmrSketchItem.from_content(sketch['emr']).get_log_uri() if 'emr' in sketch else None
+    if not log_uri:
+        print(f'Cluster {args.clusterid} has no log URI, and no log URI is defined in the sketch')
+        sys.exit(1)
+
+    s3_client = get_client('s3', args.region, args.profile, args.endpoint_url)
+    for chunk in tail_step_logs(emr, s3_client, args.clusterid, step_id, log_uri, tuple(args.log or ['stdout']),
+                                args.follow, args.interval, args.grace):
+        output = sys.stderr.buffer if chunk.log == 'stderr' else sys.stdout.buffer
+        output.write(chunk.data)
+        output.flush()
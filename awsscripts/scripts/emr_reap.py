@@ -0,0 +1,55 @@
+import argparse
+import json
+import sys
+from collections import Counter
+from datetime import timedelta
+
+from awsscripts.aws.clients import get_client
+from awsscripts.emr.emr import EMR
+from awsscripts.emr.reaper import WOULD_TERMINATE, TERMINATED, reap_clusters
+
+
+def configure_parser(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('-n', '--name', metavar='PATTERN', type=str,
+                        help='Only clusters with names matching a shell-style pattern, e.g. "etl-*"')
+    parser.add_argument('-T', '--tag', metavar='KEY[=VALUE]', type=str, action='append', default=[],
+                        help='Only clusters with the tag (and value). Can be repeated, all tags must match.')
+    parser.add_argument('-a', '--all', action='store_true', help='Reap all active clusters (no name or tag filter)')
+    parser.add_argument('-i', '--idleness', metavar='HOURS', type=int, default=2,
+                        help='Idleness time in hours (default=2)')
+    parser.add_argument('-d', '--dry-run', action='store_true', help='Only report idle clusters, do not terminate')
+    parser.add_argument('-r', '--report', metavar='FILE', type=str,
+                        help='Write a report of all matching clusters as JSON lines ("-" for stdout)')
+    parser.add_argument('-w', '--workers', metavar='N', type=int, default=8,
+                        help='Max. number of clusters described at the same time (default=8)')
+
+
+def execute(args: argparse.Namespace) -> None:
+    if not (args.name or args.tag or args.all):
+        print('A cluster name pattern or tags must be given, or all active clusters must be reaped (--all)')
+        sys.exit(1)
+    tags = {}
+    for tag in args.tag:
+        key, equals, value = tag.partition('=')
+        tags[key] = value if equals else None
+
+    emr = EMR(args.verbose, args.region, args.profile)
+    cloudwatch = get_client('cloudwatch', args.region, args.profile)
+    clusters = reap_clusters(emr, cloudwatch, timedelta(hours=args.idleness), args.name, tags, args.dry_run,
+                             args.workers)
+
+    if args.report == '-':
+        for cluster in clusters:
+            print(json.dumps(cluster._asdict()))
+    elif args.report:
+        with open(args.report, 'w') as f:
+            for cluster in clusters:
+                f.write(json.dumps(cluster._asdict()) + '\n')
+
+    actions = Counter(cluster.action for cluster in clusters)
+    verb = 'Would terminate' if args.dry_run else 'Terminated'
+    print(f'{verb} {actions[WOULD_TERMINATE if args.dry_run else TERMINATED]} of {len(clusters)} matching '
+          f'clusters: ' + ', '.join(f'{action}={count}' for action, count in sorted(actions.items())),
+          file=sys.stderr if args.report == '-' else sys.stdout)
+    if any(cluster.error for cluster in clusters):
+        sys.exit(1)
@@ -1,8 +1,12 @@
+import argparse
 import sys
+from typing import Optional
 
 from awsscripts.sketches.sketches import Sketches
 from awsscripts.emr.configurations import EmrConfigurations
 from awsscripts.emr.emr import EMR
+from awsscripts.emr.steps import StepsNotAddedError
+from awsscripts.emr.waiter import ClusterFailedError
 from awsscripts.sketches.emr import EmrSketchItem
 
 
@@ -28,33 +32,64 @@ def configure_parser(parser):
     parser.add_argument('-S', '--spot', help='Use Spot core nodes', action='store_true')
     parser.add_argument('-b', '--boot', metavar='NAME', type=str, nargs='*',
                         help='Bootstrap scripts (names as defined in the sketch).')
+    parser.add_argument('-w', '--wait', action='store_true',
+                        help='Wait until the cluster is ready (WAITING or RUNNING)')
+    parser.add_argument('-t', '--timeout', metavar='SECONDS', type=float,
+                        help='Max. time to wait for the cluster (default: no limit)')
+    parser.add_argument('-r', '--reuse', action='store_true',
+                        help='Reuse an active cluster started with the same configuration (release, applications, '
+                             'instances, bootstrap scripts, configurations and roles), if there is one. The initial '
+                             'steps are added to the reused cluster.')
     parser.add_argument('-A', '--applications', metavar='APP', nargs='*',
                         default=['Spark', 'JupyterHub', 'JupyterEnterpriseGateway', 'Hadoop', 'Livy'],
                         help='EMR applications (default: Spark,JupyterHub,JupyterEnterpriseGateway,Hadoop,Livy)')
 
 
 def execute(args) -> None:
-    if not args.sketch:
-        print('Sketch not is set, and no default sketch exists')
+    emr = EMR(args.verbose, args.region, args.profile)
+    try:
+        cluster_id = start(args, emr)
+    except (ValueError, StepsNotAddedError) as e:
+        print(e)
         sys.exit(1)
 
+    print(cluster_id, flush=True)
+
+    if args.wait:
+        try:
+            result = emr.wait_for_cluster(cluster_id, args.timeout)
+        except (ClusterFailedError, TimeoutError) as e:
+            print(e)
+            sys.exit(1)
+        print(f'Cluster is {result.state} after {result.seconds:.0f}s; time in states: ' +
+              ', '.join(f'{state}={seconds:.0f}s' for state, seconds in result.time_in_state.items()))
+
+
+def start(args: argparse.Namespace, emr: EMR, sketches: Optional[Sketches] = None) -> str:
+    """
+    Starts EMR cluster configured by the sketch and command-line arguments
+    :param args: parsed arguments (see configure_parser)
+    :param emr: EMR
+    :param sketches: sketches (default=None, i.e. the default sketch store)
+    :return: ID of the started (or reused) cluster
+    :raises ValueError: if the arguments are not valid
+    :raises StepsNotAddedError: if the initial steps could not be added to a reused cluster
+    """
+    if not args.sketch:
+        raise ValueError('Sketch not is set, and no default sketch exists')
+
     if args.fleet and (args.master_instance or args.core_instance):
-        print('Instance types are mutually exclusive with instance fleet')
-        sys.exit(1)
+        raise ValueError('Instance types are mutually exclusive with instance fleet')
     if (args.master_instance and not args.core_instance) or (args.core_instance and not args.master_instance):
-        print('Master and Core node instances must be defined')
-        sys.exit(1)
+        raise ValueError('Master and Core node instances must be defined')
     if args.core_instance and not args.count:
-        print('Core node instances count must be defined')
-        sys.exit(1)
+        raise ValueError('Core node instances count must be defined')
     if args.fleet and not args.master_capacity:
-        print('Master node target on_demand capacity must be defined')
-        sys.exit(1)
+        raise ValueError('Master node target on_demand capacity must be defined')
     if args.fleet and not args.core_capacity:
-        print('Core node target on_demand capacity must be defined')
-        sys.exit(1)
+        raise ValueError('Core node target on_demand capacity must be defined')
 
-    sketches = Sketches()
+    sketches = sketches if sketches is not None else Sketches()
     emr_item = EmrSketchItem.from_content(sketches[args.sketch]["emr"])
     configurations = EmrConfigurations()
 
@@ -92,13 +127,12 @@ def execute(args) -> None:
     if args.boot:
         boot = [emr_item.get_bootstrap_script(b) for b in args.boot]
 
-    emr = EMR(args.verbose)
-    cluster_id = emr.start_cluster(
+    return emr.start_cluster(
         name=emr_item.get_cluster_name(),
         log_uri=emr_item.get_log_uri(),
         keep_alive=True,
         protect=emr_item.get_protect(),
-        applications=emr_item.applications,
+        applications=emr_item.get_applications(),
         job_flow_role=emr_item.get_job_flow_role(),
         service_role=emr_item.get_service_role(),
         emr_label=emr_item.get_emr_label(),
@@ -116,7 +150,6 @@ def execute(args) -> None:
         subnets=emr_item.get_subnets(),
         configurations=emr_item.get_configurations(),
         keyname=emr_item.get_keyname(),
-        bootstrap_scripts=boot
+        bootstrap_scripts=boot,
+        reuse=args.reuse
     )
-
-    print(cluster_id)
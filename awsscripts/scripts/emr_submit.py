@@ -1,9 +1,15 @@
+import argparse
+import json
+import sys
+from typing import Any, Dict, List
+
 from awsscripts.emr.emr import EMR
+from awsscripts.emr.steps import StepNotFoundError, StepsNotAddedError
 
 
 def configure_parser(parser) -> None:
     parser.add_argument('-c', '--clusterid', metavar='ID', type=str, required=True, help='cluster ID')
-    parser.add_argument('-s', '--stepname', metavar='STEP_NAME', type=str, required=True, help='step name')
+    parser.add_argument('-s', '--stepname', metavar='STEP_NAME', type=str, help='step name')
     parser.add_argument('-p', '--py-files', metavar='PATH', type=str,
                         help='Additional python files (separate with comma (","))')
     parser.add_argument('-j', '--jars', metavar='PATH', type=str,
@@ -13,14 +19,92 @@ def configure_parser(parser) -> None:
     parser.add_argument('-m', '--master', metavar='MASTER', type=str,
                         help='Application master')
     parser.add_argument('-C', '--classname', metavar='FULL_NAME', type=str, help='Java class to run')
-    parser.add_argument('application', metavar='URI', type=str, help='Application JAR/Python main file')
+    parser.add_argument('-b', '--batch', metavar='FILE', type=str,
+                        help='Submit many steps, read as JSON lines from a file ("-" for stdin). Each line is '
+                             'an object with keys "name", "application" and optionally "arguments", '
+                             '"deploy_mode", "master", "jars", "py_files", "classname". Missing optional keys '
+                             'are taken from the command line.')
+    parser.add_argument('-Q', '--queue-timeout', metavar='SECONDS', type=float,
+                        help='Max. time to wait for the cluster to accept more steps, while it has 256 pending or '
+                             'running steps (default: no limit)')
+    parser.add_argument('-w', '--wait', action='store_true',
+                        help='Wait until the step(s) finish, printing state changes and a summary')
+    parser.add_argument('-i', '--interval', metavar='SECONDS', type=float, default=15,
+                        help='Polling interval when waiting for steps (default=15)')
+    parser.add_argument('application', metavar='URI', type=str, nargs='?', help='Application JAR/Python main file')
     parser.add_argument('arguments', metavar='ARG', type=str, nargs='*', help='Command-line arguments')
 
 
 def execute(args) -> None:
-    emr = EMR(args.verbose)
-    step_id = emr.add_spark_step(
-        args.clusterid, args.stepname, args.deploy_mode, args.master, args.application, args.jars, args.py_files,
-        args.classname, args.arguments
-    )
-    print(step_id)
+    emr = EMR(args.verbose, args.region, args.profile)
+    try:
+        step_ids = submit(args, emr)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    except StepsNotAddedError as e:
+        for step_id in e.step_ids:
+            print(step_id, flush=True)
+        print(e)
+        sys.exit(1)
+
+    for step_id in step_ids:
+        print(step_id, flush=True)
+
+    if args.wait:
+        tracker = emr.track_steps(args.clusterid, step_ids, args.interval)
+        try:
+            for event in tracker.track():
+                reason = f' ({event.reason})' if event.reason else ''
+                print(f'{event.step_id} {event.name}: {event.state}{reason}', flush=True)
+        except StepNotFoundError as e:
+            print(e)
+            sys.exit(1)
+        summary = tracker.summary()
+        print(f'{len(step_ids)} steps finished after {summary.seconds:.0f}s: ' +
+              ', '.join(f'{state}={count}' for state, count in sorted(summary.counts.items())))
+        if not summary.succeeded:
+            sys.exit(1)
+
+
+def submit(args: argparse.Namespace, emr: EMR, skip: int = 0) -> List[str]:
+    """
+    Submits Spark step(s) configured by command-line arguments
+    :param args: parsed arguments (see configure_parser)
+    :param emr: EMR
+    :param skip: number of leading steps which were submitted before (e.g. by an interrupted run), and which are
+     not submitted again
+    :return: IDs of the submitted steps (without the skipped ones)
+    :raises ValueError: if the arguments are not valid
+    :raises StepsNotAddedError: if not all steps were submitted
+    """
+    if args.batch:
+        if args.batch == '-':
+            specs = _read_step_specs(sys.stdin.readlines())
+        else:
+            with open(args.batch) as f:
+                specs = _read_step_specs(f.readlines())
+        steps = [{
+            'Name': spec['name'],
+            'Args': EMR.spark_submit_args(
+                spec.get('deploy_mode', args.deploy_mode), spec.get('master', args.master), spec['application'],
+                spec.get('jars', args.jars), spec.get('py_files', args.py_files),
+                spec.get('classname', args.classname), spec.get('arguments', [])
+            )
+        } for spec in specs]
+        return emr.add_steps(args.clusterid, steps[skip:], args.queue_timeout)
+    elif args.stepname and args.application:
+        return [] if skip else [emr.add_spark_step(
+            args.clusterid, args.stepname, args.deploy_mode, args.master, args.application, args.jars,
+            args.py_files, args.classname, args.arguments
+        )]
+    else:
+        raise ValueError('Step name and application must be defined')
+
+
+def _read_step_specs(lines: List[str]) -> List[Dict[str, Any]]:
+    specs = [json.loads(line) for line in lines if line.strip()]
+    for number, spec in enumerate(specs, start=1):
+        if 'name' not in spec or 'application' not in spec:
+            raise ValueError(f'Step #{number} must define "name" and "application"')
+    return specs
@@ -7,5 +7,5 @@ def configure_parser(parser) -> None:
 
 
 def execute(args) -> None:
-    emr = EMR(verbose=args.verbose)
+    emr = EMR(args.verbose, args.region, args.profile)
     emr.terminate_cluster(args.clusterid)
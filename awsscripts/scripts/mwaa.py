@@ -1,43 +1,74 @@
 from __future__ import print_function
 
-import base64
 import json
 import sys
+from pathlib import Path
 
-import boto3
-import requests
-
+from awsscripts.mwaa.mwaa import MWAA
+from awsscripts.sketches.mwaa import MWAASketchItem
 from awsscripts.sketches.sketches import Sketches
 
 
 def configure_parser(parser):
-    parser.add_argument('-e', '--environment', metavar='NAME', type=str, help='MWAA environment')
-    parser.add_argument('command', metavar='COMMAND/ARG', type=str, nargs='+', help='MWAA CLI command')
+    parser.add_argument('-e', '--environment', metavar='NAME', type=str, action='append',
+                        help='MWAA environment. Can be repeated (or comma-separated) to run the command on many '
+                             'environments concurrently; results are printed as JSON lines.')
+    parser.add_argument('-w', '--workers', metavar='N', type=int, default=8,
+                        help='Max. number of environments to run the command on at the same time (default=8)')
+    parser.add_argument('-f', '--commands-file', metavar='FILE', type=str,
+                        help='Run many commands, one per line, read from a file ("-" for stdin)')
+    parser.add_argument('-T', '--token-cache', action='store_true',
+                        help='Cache CLI tokens on disk (in ~/.aws-scripts/mwaa-tokens), to reuse them by next runs')
+    parser.add_argument('command', metavar='COMMAND/ARG', type=str, nargs='*', help='MWAA CLI command')
 
 
 def execute(args) -> None:
     if args.sketch and not args.environment:
-        sketches = Sketches()
-        if 'mwaa' in sketches[args.sketch]:
-            environment = sketches[args.sketch]['mwaa']['environment']
-        else:
+        sketch = Sketches()[args.sketch]
+        environments = MWAASketchItem.from_content(sketch['mwaa']).get_environments() if 'mwaa' in sketch else []
+        if not environments:
             print('MWAA environment is not set, and no environment is defined in the sketch')
             sys.exit(1)
     elif args.environment:
-        environment = args.environment
+        environments = [e for environment in args.environment for e in environment.split(',') if e]
     else:
         print('Sketch and MWAA environment are not set')
         sys.exit(1)
 
-    client = boto3.client('mwaa')
-    token_with_server = client.create_cli_token(Name=environment)
-    token = token_with_server['CliToken']
-    server = token_with_server['WebServerHostname']
+    if args.commands_file == '-':
+        commands = [line.strip() for line in sys.stdin if line.strip()]
+    elif args.commands_file:
+        with open(args.commands_file) as f:
+            commands = [line.strip() for line in f if line.strip()]
+    elif args.command:
+        commands = [' '.join(args.command)]
+    else:
+        print('MWAA CLI command is not set')
+        sys.exit(1)
 
-    r = json.loads(requests.post(f'https://{server}/aws_mwaa/cli', data=args.command, headers={
-        'Authorization': f'Bearer {token}',
-        'Content-Type': 'text/plain'
-    }).text)
+    token_cache_dir = Path.home() / '.aws-scripts' / 'mwaa-tokens' if args.token_cache else None
+    mwaa = MWAA(args.verbose, args.region, args.profile, token_cache_dir=token_cache_dir)
+    failed = False
+    if len(environments) == 1:
+        for command in commands:
+            result = mwaa.try_cli(environments[0], command)
+            print(result.stdout)
+            print(result.stderr, file=sys.stderr)
+            failed = failed or result.exit_code != 0
+        if failed:
+            sys.exit(1)
+        return
 
-    print(base64.b64decode(r['stdout']))
-    print(base64.b64decode(r['stderr']), file=sys.stderr)
+    for command in commands:
+        for result in mwaa.cli_many(environments, command, args.workers):
+            print(json.dumps({
+                'environment': result.environment,
+                'command': result.command,
+                'exit_code': result.exit_code,
+                'seconds': round(result.seconds, 3),
+                'stdout': result.stdout,
+                'stderr': result.stderr
+            }), flush=True)
+            failed = failed or result.exit_code != 0
+    if failed:
+        sys.exit(1)
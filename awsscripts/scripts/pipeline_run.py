@@ -0,0 +1,76 @@
+import argparse
+import sys
+from pathlib import Path
+
+from awsscripts.pipeline.dsl import PipelineError, load_pipeline
+from awsscripts.pipeline.journal import Journal, journal_path
+from awsscripts.pipeline.scheduler import PipelineEvent, Scheduler
+from awsscripts.pipeline.tasks import TaskContext
+
+
+def configure_parser(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('-w', '--workers', metavar='N', type=int,
+                        help='Max. number of tasks (loop iterations) running at once (default: as defined by the '
+                             'pipeline, or 4)')
+    parser.add_argument('-D', '--define', metavar='NAME=VALUE', type=str, action='append', default=[],
+                        help='Set a pipeline variable (overrides the value in the file). Can be repeated.')
+    parser.add_argument('--dry-run', action='store_true', help='Only validate the pipeline and print its tasks')
+    parser.add_argument('-r', '--resume', action='store_true',
+                        help='Resume the previous run of the pipeline: skip tasks which succeeded, and run '
+                             'interrupted and failed tasks again, reattaching to their clusters and steps which are '
+                             'still usable')
+    parser.add_argument('--no-journal', action='store_true',
+                        help='Do not record progress in the journal (~/.aws-scripts/journal); such a run cannot be '
+                             'resumed')
+    parser.add_argument('file', metavar='FILE', type=str, help='Pipeline file (JSON)')
+
+
+def execute(args: argparse.Namespace) -> None:
+    variables = {}
+    for definition in args.define:
+        name, equals, value = definition.partition('=')
+        if not equals:
+            print(f'Variable must be defined as NAME=VALUE: {definition}')
+            sys.exit(1)
+        variables[name] = value
+
+    try:
+        pipeline = load_pipeline(Path(args.file), variables)
+        context = TaskContext(pipeline.sketch or args.sketch, args.verbose, args.region, args.profile)
+        scheduler = Scheduler(pipeline, context, workers=args.workers, on_event=_print_event)
+    except (OSError, PipelineError) as e:
+        print(e)
+        sys.exit(1)
+
+    if args.dry_run:
+        for task in pipeline.tasks.values():
+            loop = f' foreach {task.foreach["var"]}' if task.foreach else ''
+            after = f' after {", ".join(task.after)}' if task.after else ''
+            print(f'{task.id} ({task.type}){loop}{after}')
+        return
+
+    if args.no_journal:
+        result = scheduler.run()
+    else:
+        with Journal(journal_path(Path(args.file)), args.resume) as journal:
+            scheduler.journal = journal
+            result = scheduler.run()
+    states = [task.state for task in result.tasks.values()]
+    print(f'Pipeline finished after {result.seconds:.0f}s: ' +
+          ', '.join(f'{state}={states.count(state)}' for state in sorted(set(states))))
+    if not result.succeeded:
+        if not args.no_journal:
+            print(f'Resume with: awss pipeline run --resume {args.file}')
+        sys.exit(1)
+
+
+def _print_event(event: PipelineEvent) -> None:
+    if event.unit is None:
+        name = event.task_id
+    elif event.variables:
+        name = f'{event.task_id}[{event.unit}] {event.variables}'
+    else:
+        return  # a task without a loop has one unit, reported as the task
+    error = f': {event.error}' if event.error else ''
+    seconds = f' after {event.seconds:.1f}s' if event.state != 'STARTED' else ''
+    print(f'{name} {event.state}{seconds}{error}', flush=True)
@@ -1,14 +1,55 @@
+import argparse
+import fnmatch
+import json
+import re
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict
+
 from awsscripts.sketches.sketches import Sketches, sketch_items
 from awsscripts.sketches.emr import EmrSketchItem
+from awsscripts.sketches.hashing import canonical_json, dedup_sketches, diff, find_duplicates
+from awsscripts.sketches.store import JsonDirectoryStore, copy_sketches
 
 
 def configure_parser(parser):
     group = parser.add_mutually_exclusive_group()
     parser.add_argument('-d', '--default', help='Make the sketch default', action='store_true')
-    parser.add_argument('-cemr', '--configure-emr', metavar='CLUSTER_ID', type=str,
-                        help='Configure EMR sketch item from existing EMR cluster')
+    parser.add_argument('-cemr', '--configure-emr', metavar='CLUSTER_ID', type=str, nargs='+',
+                        help='Configure EMR sketch item from existing EMR cluster. If more clusters are given, '
+                             'a sketch is configured from each of them (see --sketch-name).')
+    parser.add_argument('-A', '--all-clusters', action='store_true',
+                        help='Configure a sketch from each cluster matching --cluster-states, --created-after and '
+                             '--cluster-name (see --sketch-name)')
+    parser.add_argument('--cluster-states', metavar='STATE', type=str, nargs='+',
+                        help='States of clusters to configure sketches from (default: active states)')
+    parser.add_argument('--created-after', metavar='YYYY-MM-DD', type=datetime.fromisoformat,
+                        help='Configure sketches only from clusters created after given date')
+    parser.add_argument('--cluster-name', metavar='PATTERN', type=str,
+                        help='Configure sketches only from clusters with names matching a shell-style pattern')
+    parser.add_argument('--sketch-name', metavar='TEMPLATE', type=str, default='{name}-{id}',
+                        help='Name of sketches configured from many clusters; {name} and {id} are replaced by '
+                             'cluster name and ID (default="{name}-{id}")')
+    parser.add_argument('--duplicates', action='store_true',
+                        help='Report parts (sketch items, their keys, configurations, bootstrap scripts, ...) '
+                             'repeated in many sketches, as JSON lines')
+    parser.add_argument('--dedup', action='store_true',
+                        help='Pull values shared by many sketches into generated "base-<hash>" sketches, which the '
+                             'sketches include')
+    parser.add_argument('--min-count', metavar='N', type=int, default=2,
+                        help='Min. number of sketches sharing a part, for --duplicates and --dedup (default=2)')
+    parser.add_argument('--diff', metavar='SKETCH', type=str,
+                        help='Print structural differences of the sketch and another sketch (both interpreted)')
+    parser.add_argument('-w', '--workers', metavar='N', type=int, default=8,
+                        help='Max. number of clusters described at the same time (default=8)')
     parser.add_argument('-l', '--list', action='store_true', help='List existing sketches')
     parser.add_argument('-L', '--list-items', action='store_true', help='List existing sketch items')
+    parser.add_argument('--import-json', metavar='DIR', type=str,
+                        help='Import all sketches from a directory of JSON sketch files into the sketch store')
+    parser.add_argument('--export-json', metavar='DIR', type=str,
+                        help='Export all sketches from the sketch store into a directory of JSON sketch files')
 
     group.add_argument('-c', '--create', metavar='SERVICE', type=str,
                        help=f'Create an item in a sketch. One of: {list(sketch_items)}')
@@ -22,6 +63,25 @@ def execute(args) -> None:
     if args.list:
         print(list(sketch_items))
 
+    if args.import_json:
+        count = copy_sketches(JsonDirectoryStore(Path(args.import_json)), sketches.store)
+        print(f'Imported {count} sketches from {args.import_json}')
+
+    if args.export_json:
+        count = copy_sketches(sketches.store, JsonDirectoryStore(Path(args.export_json)))
+        print(f'Exported {count} sketches to {args.export_json}')
+
+    if args.duplicates:
+        for duplicate in find_duplicates(dict(sketches.store.read_all()), args.min_count):
+            print(json.dumps({**duplicate._asdict(), 'count': len(duplicate.sketches)}))
+
+    if args.dedup:
+        _dedup(args, sketches)
+
+    if args.sketch and args.diff:
+        for difference in diff(sketches[args.sketch], sketches[args.diff]):
+            print(json.dumps(difference._asdict()))
+
     if args.sketch and args.list_items:
         print(sketches.list_sketch_items(args.sketch))
 
@@ -34,6 +94,74 @@ def execute(args) -> None:
     if args.sketch and args.remove:
         sketches.remove_sketch_item(args.sketch, args.remove)
 
-    if args.sketch and args.configure_emr:
-        emr_item = EmrSketchItem.from_cluster(args.configure_emr)
+    if args.all_clusters or (args.configure_emr and len(args.configure_emr) > 1):
+        _configure_emr_many(args, sketches)
+    elif args.sketch and args.configure_emr:
+        from awsscripts.emr.emr import EMR  # imported lazily, it loads boto3
+
+        emr_item = EmrSketchItem.from_cluster(args.configure_emr[0], EMR(args.verbose, args.region, args.profile))
         sketches.replace_sketch_item(args.sketch, 'emr', emr_item.generate())
+
+
+def _configure_emr_many(args: argparse.Namespace, sketches: Sketches) -> None:
+    from awsscripts.emr.emr import EMR, ACTIVE_CLUSTER_STATES  # imported lazily, it loads boto3
+
+    emr = EMR(args.verbose, args.region, args.profile)
+    start = time.monotonic()
+    if args.all_clusters:
+        clusters = emr.list_clusters(args.cluster_states or ACTIVE_CLUSTER_STATES, args.created_after)
+        cluster_ids = [c['Id'] for c in clusters if not args.cluster_name or fnmatch.fnmatch(c['Name'],
+                                                                                             args.cluster_name)]
+    else:
+        cluster_ids = args.configure_emr
+
+    contents = {}
+    failed = 0
+    for cluster_id, cluster, error in emr.describe_clusters(cluster_ids, args.workers):
+        if cluster is None:
+            print(f'Could not describe cluster {cluster_id}: {error}', file=sys.stderr)
+            failed += 1
+            continue
+        try:
+            emr_item = EmrSketchItem.from_cluster_description(cluster)
+        except KeyError as e:
+            print(f'Could not configure a sketch from cluster {cluster_id}: missing {e}', file=sys.stderr)
+            failed += 1
+            continue
+        sketch = args.sketch_name.format(name=cluster['Name'], id=cluster_id)
+        contents[re.sub(r'[^\w.-]', '_', sketch)] = emr_item.generate()
+
+    if contents:
+        sketches.replace_sketch_items('emr', contents)
+    seconds = time.monotonic() - start
+    print(f'Configured {len(contents)} sketches from {len(cluster_ids)} clusters ({failed} failed) in {seconds:.1f}s, '
+          f'{len(cluster_ids) / seconds if seconds else 0:.1f} clusters/s')
+    if failed:
+        sys.exit(1)
+
+
+def _dedup(args: argparse.Namespace, sketches: Sketches) -> None:
+    with sketches.store.lock_all():
+        originals = dict(sketches.store.read_all())
+        result = dedup_sketches(originals, args.min_count)
+        if not result.sketches:
+            print('No values are shared by enough sketches')
+            return
+
+        def interpret(name: str) -> Dict[str, Any]:
+            return {k: v for k, v in sketches[name].items() if k != 'include'}
+
+        interpreted = {name: interpret(name) for name in result.sketches}
+        sketches.write_many({**result.bases, **result.sketches})
+        changed = [name for name in result.sketches if interpret(name) != interpreted[name]]
+        if changed:
+            restored = [*result.sketches, *(name for name in result.bases if name in originals)]
+            sketches.write_many({name: originals[name] for name in restored})
+            sketches.delete_many([name for name in result.bases if name not in originals])
+            print(f'Deduplication would change sketches {changed}, the sketches were restored', file=sys.stderr)
+            sys.exit(1)
+
+    before = sum(len(canonical_json(originals[name])) for name in result.sketches)
+    after = sum(len(canonical_json(content)) for content in (*result.bases.values(), *result.sketches.values()))
+    print(f'Deduplicated {len(result.sketches)} sketches into {len(result.bases)} bases: '
+          f'{before} -> {after} bytes')
@@ -0,0 +1,114 @@
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Optional, Tuple, Union
+
+# Signature of a sketch source, which changes whenever the source changes; None if the source does not exist.
+# Signature of a file is (modification time in ns, size, inode).
+Signature = Optional[Tuple[int, ...]]
+
+
+def file_signature(path: Union[Path, int]) -> Signature:
+    """
+    Gets signature of a file, which changes whenever the file is modified or replaced
+    :param path: file path, or descriptor of an open file
+    :return: file signature; None if the file does not exist
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class CacheEntry(NamedTuple):
+    value: Any  # shared value, must not be modified
+    snapshot: bytes  # pickled value, for handing out private copies
+    files: Dict[Hashable, Signature]  # sources (e.g. files) the value was built from
+
+    def copy(self) -> Any:
+        return pickle.loads(self.snapshot)
+
+
+class SketchCache:
+    """
+    LRU cache of parsed sketches.
+
+    An entry remembers signatures of all sources it was built from (a sketch and all included sketches; e.g.
+    sketch files). It is valid only while none of the sources has changed, so a changed include invalidates all
+    sketches including it.
+    """
+
+    def __init__(self, maxsize: int = 128) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[Hashable, CacheEntry]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, signature: Callable[[Any], Signature] = file_signature) -> Optional[CacheEntry]:
+        """
+        Gets a valid entry
+        :param key: entry key
+        :param signature: gets current signature of a source (default=file_signature, i.e. sources are files)
+        :return: the entry; None if there is no valid entry
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and all(signature(p) == s for p, s in entry.files.items()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any, files: Dict[Hashable, Signature]) -> CacheEntry:
+        """
+        Puts an entry into the cache, evicting the least recently used entry if the cache is full.
+        :param key: entry key
+        :param value: cached value. It is shared by the cache and must not be modified afterwards.
+        :param files: signatures of sources the value was built from, as they were read
+        :return: the new entry
+        """
+        entry = CacheEntry(value, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), dict(files))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, source: Hashable) -> None:
+        """
+        Removes all entries built from given source
+        :param source: source (e.g. file path)
+        :return: nothing
+        """
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if source in e.files]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def cache_info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._entries))
+
+
+# Cache shared by all Sketches instances in the process
+sketch_cache = SketchCache()
@@ -1,12 +1,65 @@
-from typing import Dict, Any, Optional, List
+import math
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Any, Optional, List, Callable, Mapping, Tuple, TYPE_CHECKING
 
-from awsscripts.ec2.ec2 import ec2_instances
-from awsscripts.emr.emr import EMR
+from awsscripts.ec2.ec2 import InstanceType, instance_catalog
 from awsscripts.sketches.sketchitem import SketchItem
 
+if TYPE_CHECKING:
+    from awsscripts.emr.emr import EMR
+
+
+def default_fleet_weight(instance: InstanceType) -> int:
+    """
+    Default instance fleet weight: one capacity unit per 4 vCPUs or per 32 GB of memory, whichever is greater.
+    :param instance: instance type
+    :return: weighted capacity (instance types with zero weight are left out of instance fleets)
+    """
+    return int(max(instance.cpu / 4, instance.memory / 32))
+
+
+@lru_cache(maxsize=32)
+def instance_fleet_groups(weight: Callable[[InstanceType], int] = default_fleet_weight,
+                          bucket_width: Optional[float] = None) -> Mapping[str, Tuple[Dict[str, Any], ...]]:
+    """
+    Groups instance types from the instance catalog into instance fleets by memory/cpu ratio. Each ratio bucket
+    "mem/cpu=R" is further split into "ssd;mem/cpu=R" (instance store) and "ebs;mem/cpu=R" (EBS only).
+
+    The groups are computed once for each (weight, bucket_width) and shared, so they must not be modified.
+
+    :param weight: function computing WeightedCapacity of an instance type
+    :param bucket_width: width of memory/cpu ratio buckets; ratios are rounded down to a multiple of it.
+     If None, the ratio is just rounded to 2 decimal digits.
+    :return: read-only mapping of fleet name to instance type configs
+    """
+    result: Dict[str, List[Dict[str, Any]]] = {}
+    for instance in instance_catalog:
+        ratio = instance.memory / instance.cpu
+        if bucket_width:
+            ratio = math.floor(ratio / bucket_width) * bucket_width
+        name = 'mem/cpu=' + str(round(ratio, 2))
+        capacity = weight(instance)
+        if capacity > 0:
+            value = {
+                'InstanceType': instance.name,
+                'WeightedCapacity': capacity
+            }
+            if instance.storage > 0:
+                result.setdefault('ssd;' + name, []).append(value)
+            else:
+                result.setdefault('ebs;' + name, []).append(value)
+            result.setdefault(name, []).append(value)
+    return MappingProxyType({name: tuple(values) for name, values in result.items()})
+
 
 class EmrSketchItem(SketchItem):
 
+    def __init__(self) -> None:
+        super().__init__()
+        self.fleet_weight: Callable[[InstanceType], int] = default_fleet_weight
+        self.fleet_bucket_width: Optional[float] = None
+
     def has_configuration(self, name: str) -> bool:
         """
         Determines if a configuration (with given classification name) exists.
@@ -45,8 +98,7 @@ class EmrSketchItem(SketchItem):
         :param properties: properties
         :return: nothing
         """
-        self._remove_in_list_dict('configurations', 'Classification', name)
-        self._put_in_list('configurations', {
+        self._put_in_list_dict('configurations', 'Classification', {
             'Classification': name,
             'Properties': properties
         })
@@ -57,11 +109,10 @@ class EmrSketchItem(SketchItem):
         :param configurations: raw configurations
         :return: nothing
         """
-        names = map(lambda c: c['Classification'], configurations)
-        for name in names:
-            self.remove_configuration(name)
-        for config in configurations:
-            self.put_configuration(config['Classification'], config['Properties'])
+        self._put_all_in_list_dict('configurations', 'Classification', [{
+            'Classification': config['Classification'],
+            'Properties': config['Properties']
+        } for config in configurations])
 
     def has_bootstrap_script(self, name: str) -> bool:
         return self._has_in_list_dict('bootstrap_scripts', 'name', name)
@@ -70,7 +121,7 @@ class EmrSketchItem(SketchItem):
         self._remove_in_list_dict('bootstrap_scripts', 'name', name)
 
     def put_bootstrap_script(self, name: str, path: str, args: List[str]) -> None:
-        self._put_in_list('bootstrap_scripts', {
+        self._put_in_list_dict('bootstrap_scripts', 'name', {
             'name': name,
             'path': path,
             'args': args
@@ -131,11 +182,7 @@ class EmrSketchItem(SketchItem):
         return self._get('keyname')
 
     def put_tags(self, tags: List[Dict[str, str]]) -> None:
-        names = map(lambda t: t['Key'], tags)
-        for name in names:
-            self._remove_in_list_dict('tags', 'Key', name)
-        for tag in tags:
-            self._put_in_list('tags', tag)
+        self._put_all_in_list_dict('tags', 'Key', tags)
 
     def get_tags(self) -> List[Dict[str, str]]:
         return self._get_list_dict('tags')
@@ -215,37 +262,43 @@ class EmrSketchItem(SketchItem):
     def get_core_size_gb(self) -> Optional[int]:
         return self._get('core_size_gb')
 
+    def configure_instance_fleets(self, weight: Optional[Callable[[InstanceType], int]] = None,
+                                  bucket_width: Optional[float] = None) -> None:
+        """
+        Configures grouping of instance types into generated instance fleets.
+        :param weight: function computing WeightedCapacity of an instance type (default=default_fleet_weight)
+        :param bucket_width: width of memory/cpu ratio buckets (default=None, i.e. ratio rounded to 2 digits)
+        :return: nothing
+        """
+        self.fleet_weight = weight if weight else default_fleet_weight
+        self.fleet_bucket_width = bucket_width
+
     def generate(self):
-        return self.content() + {
+        # the cached fleet groups are shared, so callers get copies of the instance type configs (flat dicts)
+        fleets = instance_fleet_groups(self.fleet_weight, self.fleet_bucket_width)
+        return {
+            **self.content,
             'job_flow_role': self.get_job_flow_role(),
             'service_role': self.get_service_role(),
             'security_groups': self.get_security_groups(),
-            'instance_fleets': EmrSketchItem._generate_instance_fleets()
+            'instance_fleets': {name: [dict(config) for config in configs] for name, configs in fleets.items()}
         }
 
     @staticmethod
-    def _generate_instance_fleets():
-        result = {}
-        for instance, values in ec2_instances.items():
-            name = 'mem/cpu=' + str(round(values['memory'] / values['cpu'], 2))
-            weight = int(max(values['cpu'] / 4, values['memory'] / 32))
-            if weight > 0:
-                value = {
-                    'InstanceType': instance,
-                    'WeightedCapacity': weight
-                }
-                if values['storage'] > 0:
-                    result.setdefault('ssd;' + name, []).append(value)
-                else:
-                    result.setdefault('ebs;' + name, []).append(value)
-                result.setdefault(name, []).append(value)
-        return result
+    def from_cluster(cluster_id: str, emr: Optional['EMR'] = None):
+        from awsscripts.emr.emr import EMR  # imported lazily, it loads boto3
+
+        emr = emr if emr else EMR(verbose=False)
+        return EmrSketchItem.from_cluster_description(emr.describe_cluster(cluster_id))
 
     @staticmethod
-    def from_cluster(cluster_id: str):
+    def from_cluster_description(cluster: Dict[str, Any]):
+        """
+        Creates EMR sketch item from an existing cluster
+        :param cluster: cluster information, as returned by EMR.describe_cluster
+        :return: the sketch item
+        """
         emr_item = EmrSketchItem()
-        emr = EMR(verbose=False)
-        cluster = emr.describe_cluster(cluster_id)
         ec2 = cluster['Ec2InstanceAttributes']
 
         for b in cluster['BootstrapActions']:
@@ -0,0 +1,93 @@
+"""
+Safe file updates
+
+Files are replaced atomically (written to a temporary file, flushed to disk and renamed over the target), so
+concurrent readers see either the old or the new content, never a partially written file. Read-modify-write
+updates are serialized by advisory locks.
+"""
+
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; locking is then a no-op
+    fcntl = None  # type: ignore[assignment]
+
+
+def atomic_write_text(path: Path, text: str) -> None:
+    """
+    Atomically replaces content of a file. The new content is durable (synced to disk) when the function returns.
+    :param path: file path
+    :param text: new content
+    :return: nothing
+    """
+    tmp = path.parent / f'.{path.name}.{os.urandom(6).hex()}.tmp'
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)  # the umask applies, as in open()
+    try:
+        with os.fdopen(fd, 'w') as f:
+            if path.exists() and hasattr(os, 'fchmod'):
+                os.fchmod(f.fileno(), path.stat().st_mode & 0o777)  # keep the mode of the replaced file
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    fsync_dir(path.parent)
+
+
+def atomic_symlink(path: Path, target: Path) -> None:
+    """
+    Atomically creates or replaces a symlink.
+    :param path: symlink path
+    :param target: symlink target
+    :return: nothing
+    """
+    tmp = path.parent / f'.{path.name}.{os.getpid()}.tmp'
+    tmp.unlink(missing_ok=True)
+    tmp.symlink_to(target)
+    try:
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    fsync_dir(path.parent)
+
+
+def fsync_dir(path: Path) -> None:
+    """
+    Flushes a directory to disk, so that renames in it are durable. Does nothing where directories can't be opened.
+    :param path: directory path
+    :return: nothing
+    """
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def file_lock(path: Path, shared: bool = False) -> Iterator[None]:
+    """
+    Holds an advisory lock of a file (`<path>.lock`, created if needed) in the context.
+    The lock is released when the context exits, or when the process dies.
+    :param path: path of the locked file
+    :param shared: if True, the lock is shared (many processes may hold it at once); otherwise it is exclusive
+    :return: the context
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(path.parent / f'{path.name}.lock', 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,231 @@
+"""
+Sketch content hashing
+
+Content-addressed hashing of sketches and their parts, used to find duplicate parts across a sketch library,
+to pull shared parts into generated "include" bases, and to diff sketches structurally.
+
+Parts of a sketch are its sketch items ("emr"), their keys ("emr.security_groups"), and items of keyed lists
+("emr.configurations[spark-defaults]", "emr.bootstrap_scripts[install-deps]"); see LIST_KEYS.
+"""
+
+import hashlib
+import json
+from collections import defaultdict
+from typing import Any, Dict, FrozenSet, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+# Lists of dictionaries, whose items are identified by a dictionary key
+LIST_KEYS = {
+    'configurations': 'Classification',
+    'bootstrap_scripts': 'name',
+    'tags': 'Key',
+}
+
+BASE_PREFIX = 'base-'
+
+Path = Tuple[str, ...]
+
+
+def canonical_json(value: Any) -> str:
+    """
+    Serializes a value to JSON in a canonical form (sorted keys, no whitespace)
+    :param value: JSON value
+    :return: canonical JSON
+    """
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+
+def content_hash(value: Any) -> str:
+    """
+    Computes content hash of a JSON value (SHA-256 of its canonical JSON)
+    :param value: JSON value
+    :return: hex digest
+    """
+    return hashlib.sha256(canonical_json(value).encode('utf-8')).hexdigest()
+
+
+def sketch_parts(content: Dict[str, Any]) -> Iterator[Tuple[str, Any]]:
+    """
+    Enumerates parts of a sketch (see module docs). The "include" key is not a part.
+    :param content: raw sketch content
+    :return: iterator of part names and values
+    """
+    for item_name, item in content.items():
+        if item_name == 'include':
+            continue
+        yield item_name, item
+        if not isinstance(item, dict):
+            continue
+        for key, value in item.items():
+            yield f'{item_name}.{key}', value
+            if key in LIST_KEYS and isinstance(value, list):
+                for element in value:
+                    if isinstance(element, dict) and LIST_KEYS[key] in element:
+                        yield f'{item_name}.{key}[{element[LIST_KEYS[key]]}]', element
+
+
+class DuplicatePart(NamedTuple):
+    part: str  # part name
+    hash: str  # content hash of the part
+    size: int  # size of the part (canonical JSON)
+    sketches: List[str]  # sketches containing the part
+
+
+def find_duplicates(sketches: Dict[str, Dict[str, Any]], min_count: int = 2) -> List[DuplicatePart]:
+    """
+    Finds parts repeated in many sketches.
+    :param sketches: raw sketch contents by sketch names
+    :param min_count: min. number of sketches containing the same part
+    :return: duplicate parts, the ones wasting most space first
+    """
+    found: Dict[Tuple[str, str], List[str]] = defaultdict(list)
+    sizes: Dict[str, int] = {}
+    for name, content in sketches.items():
+        for part, value in sketch_parts(content):
+            serialized = canonical_json(value)
+            digest = hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+            sizes[digest] = len(serialized)
+            found[(part, digest)].append(name)
+    duplicates = [DuplicatePart(part, digest, sizes[digest], names)
+                  for (part, digest), names in found.items() if len(names) >= min_count]
+    return sorted(duplicates, key=lambda d: (-d.size * (len(d.sketches) - 1), d.part))
+
+
+def _leaves(value: Dict[str, Any], path: Path = ()) -> Iterator[Tuple[Path, Any]]:
+    # Leaves are the smallest units includes can share: deep merge merges dictionaries, but replaces other values
+    for key, child in value.items():
+        if isinstance(child, dict) and child:
+            yield from _leaves(child, (*path, key))
+        else:
+            yield (*path, key), child
+
+
+def _set_path(target: Dict[str, Any], path: Path, value: Any) -> None:
+    for key in path[:-1]:
+        target = target.setdefault(key, {})
+    target[path[-1]] = value
+
+
+def _remove_path(target: Dict[str, Any], path: Path) -> None:
+    parents = [target]
+    for key in path[:-1]:
+        parents.append(parents[-1][key])
+    del parents[-1][path[-1]]
+    for parent, key in zip(reversed(parents[:-1]), reversed(path[:-1])):
+        if parent[key]:
+            break
+        del parent[key]
+
+
+class Dedup(NamedTuple):
+    bases: Dict[str, Dict[str, Any]]  # generated base sketches by names
+    sketches: Dict[str, Dict[str, Any]]  # rewritten sketches (only the changed ones) by names
+
+
+def dedup_sketches(sketches: Dict[str, Dict[str, Any]], min_count: int = 2) -> Dedup:
+    """
+    Pulls values shared by many sketches into generated base sketches, which the sketches include.
+
+    Values are shared on the level of deep-merge (dictionaries are split to their keys, other values, including
+    lists, are shared as a whole). Sketches sharing the same set of values get one base named by the content
+    hash ("base-<hash>"); the base is added to the end of their includes, so interpreted sketches don't change.
+    Generated bases themselves are not deduplicated again.
+
+    :param sketches: raw sketch contents by sketch names
+    :param min_count: min. number of sketches sharing a base
+    :return: generated bases and rewritten sketches
+    """
+    leaves: Dict[str, Dict[Path, str]] = {}
+    counts: Dict[Tuple[Path, str], int] = defaultdict(int)
+    values: Dict[Tuple[Path, str], Any] = {}
+    for name, content in sketches.items():
+        if name.startswith(BASE_PREFIX):
+            continue
+        leaves[name] = {}
+        for path, value in _leaves({k: v for k, v in content.items() if k != 'include'}):
+            digest = content_hash(value)
+            leaves[name][path] = digest
+            counts[(path, digest)] += 1
+            values[(path, digest)] = value
+
+    groups: Dict[FrozenSet[Tuple[Path, str]], List[str]] = defaultdict(list)
+    for name, name_leaves in leaves.items():
+        shared = frozenset(leaf for leaf in name_leaves.items() if counts[leaf] >= min_count)
+        if shared:
+            groups[shared].append(name)
+
+    bases: Dict[str, Dict[str, Any]] = {}
+    rewritten: Dict[str, Dict[str, Any]] = {}
+    for shared, names in groups.items():
+        if len(names) < min_count:
+            continue
+        base: Dict[str, Any] = {}
+        for path, digest in sorted(shared):
+            _set_path(base, path, values[(path, digest)])
+        base_name = BASE_PREFIX + content_hash(base)[:16]
+        bases[base_name] = base
+        for name in names:
+            content = json.loads(json.dumps(sketches[name]))  # deep copy
+            for path, _ in shared:
+                _remove_path(content, path)
+            includes = content.get('include', [])
+            includes = includes if isinstance(includes, list) else [includes]
+            content['include'] = [*includes, base_name]
+            rewritten[name] = content
+    return Dedup(bases, rewritten)
+
+
+class Difference(NamedTuple):
+    path: str  # e.g. "emr.configurations[spark-defaults].Properties.spark.executor.memory"
+    old: Optional[Any]  # None if added
+    new: Optional[Any]  # None if removed
+
+
+def diff(old: Dict[str, Any], new: Dict[str, Any]) -> List[Difference]:
+    """
+    Diffs two sketches structurally: dictionaries are compared by keys, and keyed lists (see LIST_KEYS) by item
+    keys, so reordering them is not a difference.
+    :param old: old sketch content
+    :param new: new sketch content
+    :return: differences, ordered by path
+    """
+    differences: List[Difference] = []
+    _diff(old, new, '', None, differences)
+    return differences
+
+
+def _diff(old: Any, new: Any, path: str, key: Optional[str], differences: List[Difference]) -> None:
+    if old == new:
+        return
+    if isinstance(old, dict) and isinstance(new, dict):
+        for k in sorted(set(old) | set(new), key=str):
+            child = f'{path}.{k}' if path else str(k)
+            if k not in new:
+                differences.append(Difference(child, old[k], None))
+            elif k not in old:
+                differences.append(Difference(child, None, new[k]))
+            else:
+                _diff(old[k], new[k], child, k, differences)
+    elif key in LIST_KEYS and isinstance(old, list) and isinstance(new, list) and _keyed(old, LIST_KEYS[key]) \
+            and _keyed(new, LIST_KEYS[key]):
+        id_key = LIST_KEYS[key]
+        old_items = {item[id_key]: item for item in old}
+        new_items = {item[id_key]: item for item in new}
+        for k in sorted(set(old_items) | set(new_items), key=str):
+            child = f'{path}[{k}]'
+            if k not in new_items:
+                differences.append(Difference(child, old_items[k], None))
+            elif k not in old_items:
+                differences.append(Difference(child, None, new_items[k]))
+            else:
+                _diff(old_items[k], new_items[k], child, None, differences)
+    else:
+        differences.append(Difference(path, old, new))
+
+
+def _keyed(items: List[Any], id_key: str) -> bool:
+    ids: Set[Any] = set()
+    for item in items:
+        if not isinstance(item, dict) or id_key not in item or item[id_key] in ids:
+            return False
+        ids.add(item[id_key])
+    return True
@@ -1,9 +1,26 @@
+from typing import Any, Dict, List
+
 from awsscripts.sketches.sketchitem import SketchItem
 
 
 class MWAASketchItem(SketchItem):
 
+    def get_environments(self) -> List[str]:
+        """
+        Gets MWAA environments: either the list in "environments", or the single "environment"
+        :return: environment names
+        """
+        if self.contains('environments'):
+            return self._get_list('environments')
+        return [self['environment']] if self.contains('environment') else []
+
     def generate(self):
         return {
             'environment': 'TODO'
         }
+
+    @staticmethod
+    def from_content(content: Dict[str, Any]) -> 'MWAASketchItem':
+        mwaa_item = MWAASketchItem()
+        mwaa_item.content = content
+        return mwaa_item
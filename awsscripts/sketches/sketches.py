@@ -1,10 +1,11 @@
-import json
-from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Hashable, Tuple
 
+from awsscripts.aws.instrumentation import timed
+from awsscripts.sketches.cache import CacheEntry, SketchCache, Signature, sketch_cache
 from awsscripts.sketches.ca import CodeArtifactSketchItem
 from awsscripts.sketches.emr import EmrSketchItem
 from awsscripts.sketches.mwaa import MWAASketchItem
+from awsscripts.sketches.store import SketchStore, default_store
 
 sketch_items = {
     'emr': EmrSketchItem(),
@@ -15,33 +16,36 @@ sketch_items = {
 
 class Sketches:
     """
-    Sketches class. It manages sketch files and their content.
+    Sketches class. It manages sketches and their content, kept in a sketch store (see awsscripts.sketches.store).
+
+    Parsed sketches are cached (by default in a cache shared by all instances in the process), and the cached
+    content is reused until the sketch or any sketch it includes changes.
+
+    Sketches are replaced atomically, so concurrent processes never read a partially written sketch, and
+    read-modify-write updates of a sketch are serialized by a lock of the store.
     """
 
-    def __init__(self) -> None:
-        self.home = Path.home() / '.aws-scripts' / 'sketches'
-        self.home.mkdir(parents=True, exist_ok=True)
+    def __init__(self, cache: Optional[SketchCache] = None, store: Optional[SketchStore] = None) -> None:
+        """
+        :param cache: cache of parsed sketches (default=None, i.e. the cache shared by all instances)
+        :param store: sketch store (default=None, i.e. the store selected by AWS_SCRIPTS_SKETCH_STORE)
+        """
+        self.store = store if store is not None else default_store()
+        self.cache = cache if cache is not None else sketch_cache
 
     def list(self) -> List[str]:
         """
         Lists available sketches
         :return: list of sketch names
         """
-        return [p.stem for p in self.home.glob("*.json") if p != 'default']
+        return self.store.list()
 
     def get_default(self) -> Optional[str]:
         """
         Get default sketch name
         :return: default sketch name, None if any
         """
-        default = (self.home / '.default.json')
-        if default.exists():
-            if default.is_symlink():
-                return str(default.readlink().name.removesuffix('.json'))
-            else:
-                return str(default.name.removesuffix('.json'))
-        else:
-            return None
+        return self.store.get_default()
 
     def make_default(self, sketch: str) -> None:
         """
@@ -49,14 +53,14 @@ class Sketches:
         :param sketch: sketch name
         :return: nothing
         """
-        default = (self.home / '.default.json')
-        if not default.exists() or default.is_symlink():
+        sketch = _name(sketch)
+        with self.store.lock(sketch):
             self._create_sketch(sketch)
-            default.unlink(missing_ok=True)
-            default.symlink_to(self._get_sketch_path(sketch))
+        try:
+            self.store.set_default(sketch)
             print(f'"{sketch}" was set as default')
-        else:
-            print('Default sketch is not a symlink')
+        except ValueError as e:
+            print(e)
 
     def list_sketch_items(self, sketch: str) -> List[str]:
         sketch_content = self._load_content(sketch)
@@ -73,12 +77,15 @@ class Sketches:
             print(f'Unknown sketch item name. Available sketch items: {sketch_items.keys()}')
             return
 
-        self._create_sketch(sketch)
-        content = self._load_content(sketch)
-        if sketch_item not in content:
-            content[sketch_item] = sketch_items[sketch_item].generate()
-            self._write_content(sketch, content)
-            print(f'"{sketch_item}" sketch item has been added to file {self._get_sketch_path(sketch)}.\n'
+        with self.store.lock(_name(sketch)):
+            self._create_sketch(sketch)
+            content = self._load_content(sketch)
+            added = sketch_item not in content
+            if added:
+                content[sketch_item] = sketch_items[sketch_item].generate()
+                self._write_content(sketch, content)
+        if added:
+            print(f'"{sketch_item}" sketch item has been added to {self.store.location(_name(sketch))}.\n'
                   'Please fill up missing values.')
         else:
             print(f'Could not add "{sketch_item}" sketch item to the sketch, because it already exists')
@@ -97,13 +104,16 @@ class Sketches:
         if sketch_item not in sketch_items:
             print(f'Unknown sketch item. Available sketch items: {sketch_items.keys()}')
             return
-        content = self._load_content(sketch)
-        if sketch_item not in content:
+        with self.store.lock(_name(sketch)):
+            content = self._load_content(sketch)
+            removed = sketch_item in content
+            if removed:
+                del content[sketch_item]
+                self._write_content(sketch, content)
+        if not removed:
             print(f'Could not remove "{sketch_item}" sketch item from the sketch, because it does not exist')
         else:
-            content.pop(sketch_item, None)
-            self._write_content(sketch, content)
-            print(f'"{sketch_item}" sketch item has been removed from file {self._get_sketch_path(sketch)}')
+            print(f'"{sketch_item}" sketch item has been removed from {self.store.location(_name(sketch))}')
 
     def replace_sketch_item(self, sketch: str, sketch_item: str, content: Dict[str, Any]) -> None:
         """
@@ -118,56 +128,137 @@ class Sketches:
             print(f'Unknown sketch item name. Available sketch items: {sketch_items.keys()}')
             return
 
-        self._create_sketch(sketch)
-        sketch_content = self._load_content(sketch)
-        sketch_content[sketch_item] = content
-        self._write_content(sketch, sketch_content)
-        print(f'"{sketch_item}" sketch item has been updated in file {self._get_sketch_path(sketch)}.')
+        with self.store.lock(_name(sketch)):
+            self._create_sketch(sketch)
+            sketch_content = self._load_content(sketch)
+            sketch_content[sketch_item] = content
+            self._write_content(sketch, sketch_content)
+        print(f'"{sketch_item}" sketch item has been updated in {self.store.location(_name(sketch))}.')
+
+    def replace_sketch_items(self, sketch_item: str, contents: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Replaces a sketch item in many sketches (creating the sketches if needed), written in one store operation.
+
+        :param sketch_item: sketch item name
+        :param contents: new sketch item content by sketch names
+        :return: nothing
+        """
+        if sketch_item not in sketch_items:
+            print(f'Unknown sketch item name. Available sketch items: {sketch_items.keys()}')
+            return
+
+        sketches = {}
+        with self.store.lock_all():
+            for sketch, content in contents.items():
+                sketch_content = self._load_content(sketch) if self._exists(sketch) else {}
+                sketch_content[sketch_item] = content
+                sketches[sketch] = sketch_content
+            self.write_many(sketches)
+        print(f'"{sketch_item}" sketch item has been updated in {len(sketches)} sketches.')
 
     def __getitem__(self, key: str) -> Dict[str, Any]:
         return self._load_content(key, interpret=True)
 
     def _load_content(self, sketch: str, interpret=False) -> Dict[str, Any]:
-        with self._get_sketch_path(sketch).open() as f:
-            raw_content = f.read()
-            if not raw_content:
-                return {}
-            content: Dict[str, Any] = json.loads(raw_content)
-            if interpret:
-                return self._interpret_content(content)
-            else:
-                return content
+        content: Dict[str, Any] = self._load_cached(sketch, interpret).copy()
+        return content
+
+    def _load_cached(self, sketch: str, interpret: bool, including: Tuple[str, ...] = ()) -> CacheEntry:
+        sketch = _name(sketch)
+        if sketch in including:
+            cycle = ' -> '.join((*including[including.index(sketch):], sketch))
+            raise RuntimeError(f'Sketch include cycle: {cycle}')
+        key = self.store.key(sketch)
+        entry = self.cache.get((key, interpret), self.store.signature)
+        if entry is not None:
+            return entry
+
+        if interpret:
+            raw = self._load_cached(sketch, False)
+            files = dict(raw.files)
+            with timed('sketch.interpret', sketch):
+                content = self._interpret_content(raw.value, files, (*including, sketch))
+        else:
+            with timed('sketch.read', sketch):
+                content, signature = self.store.read(sketch)
+            files = {key: signature}
+        return self.cache.put((key, interpret), content, files)
 
     def _write_content(self, sketch: str, content: Dict[str, Any]) -> None:
-        with self._get_sketch_path(sketch).open('w') as f:
-            json.dump(content, f, indent=2)
+        self.write_many({sketch: content})
+
+    def write_many(self, sketches: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Creates or replaces many sketches at once (in one store operation)
+        :param sketches: raw sketch contents by sketch names
+        :return: nothing
+        """
+        sketches = {_name(sketch): content for sketch, content in sketches.items()}
+        self.store.write_many(sketches)
+        for sketch in sketches:
+            self.cache.invalidate(self.store.key(sketch))
+
+    def delete_many(self, sketches: List[str]) -> None:
+        """
+        Deletes many sketches at once (in one store operation). Sketches which don't exist are ignored.
+        :param sketches: sketch names
+        :return: nothing
+        """
+        names = [_name(sketch) for sketch in sketches]
+        self.store.delete_many(names)
+        for name in names:
+            self.cache.invalidate(self.store.key(name))
 
     def _exists(self, sketch: str) -> bool:
-        return self._get_sketch_path(sketch).exists()
+        return self.store.exists(_name(sketch))
 
     def _create_sketch(self, sketch: str) -> None:
         if not self._exists(sketch):
-            self._get_sketch_path(sketch).touch()
+            self._write_content(sketch, {})
 
-    def _get_sketch_path(self, sketch: str) -> Path:
-        filename = sketch if sketch.endswith('.json') else sketch + '.json'
-        return self.home / filename
-
-    def _interpret_content(self, content: Dict[str, Any]) -> Dict[str, Any]:
+    def _interpret_content(self, content: Dict[str, Any], files: Optional[Dict[Hashable, Signature]] = None,
+                           including: Tuple[str, ...] = ()) -> Dict[str, Any]:
         """
         Interprets special keys in JSON content:
           {
             "include": "str" or ["str", ...]     <-- read content from another sketch(es) and use it as a "base"
           }
+        Included sketches are interpreted too, so includes can be nested. The bases are deep-merged in the order
+        of inclusion, and the content is deep-merged over them. Each included sketch is resolved only once and
+        reused (cached) by all sketches including it.
+
         :param content: JSON content
+        :param files: if given, signatures of (transitively) included sketches are added to it
+        :param including: names of sketches being interpreted, which include this content (to detect cycles)
         :return: interpreted content
         """
         result: Dict[str, Any] = {}
         if "include" in content:
             to_include = content["include"]
-            if type(to_include) is list:
-                for sketch in to_include:
-                    result = {**result, **self._load_content(sketch)}
-            else:
-                result = {**result, **self._load_content(to_include)}
-        return {**result, **content}
+            for sketch in (to_include if type(to_include) is list else [to_include]):
+                included = self._load_cached(sketch, True, including)
+                if files is not None:
+                    files.update(included.files)
+                result = deep_merge(result, included.value)
+        return deep_merge(result, content)
+
+
+def _name(sketch: str) -> str:
+    return sketch.removesuffix('.json')
+
+
+def deep_merge(base: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Merges two dictionaries recursively: values from `override` win, but dictionaries present in both are merged.
+    Arguments are not modified; values which don't need merging are shared with them.
+    :param base: base dictionary
+    :param override: overriding dictionary
+    :return: merged dictionary
+    """
+    result = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(result.get(key), dict):
+            result[key] = deep_merge(result[key], value)
+        else:
+            result[key] = value
+    return result
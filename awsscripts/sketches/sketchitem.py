@@ -1,46 +1,103 @@
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 
 class SketchItem:
     """
     Base for a sketch item
+
+    Lists of dictionaries in the content (e.g. configurations by "Classification") are indexed by a dictionary key
+    when they are first looked up or updated by the key. An indexed list is kept as a dictionary of the keys to the
+    list items (in the list order), so has/get/put/remove by the key take constant time; it is written back to the
+    content when the content or the list is read. Lists with duplicate keys are not indexed, but searched.
+
+    Indexed lists must be modified only through the sketch item: a list read from the item (e.g. by
+    get_configurations) is not indexed any more, until it is looked up by a key again.
     """
 
-    def __init__(self):
-        self.content = {}
+    def __init__(self) -> None:
+        self._content: Dict[str, Any] = {}
+        self._indexes: Dict[str, Tuple[str, Dict[Any, Dict[str, Any]]]] = {}  # list name -> (key, index)
 
+    @property
     def content(self) -> Dict[str, Any]:
-        return self.content
+        for list_name in list(self._indexes):
+            self._unindex(list_name)
+        return self._content
+
+    @content.setter
+    def content(self, content: Dict[str, Any]) -> None:
+        self._content = content
+        self._indexes = {}
 
     def contains(self, key: str) -> bool:
-        return key in self.content
+        return key in self._content
 
     def _get(self, key: str) -> Optional[Any]:
         return self[key] if key in self else None
 
     def put(self, key: str, value: Any) -> None:
-        self.content += {
-            key: value
-        }
-
-    def _put_in_list(self, list_name: str, value: Any):
-        self.content.setdefault(list_name, []).append(value)
-
-    def _has_in_list_dict(self, list_name: str, dict_key: str, key: str):
-        if list_name in self.content:
-            return len(list(filter(lambda b: b[dict_key] == key, self[list_name]))) > 0
-        return False
-
-    def _has_in_list(self, list_name: str, key: str):
-        if list_name in self.content:
-            return len(list(filter(lambda s: s == key, self[list_name]))) > 0
-        return False
+        self[key] = value
+
+    def _put_in_list(self, list_name: str, value: Any) -> None:
+        self._unindex(list_name)
+        self._content.setdefault(list_name, []).append(value)
+
+    def _index(self, list_name: str, dict_key: str) -> Optional[Dict[Any, Dict[str, Any]]]:
+        # the dictionaries of a list by their keys; None if some keys are duplicate
+        if list_name in self._indexes:
+            indexed_key, index = self._indexes[list_name]
+            if indexed_key == dict_key:
+                return index
+            self._unindex(list_name)
+        items = self._content.get(list_name, [])
+        index = {item[dict_key]: item for item in items}
+        if len(index) < len(items):
+            return None
+        self._indexes[list_name] = (dict_key, index)
+        return index
+
+    def _unindex(self, list_name: str) -> None:
+        # writes an indexed list back to the content
+        if list_name in self._indexes:
+            _, index = self._indexes.pop(list_name)
+            if list_name in self._content:
+                self._content[list_name] = list(index.values())
+
+    def _has_in_list_dict(self, list_name: str, dict_key: str, key: str) -> bool:
+        return self._get_in_list_dict(list_name, dict_key, key) is not None
+
+    def _get_in_list_dict(self, list_name: str, dict_key: str, key: str) -> Optional[Dict[str, Any]]:
+        index = self._index(list_name, dict_key)
+        if index is None:
+            return next((item for item in self._content[list_name] if item[dict_key] == key), None)
+        return index.get(key)
+
+    def _put_in_list_dict(self, list_name: str, dict_key: str, value: Dict[str, Any]) -> None:
+        """
+        Adds a dictionary to a list, or replaces the dictionary with the same key in place.
+        """
+        self._put_all_in_list_dict(list_name, dict_key, [value])
 
-    def _get_in_list_dict(self, list_name: str, dict_key: str, key: str):
-        if self._has_in_list_dict(list_name, dict_key, key):
-            return list(filter(lambda c: c[dict_key] == key, self[list_name]))[0]
+    def _put_all_in_list_dict(self, list_name: str, dict_key: str, values: List[Dict[str, Any]]) -> None:
+        """
+        Adds dictionaries to a list, or replaces the dictionaries with the same keys in place.
+        """
+        index = self._index(list_name, dict_key)
+        if index is None:  # keep one dictionary per put key
+            put = {value[dict_key]: value for value in values}
+            items = [item for item in self._content[list_name] if item[dict_key] not in put]
+            self._content[list_name] = items + list(put.values())
+            return
+        self._content.setdefault(list_name, [])  # written back from the index
+        for value in values:
+            index[value[dict_key]] = value
+
+    def _remove_in_list_dict(self, list_name: str, dict_key: str, key: str) -> None:
+        index = self._index(list_name, dict_key)
+        if index is None:
+            self._content[list_name] = [item for item in self._content[list_name] if item[dict_key] != key]
         else:
-            return None
+            index.pop(key, None)
 
     def _get_list_dict(self, list_name: str) -> List[Dict[str, Any]]:
         return self[list_name] if self.contains(list_name) else []
@@ -48,12 +105,14 @@ class SketchItem:
     def _get_list(self, list_name: str) -> List[str]:
         return self[list_name] if self.contains(list_name) else []
 
-    def _remove_in_list(self, list_name: str, key: str):
-        self[list_name] = list(filter(lambda k: k != key, self[list_name]))
+    def _has_in_list(self, list_name: str, key: str) -> bool:
+        if list_name in self._content:
+            return key in self[list_name]
+        return False
 
-    def _remove_in_list_dict(self, list_name: str, dict_key: str, key: str):
-        if self._has_in_list_dict(list_name, dict_key, key):
-            self[list_name] = list(filter(lambda c: c[dict_key] != key, self[list_name]))
+    def _remove_in_list(self, list_name: str, key: str) -> None:
+        if self._has_in_list(list_name, key):
+            self[list_name] = [k for k in self[list_name] if k != key]
 
     def generate(self) -> Dict[str, Any]:
         """
@@ -62,8 +121,13 @@ class SketchItem:
         """
         return self.content
 
+    def __contains__(self, key: str) -> bool:
+        return key in self._content
+
     def __getitem__(self, key: str) -> Any:
-        return self.content[key]
+        self._unindex(key)
+        return self._content[key]
 
-    def __setitem__(self, key, value):
-        self.content[key] = value
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._indexes.pop(key, None)
+        self._content[key] = value
@@ -0,0 +1,170 @@
+"""
+SQLite sketch store
+
+Keeps all sketches in a single SQLite database: listing is an index scan and lookup is an index seek, regardless
+of how many sketches there are. Every write stamps the written sketches with a new value of a database-wide
+version counter, which serves as the sketch signature.
+
+The database uses the default rollback journal, which is safe on network file systems (e.g. NFS home directories).
+The WAL journal, in which readers don't block the writer, is opt-in: it relies on shared memory, so it is not
+used for databases on network file systems.
+"""
+
+import json
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Hashable, Iterator, List, Optional, Tuple
+
+from awsscripts.sketches.cache import Signature
+from awsscripts.sketches.files import file_lock
+from awsscripts.sketches.store import SketchNotFoundError, SketchStore
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS sketches (
+    name TEXT PRIMARY KEY,
+    content TEXT NOT NULL,
+    version INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+) WITHOUT ROWID;
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', '0');
+'''
+SCHEMA_VERSION = 1  # stored as user_version of the database
+
+NETWORK_FILESYSTEMS = {'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'afs', 'ceph', 'glusterfs', 'fuse.sshfs'}
+
+
+def is_network_filesystem(path: Path) -> bool:
+    """
+    Determines if a path is on a network file system (only on Linux, from /proc/mounts)
+    :param path: the path
+    :return: true if the path is on a network file system; false if not, or if it is not known
+    """
+    try:
+        with open('/proc/mounts') as f:
+            mounts = [line.split()[1:3] for line in f if len(line.split()) > 2]
+    except OSError:
+        return False
+    path = path.resolve()
+    fstype = None
+    longest = -1
+    for mount_point, mount_fstype in mounts:
+        mount_point = re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), mount_point)  # e.g. \040
+        mount = Path(mount_point)
+        if (path == mount or mount in path.parents) and len(mount.parts) > longest:
+            fstype, longest = mount_fstype, len(mount.parts)
+    return fstype in NETWORK_FILESYSTEMS
+
+
+class SqliteStore(SketchStore):
+    """
+    Stores sketches in a SQLite database. Contents are stored as compact JSON. A default sketch is kept in
+    the database too.
+    """
+
+    def __init__(self, path: Path, timeout: float = 30, wal: bool = False) -> None:
+        """
+        :param path: database file (created if it does not exist)
+        :param timeout: seconds to wait for a database locked by another process
+        :param wal: if True, the WAL journal is used (readers don't block the writer), unless the database is on
+         a network file system; otherwise the rollback journal is used
+        """
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(path), timeout=timeout, isolation_level=None,
+                                           check_same_thread=False)
+        self.wal = wal and not is_network_filesystem(path)
+        journal_mode = self._connection.execute('PRAGMA journal_mode').fetchone()[0]
+        if self.wal:
+            if journal_mode != 'wal':
+                self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+        elif journal_mode == 'wal':  # WAL mode persists in the database, e.g. from a store opened with wal=True
+            try:
+                self._connection.execute('PRAGMA journal_mode=DELETE')
+            except sqlite3.OperationalError:
+                pass  # the database is in use, switched by a later open
+        # the schema is created only once, so that opening the store does not take the write lock
+        if self._connection.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+            with self._transaction() as c:
+                for statement in filter(str.strip, _SCHEMA.split(';')):
+                    c.execute(statement)
+                c.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def list(self) -> List[str]:
+        with self._lock:
+            return [name for name, in self._connection.execute('SELECT name FROM sketches ORDER BY name')]
+
+    def key(self, name: str) -> Tuple[Path, str]:
+        return self.path, name
+
+    def signature(self, key: Hashable) -> Signature:
+        assert isinstance(key, tuple)
+        with self._lock:
+            row = self._connection.execute('SELECT version FROM sketches WHERE name = ?', (key[1],)).fetchone()
+        return (row[0],) if row else None
+
+    def read(self, name: str) -> Tuple[Dict[str, Any], Signature]:
+        with self._lock:
+            row = self._connection.execute('SELECT content, version FROM sketches WHERE name = ?',
+                                           (name,)).fetchone()
+        if row is None:
+            raise SketchNotFoundError(f'Sketch "{name}" does not exist in {self.path}')
+        return json.loads(row[0]), (row[1],)
+
+    def read_all(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        with self._lock:
+            rows = self._connection.execute('SELECT name, content FROM sketches ORDER BY name').fetchall()
+        for name, content in rows:
+            yield name, json.loads(content)
+
+    def write_many(self, sketches: Dict[str, Dict[str, Any]]) -> None:
+        rows = [(name, json.dumps(content, separators=(',', ':'))) for name, content in sketches.items()]
+        with self._transaction() as c:
+            c.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'version'")
+            version = int(c.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0])
+            c.executemany('INSERT OR REPLACE INTO sketches (name, content, version) VALUES (?, ?, ?)',
+                          [(name, content, version) for name, content in rows])
+
+    def delete_many(self, names: List[str]) -> None:
+        with self._transaction() as c:
+            c.executemany('DELETE FROM sketches WHERE name = ?', [(name,) for name in names])
+
+    @contextmanager
+    def lock(self, name: str) -> Iterator[None]:
+        with file_lock(self.path):
+            yield
+
+    @contextmanager
+    def lock_all(self) -> Iterator[None]:
+        with file_lock(self.path):  # the lock of a sketch locks the whole database already
+            yield
+
+    def get_default(self) -> Optional[str]:
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM meta WHERE key = 'default'").fetchone()
+        return row[0] if row else None
+
+    def set_default(self, name: str) -> None:
+        with self._transaction() as c:
+            c.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('default', ?)", (name,))
+
+    def location(self, name: str) -> str:
+        return f'database {self.path} (sketch "{name}")'
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            self._connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield self._connection
+            except BaseException:
+                self._connection.execute('ROLLBACK')
+                raise
+            self._connection.execute('COMMIT')
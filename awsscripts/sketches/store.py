@@ -0,0 +1,237 @@
+"""
+Sketch stores
+
+A sketch store keeps raw (not interpreted) sketch contents. Two stores are available:
+  - "json" (default): one JSON file per sketch in a directory (~/.aws-scripts/sketches)
+  - "sqlite": all sketches in a single SQLite database (~/.aws-scripts/sketches.db), with indexed listing and
+    lookup; suitable for large sketch libraries. As "sqlite-wal", the database is used in WAL mode, in which
+    readers don't block the writer; only for local disks (a database on a network file system uses the rollback
+    journal anyway)
+
+The store used by default is selected by the AWS_SCRIPTS_SKETCH_STORE environment variable.
+"""
+
+import json
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Hashable, Iterator, List, Optional, Tuple
+
+from awsscripts.sketches.cache import Signature, file_signature
+from awsscripts.sketches.files import atomic_symlink, atomic_write_text, file_lock, fsync_dir
+
+SKETCH_STORE_ENV = 'AWS_SCRIPTS_SKETCH_STORE'
+SKETCH_STORES = ('json', 'sqlite', 'sqlite-wal')
+
+
+class SketchNotFoundError(FileNotFoundError):
+    pass
+
+
+class SketchStore:
+    """
+    Base class of sketch stores. Sketches are identified by names (without the ".json" suffix).
+
+    Every sketch has a source key, which identifies it across all stores (e.g. in the sketch cache), and
+    a signature, which changes whenever the sketch is written.
+    """
+
+    def list(self) -> List[str]:
+        """
+        Lists sketch names
+        :return: sorted sketch names
+        """
+        raise NotImplementedError()
+
+    def exists(self, name: str) -> bool:
+        return self.signature(self.key(name)) is not None
+
+    def key(self, name: str) -> Hashable:
+        """
+        Gets source key of a sketch
+        :param name: sketch name
+        :return: the source key
+        """
+        raise NotImplementedError()
+
+    def signature(self, key: Hashable) -> Signature:
+        """
+        Gets current signature of a sketch
+        :param key: source key of the sketch
+        :return: the signature; None if the sketch does not exist
+        """
+        raise NotImplementedError()
+
+    def read(self, name: str) -> Tuple[Dict[str, Any], Signature]:
+        """
+        Reads a sketch
+        :param name: sketch name
+        :return: raw sketch content, and signature of the content read
+        :raises SketchNotFoundError: if the sketch does not exist
+        """
+        raise NotImplementedError()
+
+    def write(self, name: str, content: Dict[str, Any]) -> None:
+        """
+        Creates or replaces a sketch
+        :param name: sketch name
+        :param content: raw sketch content
+        :return: nothing
+        """
+        self.write_many({name: content})
+
+    def write_many(self, sketches: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Creates or replaces many sketches at once
+        :param sketches: raw sketch contents by sketch names
+        :return: nothing
+        """
+        raise NotImplementedError()
+
+    def delete_many(self, names: List[str]) -> None:
+        """
+        Deletes many sketches at once. Sketches which don't exist are ignored.
+        :param names: sketch names
+        :return: nothing
+        """
+        raise NotImplementedError()
+
+    def read_all(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Reads all sketches
+        :return: iterator of sketch names and raw contents
+        """
+        for name in self.list():
+            yield name, self.read(name)[0]
+
+    @contextmanager
+    def lock(self, name: str) -> Iterator[None]:
+        """
+        Holds an exclusive lock of a sketch in the context, to serialize read-modify-write updates
+        :param name: sketch name
+        :return: the context
+        """
+        raise NotImplementedError()
+
+    @contextmanager
+    def lock_all(self) -> Iterator[None]:
+        """
+        Holds an exclusive lock of all sketches in the context, to serialize read-modify-write updates of many
+        sketches (it excludes the locks of single sketches)
+        :return: the context
+        """
+        raise NotImplementedError()
+
+    def get_default(self) -> Optional[str]:
+        raise NotImplementedError()
+
+    def set_default(self, name: str) -> None:
+        raise NotImplementedError()
+
+    def location(self, name: str) -> str:
+        """
+        Describes where a sketch is stored (for messages)
+        :param name: sketch name
+        :return: location of the sketch
+        """
+        raise NotImplementedError()
+
+
+class JsonDirectoryStore(SketchStore):
+    """
+    Stores sketches as JSON files in a directory. Files are replaced atomically and updates are serialized by
+    advisory file locks: a lock of a sketch holds a shared lock of the directory, which lock_all() holds exclusively.
+    A default sketch is determined by the ".default.json" symlink.
+    """
+
+    def __init__(self, home: Path) -> None:
+        self.home = home
+        self.home.mkdir(parents=True, exist_ok=True)
+
+    def list(self) -> List[str]:
+        with os.scandir(self.home) as entries:
+            return sorted(e.name[:-len('.json')] for e in entries
+                          if e.name.endswith('.json') and not e.name.startswith('.'))
+
+    def key(self, name: str) -> Path:
+        return self.home / f'{name}.json'
+
+    def signature(self, key: Hashable) -> Signature:
+        assert isinstance(key, Path)
+        return file_signature(key)
+
+    def read(self, name: str) -> Tuple[Dict[str, Any], Signature]:
+        path = self.key(name)
+        try:
+            with path.open() as f:
+                signature = file_signature(f.fileno())  # signature of the file actually read
+                raw_content = f.read()
+        except FileNotFoundError:
+            raise SketchNotFoundError(f'Sketch "{name}" does not exist: {path}') from None
+        return (json.loads(raw_content) if raw_content else {}), signature
+
+    def write_many(self, sketches: Dict[str, Dict[str, Any]]) -> None:
+        for name, content in sketches.items():
+            atomic_write_text(self.key(name), json.dumps(content, indent=2))
+
+    def delete_many(self, names: List[str]) -> None:
+        for name in names:
+            self.key(name).unlink(missing_ok=True)
+        fsync_dir(self.home)
+
+    @contextmanager
+    def lock(self, name: str) -> Iterator[None]:
+        with file_lock(self.home / '.sketches', shared=True), file_lock(self.key(name)):
+            yield
+
+    @contextmanager
+    def lock_all(self) -> Iterator[None]:
+        with file_lock(self.home / '.sketches'):
+            yield
+
+    def get_default(self) -> Optional[str]:
+        default = (self.home / '.default.json')
+        if default.exists():
+            if default.is_symlink():
+                return str(default.readlink().name.removesuffix('.json'))
+            else:
+                return str(default.name.removesuffix('.json'))
+        else:
+            return None
+
+    def set_default(self, name: str) -> None:
+        default = (self.home / '.default.json')
+        if default.exists() and not default.is_symlink():
+            raise ValueError('Default sketch is not a symlink')
+        atomic_symlink(default, self.key(name))
+
+    def location(self, name: str) -> str:
+        return f'file {self.key(name)}'
+
+
+def default_store() -> SketchStore:
+    """
+    Creates the sketch store selected by the AWS_SCRIPTS_SKETCH_STORE environment variable ("json" by default)
+    :return: the sketch store
+    """
+    kind = os.environ.get(SKETCH_STORE_ENV) or 'json'
+    home = Path.home() / '.aws-scripts'
+    if kind == 'json':
+        return JsonDirectoryStore(home / 'sketches')
+    if kind in ('sqlite', 'sqlite-wal'):
+        from awsscripts.sketches.sqlitestore import SqliteStore  # imported lazily, it loads sqlite3
+
+        return SqliteStore(home / 'sketches.db', wal=kind == 'sqlite-wal')
+    raise ValueError(f'Unknown sketch store "{kind}" in {SKETCH_STORE_ENV}, expected one of {SKETCH_STORES}')
+
+
+def copy_sketches(source: SketchStore, target: SketchStore) -> int:
+    """
+    Copies all sketches from one store to another (in one bulk write)
+    :param source: source store
+    :param target: target store
+    :return: number of copied sketches
+    """
+    sketches = dict(source.read_all())
+    target.write_many(sketches)
+    return len(sketches)
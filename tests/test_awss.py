@@ -0,0 +1,53 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# modules which must not be imported unless an AWS command is chosen
+AWS_SDK_MODULES = ('boto3', 'botocore', 'requests', 'urllib3')
+
+_RUN_AWSS = '''
+import json, sys
+sys.argv = ['awss'] + sys.argv[1:]
+from awsscripts.scripts.awss import main
+try:
+    main()
+except SystemExit:
+    pass
+print(json.dumps(sorted(m for m in sys.modules if m.split('.')[0] in {modules!r})), file=sys.stderr)
+'''
+
+
+def _python(args: List[str], home: Path) -> 'subprocess.CompletedProcess[str]':
+    env: Dict[str, str] = {**os.environ, 'HOME': str(home), 'PYTHONPATH': str(ROOT)}
+    env.pop('AWS_SCRIPTS_SKETCH_STORE', None)
+    return subprocess.run([sys.executable, *args], env=env, cwd=home, capture_output=True, text=True, check=True)
+
+
+@pytest.mark.parametrize('command', [['s', '-l'], ['--help'], ['s', '--help']])
+def test_command_does_not_import_aws_sdk(command: List[str], tmp_path: Path) -> None:
+    result = _python(['-c', _RUN_AWSS.format(modules=AWS_SDK_MODULES), *command], tmp_path)
+    imported = result.stderr.strip().splitlines()[-1]
+    assert imported == '[]'
+
+
+def _cumulative_import_us(module: str, home: Path) -> int:
+    # "import time: self [us] | cumulative | imported package" lines of python -X importtime
+    result = _python(['-X', 'importtime', '-c', f'import {module}'], home)
+    for line in result.stderr.splitlines():
+        fields = [field.strip() for field in line.split('|')]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1])
+    raise AssertionError(f'No import time of {module} reported')
+
+
+def test_import_time(tmp_path: Path) -> None:
+    # relative to boto3, so that the check does not depend on the speed of the machine
+    awss = min(_cumulative_import_us('awsscripts.scripts.awss', tmp_path) for _ in range(3))
+    boto3 = min(_cumulative_import_us('boto3', tmp_path) for _ in range(3))
+    assert awss < boto3 / 2, f'awss imports in {awss} us, boto3 in {boto3} us'
@@ -0,0 +1,111 @@
+import json
+import multiprocessing
+import sys
+from pathlib import Path
+from typing import Any, Callable
+
+import pytest
+
+from awsscripts.sketches.sketches import Sketches
+from awsscripts.sketches.sqlitestore import SqliteStore
+from awsscripts.sketches.store import JsonDirectoryStore, SketchStore
+
+WRITERS = 200
+INCREMENTS = 3
+READERS = 4
+SKETCHES = 20
+PADDING = 'x' * 64 * 1024  # large enough for a write not to be a single disk block
+
+
+def _json_store(path: Path) -> SketchStore:
+    return JsonDirectoryStore(path / 'sketches')
+
+
+def _sqlite_store(path: Path) -> SketchStore:
+    return SqliteStore(path / 'sketches.db')
+
+
+def _writer(make_store: Callable[[Path], SketchStore], path: Path) -> None:
+    store = make_store(path)
+    for _ in range(INCREMENTS):
+        with store.lock('counter'):
+            content, _ = store.read('counter')
+            store.write('counter', {'count': content['count'] + 1, 'padding': PADDING})
+
+
+def _check(content: Any) -> None:
+    if not isinstance(content, dict) or content.get('padding') != PADDING:
+        raise AssertionError(f'Torn read: {str(content)[:80]}')
+
+
+def _json_reader(path: Path, done: Any) -> None:
+    sketch = path / 'sketches' / 'counter.json'
+    while not done.is_set():
+        with sketch.open() as f:
+            _check(json.loads(f.read()))
+
+
+def _sqlite_reader(path: Path, done: Any) -> None:
+    store = _sqlite_store(path)
+    while not done.is_set():
+        _check(store.read('counter')[0])
+
+
+@pytest.mark.parametrize('make_store, reader', [(_json_store, _json_reader), (_sqlite_store, _sqlite_reader)])
+def test_no_torn_reads_or_lost_updates(make_store: Callable[[Path], SketchStore], reader: Callable[..., None],
+                                       tmp_path: Path) -> None:
+    store = make_store(tmp_path)
+    store.write('counter', {'count': 0, 'padding': PADDING})
+
+    context = multiprocessing.get_context('fork' if sys.platform == 'linux' else 'spawn')
+    done = context.Event()
+    readers = [context.Process(target=reader, args=(tmp_path, done)) for _ in range(READERS)]
+    writers = [context.Process(target=_writer, args=(make_store, tmp_path)) for _ in range(WRITERS)]
+    for process in readers + writers:
+        process.start()
+    for process in writers:
+        process.join()
+    done.set()
+    for process in readers:
+        process.join()
+
+    assert [p.exitcode for p in writers] == [0] * WRITERS
+    assert [p.exitcode for p in readers] == [0] * READERS, 'a reader saw a partially written sketch'
+    content, _ = store.read('counter')
+    assert content['count'] == WRITERS * INCREMENTS
+
+
+def _sketch_writer(make_store: Callable[[Path], SketchStore], path: Path, name: str) -> None:
+    store = make_store(path)
+    for _ in range(INCREMENTS):
+        with store.lock(name):
+            content, _ = store.read(name)
+            content['mwaa']['count'] += 1
+            store.write(name, content)
+
+
+def _bulk_writer(make_store: Callable[[Path], SketchStore], path: Path, writer: int) -> None:
+    sketches = Sketches(store=make_store(path))
+    for i in range(INCREMENTS):
+        sketches.replace_sketch_items('emr', {f'sketch-{s}': {'writer': writer, 'i': i} for s in range(SKETCHES)})
+
+
+@pytest.mark.parametrize('make_store', [_json_store, _sqlite_store])
+def test_no_lost_updates_by_bulk_writers(make_store: Callable[[Path], SketchStore], tmp_path: Path) -> None:
+    store = make_store(tmp_path)
+    store.write_many({f'sketch-{s}': {'mwaa': {'count': 0}} for s in range(SKETCHES)})
+
+    context = multiprocessing.get_context('fork' if sys.platform == 'linux' else 'spawn')
+    processes = [context.Process(target=_bulk_writer, args=(make_store, tmp_path, w)) for w in range(WRITERS // 10)]
+    processes += [context.Process(target=_sketch_writer, args=(make_store, tmp_path, f'sketch-{w % SKETCHES}'))
+                  for w in range(WRITERS)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    assert [p.exitcode for p in processes] == [0] * len(processes)
+    for s in range(SKETCHES):
+        content, _ = store.read(f'sketch-{s}')
+        assert content['mwaa']['count'] == WRITERS // SKETCHES * INCREMENTS, f'lost updates of sketch-{s}'
+        assert content['emr']['i'] == INCREMENTS - 1
@@ -0,0 +1,116 @@
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+import botocore.session
+import pytest
+from botocore.stub import ANY, Stubber
+
+from awsscripts.emr.emr import EMR, FINGERPRINT_TAG
+from awsscripts.emr.steps import StepsNotAddedError
+
+
+@pytest.fixture
+def stubber() -> Iterator[Stubber]:
+    client = botocore.session.get_session().create_client(
+        'emr', region_name='us-east-1', aws_access_key_id='test', aws_secret_access_key='test')
+    with Stubber(client) as stubber:
+        yield stubber
+    stubber.assert_no_pending_responses()
+
+
+def _steps(count: int) -> List[Dict[str, Any]]:
+    return [{'Name': f'step-{i}', 'Args': ['spark-submit', f'app-{i}.py']} for i in range(count)]
+
+
+def _boto_steps(steps: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [EMR._to_step_boto(step['Name'], step['Args']) for step in steps]
+
+
+def _start_cluster(emr: EMR, steps: List[Dict[str, Any]]) -> str:
+    group = {'Market': 'ON_DEMAND', 'InstanceType': 'm5.xlarge', 'InstanceCount': 1}
+    return emr.start_cluster(
+        name='cluster', log_uri='s3://logs', keep_alive=True, protect=False, applications=['Spark'],
+        job_flow_role='EMR_EC2_DefaultRole', service_role='EMR_DefaultRole', emr_label='emr-6.15.0',
+        instance_fleet=None, instance_groups={'master': group, 'core': group}, instance_fleet_configs=None,
+        ebs_master_volume_gb=None, ebs_core_volume_gb=None, steps=steps, tags=[],
+        security_groups={'EmrManagedMasterSecurityGroup': 'sg-1', 'EmrManagedSlaveSecurityGroup': 'sg-2'},
+        subnets=['subnet-1'], configurations=[], keyname=None, bootstrap_scripts=[], reuse=True)
+
+
+def test_reused_cluster_runs_the_steps(stubber: Stubber, monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    monkeypatch.setenv('HOME', str(tmp_path))
+    monkeypatch.setattr(EMR, 'cluster_fingerprint', staticmethod(lambda request: 'fingerprint'))
+    steps = _steps(2)
+    stubber.add_response('list_clusters', {'Clusters': [{'Id': 'j-1', 'Name': 'cluster'}]}, {'ClusterStates': ANY})
+    stubber.add_response('describe_cluster', {'Cluster': {
+        'Id': 'j-1', 'Name': 'cluster', 'Status': {'State': 'WAITING'},
+        'Tags': [{'Key': FINGERPRINT_TAG, 'Value': 'fingerprint'}]
+    }}, {'ClusterId': 'j-1'})
+    stubber.add_response('list_steps', {'Steps': []}, {'ClusterId': 'j-1', 'StepStates': ANY})
+    stubber.add_response('add_job_flow_steps', {'StepIds': ['s-1', 's-2']},
+                         {'JobFlowId': 'j-1', 'Steps': _boto_steps(steps)})
+
+    assert _start_cluster(EMR(False, emr_client=stubber.client), steps) == 'j-1'
+
+
+def _active_steps(count: int) -> Dict[str, Any]:
+    return {'Steps': [{'Id': f's-active-{i}', 'Status': {'State': 'PENDING'}} for i in range(count)]}
+
+
+@pytest.fixture
+def sleeps(monkeypatch: pytest.MonkeyPatch) -> List[float]:
+    delays: List[float] = []
+    monkeypatch.setattr('awsscripts.emr.emr.time.sleep', delays.append)
+    return delays
+
+
+def test_add_steps_in_chunks_the_cluster_can_accept(stubber: Stubber, sleeps: List[float]) -> None:
+    steps = _steps(10)
+    stubber.add_response('list_steps', _active_steps(250), {'ClusterId': 'j-1', 'StepStates': ANY})
+    stubber.add_response('add_job_flow_steps', {'StepIds': [f's-{i}' for i in range(6)]},
+                         {'JobFlowId': 'j-1', 'Steps': _boto_steps(steps[:6])})
+    stubber.add_response('list_steps', _active_steps(252), {'ClusterId': 'j-1', 'StepStates': ANY})
+    stubber.add_response('add_job_flow_steps', {'StepIds': [f's-{i}' for i in range(6, 10)]},
+                         {'JobFlowId': 'j-1', 'Steps': _boto_steps(steps[6:])})
+
+    assert EMR(False, emr_client=stubber.client).add_steps('j-1', steps) == [f's-{i}' for i in range(10)]
+    assert sleeps == []
+
+
+def test_add_steps_retries_throttling(stubber: Stubber, sleeps: List[float]) -> None:
+    steps = _steps(3)
+    stubber.add_response('list_steps', _active_steps(0), {'ClusterId': 'j-1', 'StepStates': ANY})
+    stubber.add_client_error('add_job_flow_steps', service_error_code='ThrottlingException', http_status_code=400)
+    stubber.add_response('add_job_flow_steps', {'StepIds': ['s-2', 's-0', 's-1']},
+                         {'JobFlowId': 'j-1', 'Steps': _boto_steps(steps)})
+
+    assert EMR(False, emr_client=stubber.client).add_steps('j-1', steps) == ['s-2', 's-0', 's-1']
+    assert len(sleeps) == 1
+
+
+def test_add_steps_waits_until_the_cluster_accepts_steps(stubber: Stubber, sleeps: List[float]) -> None:
+    steps = _steps(2)
+    stubber.add_response('list_steps', _active_steps(256), {'ClusterId': 'j-1', 'StepStates': ANY})
+    stubber.add_response('list_steps', _active_steps(256), {'ClusterId': 'j-1', 'StepStates': ANY})
+    stubber.add_response('list_steps', _active_steps(255), {'ClusterId': 'j-1', 'StepStates': ANY})
+    stubber.add_response('add_job_flow_steps', {'StepIds': ['s-0']},
+                         {'JobFlowId': 'j-1', 'Steps': _boto_steps(steps[:1])})
+    stubber.add_response('list_steps', _active_steps(0), {'ClusterId': 'j-1', 'StepStates': ANY})
+    stubber.add_response('add_job_flow_steps', {'StepIds': ['s-1']},
+                         {'JobFlowId': 'j-1', 'Steps': _boto_steps(steps[1:])})
+
+    assert EMR(False, emr_client=stubber.client).add_steps('j-1', steps) == ['s-0', 's-1']
+    assert len(sleeps) == 2
+
+
+def test_add_steps_reports_added_steps_after_timeout(stubber: Stubber, sleeps: List[float]) -> None:
+    steps = _steps(2)
+    stubber.add_response('list_steps', _active_steps(255), {'ClusterId': 'j-1', 'StepStates': ANY})
+    stubber.add_response('add_job_flow_steps', {'StepIds': ['s-0']},
+                         {'JobFlowId': 'j-1', 'Steps': _boto_steps(steps[:1])})
+    stubber.add_response('list_steps', _active_steps(256), {'ClusterId': 'j-1', 'StepStates': ANY})
+
+    with pytest.raises(StepsNotAddedError) as e:
+        EMR(False, emr_client=stubber.client).add_steps('j-1', steps, timeout=0)
+    assert e.value.step_ids == ['s-0']
+    assert sleeps == []
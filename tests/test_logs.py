@@ -0,0 +1,125 @@
+import gzip
+import io
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest
+from botocore.exceptions import ClientError
+
+from awsscripts.emr.logs import LogChunk, LogFollower, decompress, tail_step_logs
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+class InMemoryS3:
+    """
+    S3 client stand-in keeping objects in memory. It supports the calls and parameters used by LogFollower.
+    """
+
+    def __init__(self) -> None:
+        self.objects: Dict[Tuple[str, str], Tuple[bytes, str, datetime]] = {}
+        self.ranges: List[str] = []  # Range of every GetObject
+        self.replace_on_get: Optional[bytes] = None  # new content, put after the next GetObject
+
+    def put(self, key: str, body: bytes, modified: datetime = NOW) -> None:
+        self.objects[('logs', key)] = (body, f'"{os.urandom(8).hex()}"', modified)
+
+    def head_object(self, Bucket: str, Key: str) -> Dict[str, Any]:
+        body, etag, modified = self._get(Bucket, Key, 'HeadObject')
+        return {'ETag': etag, 'ContentLength': len(body), 'LastModified': modified}
+
+    def get_object(self, Bucket: str, Key: str, Range: str, IfMatch: str) -> Dict[str, Any]:
+        body, etag, _ = self._get(Bucket, Key, 'GetObject')
+        if IfMatch != etag:
+            raise ClientError({'Error': {'Code': 'PreconditionFailed', 'Message': 'ETag does not match'}}, 'GetObject')
+        self.ranges.append(Range)
+        start, end = (int(value) for value in Range[len('bytes='):].split('-'))
+        if self.replace_on_get is not None:
+            self.put(Key, self.replace_on_get)
+            self.replace_on_get = None
+        return {'Body': io.BytesIO(body[start:end + 1])}
+
+    def _get(self, bucket: str, key: str, operation: str) -> Tuple[bytes, str, datetime]:
+        if (bucket, key) not in self.objects:
+            raise ClientError({'Error': {'Code': '404', 'Message': 'Not Found'}}, operation)
+        return self.objects[(bucket, key)]
+
+
+def _text(count: int, start: int = 0) -> bytes:
+    return b''.join(f'line {i}\n'.encode() for i in range(start, start + count))
+
+
+def test_decompress_multi_member_gzip() -> None:
+    compressed = gzip.compress(_text(1000)) + gzip.compress(_text(1000, 1000))
+    chunks = [compressed[i:i + 100] for i in range(0, len(compressed), 100)]
+
+    pieces = list(decompress(iter(chunks), max_output=64))
+    assert b''.join(pieces) == _text(2000)
+    assert max(len(piece) for piece in pieces) <= 64
+
+
+def test_plain_log_is_read_by_ranges() -> None:
+    s3 = InMemoryS3()
+    s3.put('stdout', _text(3))
+    follower = LogFollower(s3, 'logs', 'stdout', chunk_size=8)
+
+    assert b''.join(follower.poll()) == _text(3)
+    assert s3.ranges == ['bytes=0-7', 'bytes=8-15', 'bytes=16-20']
+
+    s3.ranges.clear()
+    s3.put('stdout', _text(4))
+    assert b''.join(follower.poll()) == _text(1, 3)
+    assert s3.ranges == ['bytes=21-27']
+
+
+def test_replaced_gzipped_log_is_not_emitted_twice() -> None:
+    s3 = InMemoryS3()
+    s3.put('stdout.gz', gzip.compress(_text(100)))
+    follower = LogFollower(s3, 'logs', 'stdout.gz', chunk_size=64)
+    assert b''.join(follower.poll()) == _text(100)
+
+    s3.ranges.clear()
+    assert b''.join(follower.poll()) == b''  # same ETag, nothing is read
+    assert s3.ranges == []
+
+    s3.put('stdout.gz', gzip.compress(_text(100)) + gzip.compress(_text(50, 100)))
+    assert b''.join(follower.poll()) == _text(50, 100)
+    assert follower.position == len(_text(150))
+
+
+def test_log_replaced_while_reading_is_read_again() -> None:
+    s3 = InMemoryS3()
+    s3.put('stdout.gz', gzip.compress(_text(1000)))
+    s3.replace_on_get = gzip.compress(_text(1200))
+    follower = LogFollower(s3, 'logs', 'stdout.gz', chunk_size=256)
+
+    first = b''.join(follower.poll())  # abandoned on PreconditionFailed after the first range
+    assert len(s3.ranges) == 1
+    assert follower.etag is None
+    assert first + b''.join(follower.poll()) == _text(1200)
+
+
+def test_missing_log() -> None:
+    s3 = InMemoryS3()
+    follower = LogFollower(s3, 'logs', 'stderr.gz')
+    assert list(follower.poll()) == []
+
+    s3.put('stderr.gz', gzip.compress(b'error\n'))
+    assert b''.join(follower.poll()) == b'error\n'
+
+
+class _FinishedStepEMR:
+
+    def describe_step(self, cluster_id: str, step_id: str) -> Dict[str, Any]:
+        return {'Status': {'State': 'COMPLETED', 'Timeline': {'EndDateTime': NOW - timedelta(minutes=1)}}}
+
+
+def test_tail_step_logs_until_final_logs(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr('awsscripts.emr.logs.time.sleep', lambda seconds: None)
+    s3 = InMemoryS3()
+    s3.put('emr/j-1/steps/s-1/stdout.gz', gzip.compress(b'done\n'))
+
+    chunks = list(tail_step_logs(_FinishedStepEMR(), s3, 'j-1', 's-1', 's3://logs/emr/', logs=('stdout', 'stderr'),
+                                 follow=True, interval=0))
+    assert chunks == [LogChunk('stdout', b'done\n')]
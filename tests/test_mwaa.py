@@ -0,0 +1,31 @@
+import argparse
+from typing import Any, Dict, List
+
+import pytest
+from botocore.exceptions import ClientError
+
+from awsscripts.mwaa.mwaa import MWAA
+from awsscripts.scripts import mwaa as mwaa_script
+
+
+class _FailingMWAAClient:
+
+    def create_cli_token(self, Name: str) -> Dict[str, Any]:
+        raise ClientError({'Error': {'Code': 'ResourceNotFoundException', 'Message': f'{Name} not found'}},
+                          'CreateCliToken')
+
+
+def _args(environments: List[str]) -> argparse.Namespace:
+    return argparse.Namespace(sketch=None, environment=environments, commands_file=None, command=['dags', 'list'],
+                              token_cache=False, verbose=False, region=None, profile=None, workers=2)
+
+
+@pytest.mark.parametrize('environments', [['env'], ['env1,env2']])
+def test_failure_exits_1(environments: List[str], monkeypatch: pytest.MonkeyPatch,
+                         capsys: pytest.CaptureFixture[str]) -> None:
+    monkeypatch.setattr(mwaa_script, 'MWAA', lambda *args, **kwargs: MWAA(False, mwaa_client=_FailingMWAAClient()))
+    with pytest.raises(SystemExit) as e:
+        mwaa_script.execute(_args(environments))
+    assert e.value.code == 1
+    output = capsys.readouterr()
+    assert 'not found' in output.out + output.err
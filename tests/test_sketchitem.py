@@ -0,0 +1,111 @@
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from awsscripts.sketches.emr import EmrSketchItem
+
+ENTRIES = 10_000
+OPERATIONS = 200
+
+
+def _configurations(count: int, start: int = 0) -> List[Dict[str, Any]]:
+    return [{'Classification': f'class-{i}', 'Properties': {'i': str(i)}} for i in range(start, start + count)]
+
+
+def test_put_configurations_replaces_in_place() -> None:
+    item = EmrSketchItem()
+    item.put_configurations(_configurations(3))
+    item.put_configurations([{'Classification': 'class-1', 'Properties': {'x': 'y'}}, *_configurations(1, 3)])
+
+    assert [c['Classification'] for c in item.get_configurations()] == ['class-0', 'class-1', 'class-2', 'class-3']
+    assert item.get_configuration('class-1') == {'Classification': 'class-1', 'Properties': {'x': 'y'}}
+
+
+def test_index_is_written_back_to_content() -> None:
+    item = EmrSketchItem()
+    assert not item.has_configuration('class-0')
+    assert 'configurations' not in item.content
+
+    item.put_configurations(_configurations(3))
+    item.remove_configuration('class-1')
+    item.put_configuration('class-1', {})
+    assert item.content['configurations'] == [*_configurations(1), *_configurations(1, 2),
+                                              {'Classification': 'class-1', 'Properties': {}}]
+
+    item.content = {'configurations': _configurations(1)}
+    assert item.get_configuration('class-0') == _configurations(1)[0]
+    assert not item.has_configuration('class-1')
+
+
+def test_put_configurations_keeps_one_of_duplicates() -> None:
+    item = EmrSketchItem()
+    item['configurations'] = _configurations(2) + _configurations(1)
+    assert item.get_configuration('class-0') == _configurations(1)[0]
+    item.put_configurations([{'Classification': 'class-0', 'Properties': {}}])
+
+    assert item.get_configurations() == [*_configurations(1, 1), {'Classification': 'class-0', 'Properties': {}}]
+
+
+def test_lookup_after_modification_of_the_read_list() -> None:
+    item = EmrSketchItem()
+    item.put_configurations(_configurations(2))
+    item.get_configurations()[0]['Classification'] = 'renamed'
+
+    assert item.get_configuration('class-0') is None
+    assert item.has_configuration('renamed')
+    item.put_configuration('class-0', {})
+    assert [c['Classification'] for c in item.get_configurations()] == ['renamed', 'class-1', 'class-0']
+
+
+class _ScanningEmrSketchItem(EmrSketchItem):
+    """
+    Keyed lookups and updates as they were before the index: every operation scans the list.
+    """
+
+    def _has_in_list_dict(self, list_name: str, dict_key: str, key: str) -> bool:
+        if list_name in self.content:
+            return len(list(filter(lambda b: b[dict_key] == key, self[list_name]))) > 0
+        return False
+
+    def _get_in_list_dict(self, list_name: str, dict_key: str, key: str) -> Optional[Dict[str, Any]]:
+        if self._has_in_list_dict(list_name, dict_key, key):
+            found: Dict[str, Any] = list(filter(lambda c: c[dict_key] == key, self[list_name]))[0]
+            return found
+        return None
+
+    def _remove_in_list_dict(self, list_name: str, dict_key: str, key: str) -> None:
+        if self._has_in_list_dict(list_name, dict_key, key):
+            self[list_name] = list(filter(lambda c: c[dict_key] != key, self[list_name]))
+
+    def _put_in_list_dict(self, list_name: str, dict_key: str, value: Dict[str, Any]) -> None:
+        self._remove_in_list_dict(list_name, dict_key, value[dict_key])
+        self._put_in_list(list_name, value)
+
+
+def _seconds_per_operation(item: EmrSketchItem, operation: Callable[[EmrSketchItem, str], Any]) -> float:
+    names = [f'class-{i}' for i in range(0, ENTRIES, ENTRIES // OPERATIONS)]
+    start = time.perf_counter()
+    for name in names:
+        operation(item, name)
+    return (time.perf_counter() - start) / len(names)
+
+
+def test_benchmark_keyed_operations(capsys: Any) -> None:
+    operations: Dict[str, Callable[[EmrSketchItem, str], Any]] = {
+        'has': lambda item, name: item.has_configuration(name),
+        'get': lambda item, name: item.get_configuration(name),
+        'put': lambda item, name: item.put_configuration(name, {'updated': 'true'}),
+        'remove': lambda item, name: item.remove_configuration(name),
+    }
+    results = {}
+    for name, operation in operations.items():
+        seconds = {}
+        for kind, item in (('scan', _ScanningEmrSketchItem()), ('index', EmrSketchItem())):
+            item.content = {'configurations': _configurations(ENTRIES)}
+            seconds[kind] = _seconds_per_operation(item, operation)
+        results[name] = seconds
+
+    with capsys.disabled():
+        print(f'\n{ENTRIES} configurations: ' + ', '.join(
+            f'{name} {s["scan"] * 1e6:.0f} -> {s["index"] * 1e6:.1f} us' for name, s in results.items()))
+    for name, seconds in results.items():
+        assert seconds['index'] * 20 < seconds['scan'], f'{name} is not faster with the index'
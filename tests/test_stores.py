@@ -0,0 +1,75 @@
+import random
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Tuple
+
+import pytest
+
+from awsscripts.sketches.sketches import Sketches
+from awsscripts.sketches.sqlitestore import SqliteStore
+from awsscripts.sketches.store import JsonDirectoryStore, SketchStore, copy_sketches
+
+SKETCHES = 10_000
+LOOKUPS = 1_000
+
+
+def _sketch(i: int) -> Dict[str, Any]:
+    return {'emr': {
+        'cluster_name': f'tenant-{i}',
+        'subnets': [f'subnet-{i:08x}'],
+        'tags': [{'Key': 'tenant', 'Value': str(i)}]
+    }}
+
+
+def _timed(function: Callable[[], Any]) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+@pytest.fixture(scope='module')
+def stores(tmp_path_factory: pytest.TempPathFactory) -> Dict[str, SketchStore]:
+    home = tmp_path_factory.mktemp('stores')
+    sqlite = SqliteStore(home / 'sketches.db')
+    sqlite.write_many({f'tenant-{i:05}': _sketch(i) for i in range(SKETCHES)})
+    json_store = JsonDirectoryStore(home / 'sketches')
+    assert copy_sketches(sqlite, json_store) == SKETCHES
+    return {'json': json_store, 'sqlite': sqlite}
+
+
+def test_bulk_export_and_import(stores: Dict[str, SketchStore], tmp_path: Path) -> None:
+    sqlite = SqliteStore(tmp_path / 'imported.db')
+    assert copy_sketches(stores['json'], sqlite) == SKETCHES
+    assert sqlite.read('tenant-01234')[0] == _sketch(1234)
+
+
+def test_benchmark(stores: Dict[str, SketchStore], capsys: pytest.CaptureFixture[str]) -> None:
+    names = random.Random(0).sample(sorted(stores['json'].list()), LOOKUPS)
+    results: Dict[str, Dict[str, float]] = {}
+    for kind, store in stores.items():
+        listed, list_seconds = _timed(lambda: Sketches(store=store).list())
+        contents, lookup_seconds = _timed(lambda: [Sketches(store=store)[name] for name in names])
+        assert len(listed) == SKETCHES
+        assert contents == [_sketch(int(name[len('tenant-'):])) for name in names]
+        results[kind] = {'list': list_seconds, 'lookup': lookup_seconds / LOOKUPS}
+
+    with capsys.disabled():
+        print(f'\n{SKETCHES} sketches: ' + ', '.join(
+            f'{kind} list {r["list"] * 1000:.1f} ms, lookup {r["lookup"] * 1e6:.0f} us' for kind, r in results.items()))
+    assert results['sqlite']['list'] < 1
+    assert results['sqlite']['lookup'] < 0.01
+
+
+def test_open_does_not_wait_for_writer(tmp_path: Path) -> None:
+    path = tmp_path / 'sketches.db'
+    SqliteStore(path).write('tenant', _sketch(0))
+    writer = sqlite3.connect(str(path), isolation_level=None)
+    writer.execute('BEGIN IMMEDIATE')  # another process is writing
+    try:
+        store, seconds = _timed(lambda: SqliteStore(path, timeout=5))
+        assert seconds < 1
+        assert store.read('tenant')[0] == _sketch(0)
+    finally:
+        writer.execute('ROLLBACK')
+        writer.close()